@@ -2,20 +2,74 @@
 
 from __future__ import annotations
 
-from functools import partial
+import asyncio
+import importlib
 import logging
-
-import anthropic
+from pathlib import Path
+import time
+from typing import TYPE_CHECKING, Any
 
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.const import CONF_API_KEY, Platform
-from homeassistant.core import HomeAssistant
+from homeassistant.const import (
+    CONF_API_KEY,
+    EVENT_HOMEASSISTANT_STOP,
+    Platform,
+    __version__ as HA_VERSION,
+)
+from homeassistant.core import Event, HomeAssistant
 from homeassistant.exceptions import ConfigEntryNotReady
+from homeassistant.helpers.event import async_track_time_interval
+from homeassistant.loader import async_get_integration
+
+from .assistant_memory import (
+    PRUNE_INTERVAL,
+    AssistantMemory,
+    LayeredMemory,
+    async_acquire_household_memory,
+    async_release_household_memory,
+    memory_limits,
+)
+from .const import (
+    CACHES_KEY,
+    COMPACTOR_KEY,
+    CONF_BASE_URL,
+    CONF_EXTRA_ENDPOINTS,
+    CONF_LAZY_STARTUP,
+    CONF_LOAD_BALANCING,
+    CONF_MAX_IN_FLIGHT,
+    CONF_REQUEST_RECORDING,
+    CONF_SHARED_MEMORY,
+    DEFAULT,
+    DEFAULT_BASE_URL,
+    DEVICE_CONTEXT_KEY,
+    DOMAIN,
+    MEMORY_KEY,
+    READY_KEY,
+    RESOLVER_KEY,
+    ROUTER_KEY,
+    STARTUP_KEY,
+    TRACER_KEY,
+)
+from .device_manager import DeviceContextBuilder
+from .disk_cache import DiskCache
+from .model_router import ModelRouter
+from .name_resolver import NameResolver
+from .recorder import RequestRecorder
+from .standby import (
+    EntryCaches,
+    async_adopt,
+    async_cleanup_domain_data,
+    async_park,
+    async_take,
+)
+from .tool_results import ToolResultCompactor
+from .tracing import Tracer
 
-from .assistant_memory import AssistantMemory
-from .const import CONF_BASE_URL, DEFAULT_BASE_URL, DOMAIN, MEMORY_KEY
+if TYPE_CHECKING:
+    # Imported lazily: the client pool pulls in the anthropic SDK
+    from .client_pool import ZaiClientPool
 
-type ZaiConfigEntry = ConfigEntry[anthropic.AsyncAnthropic]
+type ZaiConfigEntry = ConfigEntry[ZaiClientPool]
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -24,43 +78,211 @@ PLATFORMS = [Platform.CONVERSATION]
 __all__ = ["ZaiConfigEntry"]
 
 
-async def async_setup_entry(hass: HomeAssistant, entry: ZaiConfigEntry) -> bool:
-    """Set up z.ai Conversation from a config entry."""
+async def _async_initialize(
+    hass: HomeAssistant,
+    entry: ZaiConfigEntry,
+    memory: AssistantMemory | LayeredMemory,
+    disk_cache: DiskCache,
+    startup: dict[str, Any],
+    pool: ZaiClientPool | None = None,
+) -> None:
+    """Create the client pool and load memory and the disk cache for an entry.
+
+    Runs during setup, or in the background with lazy startup, in which case
+    the first conversation turn waits for it. A pool kept from before a
+    reload is reused.
+    """
+    start = time.perf_counter()
+
+    # Cached artefacts are only valid for the versions that built them
+    integration = await async_get_integration(hass, DOMAIN)
+    await disk_cache.async_load(f"{HA_VERSION}/{integration.version}")
+
+    if pool is not None:
+        entry.runtime_data = pool
+        _set_recorder(hass, entry)
+        await memory.async_load()
+        startup["ready_seconds"] = round(time.perf_counter() - start, 3)
+        return
+
     api_key = entry.data[CONF_API_KEY]
     base_url = entry.data.get(CONF_BASE_URL, DEFAULT_BASE_URL)
 
-    try:
-        client = await hass.async_add_executor_job(
-            partial(
-                anthropic.AsyncAnthropic,
-                api_key=api_key,
-                base_url=base_url,
-                default_headers={"x-api-key": api_key},
-            )
-        )
-    except Exception as err:
-        _LOGGER.exception("Error setting up z.ai client: %s", err)
-        raise ConfigEntryNotReady from err
+    # Importing the SDK takes a while; keep it off the event loop
+    client_pool = await hass.async_add_import_executor_job(
+        importlib.import_module, f"{__package__}.client_pool"
+    )
+
+    # One client per (api_key, base_url); entries sharing a pair also share
+    # its request scheduler
+    entry.runtime_data = await client_pool.async_create_pool(
+        hass,
+        client_pool.parse_endpoints(
+            api_key, base_url, entry.options.get(CONF_EXTRA_ENDPOINTS)
+        ),
+        entry.options.get(CONF_LOAD_BALANCING, DEFAULT[CONF_LOAD_BALANCING]),
+        int(entry.options.get(CONF_MAX_IN_FLIGHT, DEFAULT[CONF_MAX_IN_FLIGHT])),
+    )
+    _set_recorder(hass, entry)
+
+    await memory.async_load()
+
+    startup["ready_seconds"] = round(time.perf_counter() - start, 3)
+    _LOGGER.debug(
+        "z.ai entry %s ready in %.3fs", entry.title, startup["ready_seconds"]
+    )
+
+
+def _set_recorder(hass: HomeAssistant, entry: ZaiConfigEntry) -> None:
+    """Record the requests of the entry's pool if a recording file is set."""
+    pool = entry.runtime_data
+    target = entry.options.get(
+        CONF_REQUEST_RECORDING, DEFAULT[CONF_REQUEST_RECORDING]
+    ).strip()
+    pool.recorder = (
+        RequestRecorder(hass, Path(hass.config.path(target)), pool.api_keys)
+        if target
+        else None
+    )
+
+
+async def async_wait_ready(hass: HomeAssistant, entry_id: str) -> None:
+    """Wait until an entry started lazily has its client and memory."""
+    ready: asyncio.Task[None] | None = (
+        hass.data.get(DOMAIN, {}).get(entry_id, {}).get(READY_KEY)
+    )
+    if ready is not None and not ready.done():
+        await asyncio.shield(ready)
+    elif ready is not None:
+        # Re-raise a failed initialization
+        ready.result()
+
 
-    entry.runtime_data = client
+async def async_setup_entry(hass: HomeAssistant, entry: ZaiConfigEntry) -> bool:
+    """Set up z.ai Conversation from a config entry."""
+    start = time.perf_counter()
+    lazy = entry.options.get(CONF_LAZY_STARTUP, DEFAULT[CONF_LAZY_STARTUP])
 
     # Initialize domain data storage
     if DOMAIN not in hass.data:
         hass.data[DOMAIN] = {}
 
-    # Initialize memory for this entry
-    memory = AssistantMemory(hass, entry.entry_id)
-    await memory.async_load()
+    # Caches kept from before a reload (see standby.py), or new ones
+    caches = async_adopt(hass, entry)
+    startup: dict[str, Any] = {"lazy": lazy, "warm": caches is not None}
+    if caches is not None:
+        startup["invalidated"] = caches.invalidated
+    else:
+        disk_cache = DiskCache(hass, entry.entry_id)
+        device_builder = DeviceContextBuilder(hass)
+        resolver = NameResolver(hass, disk_cache=disk_cache)
+        caches = EntryCaches(
+            memory=AssistantMemory(hass, entry.entry_id),
+            device_builder=device_builder,
+            resolver=resolver,
+            router=ModelRouter(),
+            disk_cache=disk_cache,
+            stop_tracking=[device_builder.async_start(), resolver.async_start()],
+        )
+
+    # Initialize memory for this entry; with shared memory the entry's own
+    # file becomes an overlay on the household memory
+    memory: AssistantMemory | LayeredMemory = caches.memory
+    if entry.options.get(CONF_SHARED_MEMORY, DEFAULT[CONF_SHARED_MEMORY]):
+        household = async_acquire_household_memory(hass, entry.entry_id)
+        memory = LayeredMemory(household, memory)
 
-    hass.data[DOMAIN][entry.entry_id] = {
+    entry_data: dict[str, Any] = {
         MEMORY_KEY: memory,
+        ROUTER_KEY: caches.router,
+        DEVICE_CONTEXT_KEY: caches.device_builder,
+        TRACER_KEY: Tracer(hass, entry),
+        RESOLVER_KEY: caches.resolver,
+        COMPACTOR_KEY: ToolResultCompactor(entry),
+        CACHES_KEY: caches,
+        STARTUP_KEY: startup,
     }
 
+    if lazy:
+        # Register the entity now; the first turn waits for the rest
+        entry_data[READY_KEY] = entry.async_create_background_task(
+            hass,
+            _async_initialize(
+                hass, entry, memory, caches.disk_cache, startup, caches.pool
+            ),
+            f"{DOMAIN} initialize {entry.entry_id}",
+        )
+    else:
+        try:
+            await _async_initialize(
+                hass, entry, memory, caches.disk_cache, startup, caches.pool
+            )
+        except Exception as err:
+            _LOGGER.exception("Error setting up z.ai client: %s", err)
+            await async_release_household_memory(hass, entry.entry_id)
+            # Keep the caches warm for the retry
+            caches.pool = None
+            _async_park_caches(hass, entry, caches)
+            raise ConfigEntryNotReady from err
+
+    hass.data[DOMAIN][entry.entry_id] = entry_data
+
+    async def _async_flush(_event: Event) -> None:
+        """Write pending memory, cache and recording changes before stopping."""
+        await memory.async_save()
+        await async_release_household_memory(hass, entry.entry_id)
+        await caches.disk_cache.async_save()
+        pool = getattr(entry, "runtime_data", None)
+        if pool is not None and pool.recorder is not None:
+            await pool.recorder.async_flush()
+
+    entry.async_on_unload(
+        hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, _async_flush)
+    )
+    entry.async_on_unload(entry.add_update_listener(_async_update_listener))
+
+    # Forget expired and least relevant facts in the background: once the
+    # memory is loaded, then every PRUNE_INTERVAL
+    limits = memory_limits(entry.options)
+
+    async def _async_prune_memory(_now: Any = None) -> None:
+        """Prune the entry's memory."""
+        await memory.async_prune(limits)
+
+    entry.async_create_background_task(
+        hass, _async_prune_memory(), f"{DOMAIN} prune memory {entry.entry_id}"
+    )
+    entry.async_on_unload(
+        async_track_time_interval(hass, _async_prune_memory, PRUNE_INTERVAL)
+    )
+
     await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
 
+    startup["setup_seconds"] = round(time.perf_counter() - start, 3)
+    _LOGGER.debug(
+        "Set up z.ai entry %s in %.3fs (lazy startup: %s)",
+        entry.title,
+        startup["setup_seconds"],
+        lazy,
+    )
+
     return True
 
 
+async def _async_update_listener(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Reload the entry so every option applies; its caches stay warm."""
+    await hass.config_entries.async_reload(entry.entry_id)
+
+
+def _async_park_caches(
+    hass: HomeAssistant, entry: ConfigEntry, caches: EntryCaches
+) -> None:
+    """Park an entry's caches with the data and options they belong to."""
+    caches.data = dict(entry.data)
+    caches.options = dict(entry.options)
+    async_park(hass, entry.entry_id, caches)
+
+
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Unload a config entry."""
     unload_ok = await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
@@ -68,25 +290,39 @@ async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     if unload_ok:
         # Save memory before unloading
         if DOMAIN in hass.data and entry.entry_id in hass.data[DOMAIN]:
-            memory = hass.data[DOMAIN][entry.entry_id].get(MEMORY_KEY)
-            if memory:
+            entry_data = hass.data[DOMAIN].pop(entry.entry_id)
+            if memory := entry_data.get(MEMORY_KEY):
                 await memory.async_save()
-            hass.data[DOMAIN].pop(entry.entry_id)
+            pool = getattr(entry, "runtime_data", None)
+            if pool is not None and pool.recorder is not None:
+                await pool.recorder.async_flush()
+            # Keep the caches for a reload
+            if caches := entry_data.get(CACHES_KEY):
+                caches.pool = pool
+                _async_park_caches(hass, entry, caches)
+        await async_release_household_memory(hass, entry.entry_id)
 
-        # Clean up domain data if empty
-        if DOMAIN in hass.data and not hass.data[DOMAIN]:
-            hass.data.pop(DOMAIN)
+        # Clean up domain data (including shared schedulers) once no entry is
+        # loaded and nothing is parked
+        async_cleanup_domain_data(hass)
 
     return unload_ok
 
 
 async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
     """Handle removal of an entry."""
-    # Delete memory storage file
-    if DOMAIN in hass.data and entry.entry_id in hass.data[DOMAIN]:
-        memory = hass.data[DOMAIN][entry.entry_id].get(MEMORY_KEY)
-        if memory:
-            await memory.async_delete_storage()
+    # Delete memory and cache files; the unload before removal parked them
+    if caches := async_take(hass, entry.entry_id):
+        memory, disk_cache = caches.memory, caches.disk_cache
+        # Deleted first, so releasing the caches doesn't write it again
+        await disk_cache.async_delete_storage()
+        caches.async_release()
+    else:
+        memory = AssistantMemory(hass, entry.entry_id)
+        disk_cache = DiskCache(hass, entry.entry_id)
+        await disk_cache.async_delete_storage()
+    await memory.async_delete_storage()
+    async_cleanup_domain_data(hass)
 
 
 async def async_remove_config_entry_device(
@@ -1,17 +1,50 @@
-"""Assistant memory for z.ai Conversation."""
+"""Assistant memory for z.ai Conversation.
+
+Memory data is copy-on-write: every change builds a new top-level dict and
+swaps it in, so a snapshot taken for prompt building (or for the writer
+thread) is never modified underneath its reader. Saves go through one
+writer task per memory that coalesces changes arriving within SAVE_DELAY.
+
+With shared memory enabled, all agents use one household memory owned by
+hass.data[DOMAIN] and keep their own file only as a per-agent overlay.
+
+Memory is bounded: a background job (every PRUNE_INTERVAL) forgets notes
+whose lifetime has passed and, beyond the configured capacity of each
+category, the least relevant facts. Relevance is the number of times a fact
+was said, halved for every RELEVANCE_HALF_LIFE_DAYS since it was last said;
+the prompt shows the most relevant facts of each category.
+"""
 
 from __future__ import annotations
 
+import asyncio
+from collections.abc import Callable, Mapping
+from dataclasses import dataclass
+import heapq
 import json
 import logging
-from datetime import datetime
+import math
+from datetime import datetime, timedelta
+from operator import itemgetter
 from pathlib import Path
-from typing import Any
+import re
+from typing import Any, TypeVar
 
 from homeassistant.core import HomeAssistant
 from homeassistant.util import dt as dt_util
 
-from .const import DOMAIN
+from .command_stats import CommandStats
+from .const import (
+    CONF_MAX_CONTEXT,
+    CONF_MAX_NOTES,
+    CONF_MAX_PREFERENCES,
+    CONF_NOTE_TTL,
+    DEFAULT,
+    DOMAIN,
+    HOUSEHOLD_MEMORY_KEY,
+)
+from .memory_intent import fold_text, normalize_key
+from .routines import Routine, RoutineStats
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -21,6 +54,137 @@ CATEGORY_NOTE = "note"
 CATEGORY_ROUTINE = "routine"
 CATEGORY_CONTEXT = "context"
 
+# Storage id of the household memory shared by all agents
+HOUSEHOLD_MEMORY_ID = "household"
+
+# Changes made within this many seconds are written together
+SAVE_DELAY = 5.0
+
+# How often expired and least relevant facts are forgotten
+PRUNE_INTERVAL = timedelta(hours=1)
+
+# Relevance of a fact halves every this many days it is not said again
+RELEVANCE_HALF_LIFE_DAYS = 30.0
+_HALF_LIFE_SECONDS = RELEVANCE_HALF_LIFE_DAYS * 86400
+
+# Lifetime of a note about today or tomorrow, in days
+SHORT_NOTE_TTL_DAYS = 2.0
+
+# Notes about today or tomorrow (matched on folded text)
+_SHORT_TERM = re.compile(
+    r"\b(?:today|tonight|tomorrow|oggi|stasera|stanotte|domani|"
+    r"aujourd'hui|ce soir|demain|heute|morgen|hoy|esta noche|manana)\b"
+)
+
+# Facts, context values and commands are cut to this many characters
+MAX_TEXT_LENGTH = 500
+
+# Most frequent commands listed in the stats
+MAX_FREQUENT_COMMANDS = 20
+
+# Facts of each category shown in the prompt
+PROMPT_CONTEXT = 20
+PROMPT_PREFERENCES = 10
+PROMPT_NOTES = 5
+
+_T = TypeVar("_T")
+
+
+@dataclass(frozen=True, slots=True)
+class MemoryLimits:
+    """Capacity of each memory category and lifetime of notes."""
+
+    preferences: int
+    notes: int
+    context: int
+    # Days a note is kept after it was last said; 0 keeps notes
+    note_ttl_days: float
+
+
+def memory_limits(options: Mapping[str, Any]) -> MemoryLimits:
+    """Return the memory limits configured in an entry's options."""
+    return MemoryLimits(
+        preferences=int(
+            options.get(CONF_MAX_PREFERENCES, DEFAULT[CONF_MAX_PREFERENCES])
+        ),
+        notes=int(options.get(CONF_MAX_NOTES, DEFAULT[CONF_MAX_NOTES])),
+        context=int(options.get(CONF_MAX_CONTEXT, DEFAULT[CONF_MAX_CONTEXT])),
+        note_ttl_days=float(options.get(CONF_NOTE_TTL, DEFAULT[CONF_NOTE_TTL])),
+    )
+
+
+def _empty_data() -> dict[str, Any]:
+    """Return the data of an empty memory."""
+    return {
+        "version": 1,
+        "preferences": [],
+        "notes": [],
+        "routines": [],
+        "context": {},
+        "stats": {
+            "total_interactions": 0,
+            "last_interaction": None,
+            "frequent_commands": {},
+        },
+    }
+
+
+def _timestamp(item: Mapping[str, Any], *fields: str) -> float:
+    """Return the first valid ISO time among fields of item, as a timestamp."""
+    for field in fields:
+        if value := item.get(field):
+            try:
+                return datetime.fromisoformat(value).timestamp()
+            except (TypeError, ValueError):
+                continue
+    return 0.0
+
+
+def relevance_rank(item: Mapping[str, Any]) -> float:
+    """Return the sort key of a fact's relevance.
+
+    Relevance is uses * 0.5 ** (days since last said / half-life). Its log2
+    is log2(uses) + last said / half-life minus a term that is the same for
+    every fact, so facts are ranked the same whenever it is computed.
+    """
+    uses = max(int(item.get("uses", 1)), 1)
+    return math.log2(uses) + (
+        _timestamp(item, "used", "updated", "added") / _HALF_LIFE_SECONDS
+    )
+
+
+def _most_relevant(
+    items: list[_T],
+    count: int,
+    key: Callable[[_T], Mapping[str, Any]] = lambda item: item,
+) -> list[_T]:
+    """Return the count most relevant items, in their original order."""
+    if len(items) <= count:
+        return items
+    keep = set(
+        heapq.nlargest(
+            max(count, 0),
+            range(len(items)),
+            key=lambda index: relevance_rank(key(items[index])),
+        )
+    )
+    return [item for index, item in enumerate(items) if index in keep]
+
+
+def _said_again(item: Mapping[str, Any], now: str) -> dict[str, Any]:
+    """Return a fact as it is after being said again at now."""
+    return {**item, "used": now, "uses": int(item.get("uses", 1)) + 1}
+
+
+def _note_expired(note: Mapping[str, Any], limits: MemoryLimits, now: float) -> bool:
+    """Return whether a note's lifetime has passed."""
+    if limits.note_ttl_days <= 0:
+        return False
+    ttl = limits.note_ttl_days
+    if _SHORT_TERM.search(fold_text(note["text"])):
+        ttl = min(ttl, SHORT_NOTE_TTL_DAYS)
+    return now - _timestamp(note, "used", "added") > ttl * 86400
+
 
 class AssistantMemory:
     """Manage persistent memory for the assistant."""
@@ -35,37 +199,45 @@ class AssistantMemory:
         self.hass = hass
         self.entry_id = entry_id
         self._storage_path = Path(hass.config.path(".storage")) / f"zai_conversation.{entry_id}.json"
-        self._data: dict[str, Any] = {
-            "version": 1,
-            "preferences": [],
-            "notes": [],
-            "routines": [],
-            "context": {},
-            "stats": {
-                "total_interactions": 0,
-                "last_interaction": None,
-                "frequent_commands": {},
-            },
-        }
+        self._data: dict[str, Any] = _empty_data()
         self._loaded = False
+        self._load_lock = asyncio.Lock()
+        self._dirty = False
+        self._flush = asyncio.Event()
+        self._writer: asyncio.Task[None] | None = None
+        self._prompt: tuple[Mapping[str, Any], str] | None = None
+        # Set by async_prune; up to twice these are kept between prunes
+        self.limits = memory_limits({})
+        self._pruned: dict[str, int] = {}
+        self._last_prune: str | None = None
+        # Counted in place on every interaction, saved with the data
+        self._commands = CommandStats(dt_util.utcnow().timestamp())
+        self._routines = RoutineStats()
 
     async def async_load(self) -> None:
         """Load memory from storage."""
         if self._loaded:
             return
 
-        try:
-            if self._storage_path.exists():
-                data = await self.hass.async_add_executor_job(
-                    self._read_file
-                )
+        async with self._load_lock:
+            if self._loaded:
+                return
+            try:
+                data = await self.hass.async_add_executor_job(self._read_file)
                 if data:
+                    self._commands = CommandStats.from_data(
+                        data, dt_util.utcnow().timestamp()
+                    )
+                    self._routines = RoutineStats.from_dict(
+                        data.pop("routine_counts", None)
+                    )
+                    data.pop("commands", None)
                     self._data = data
                     _LOGGER.debug("Loaded memory for entry %s", self.entry_id)
-        except Exception as err:
-            _LOGGER.error("Error loading memory: %s", err)
+            except Exception as err:
+                _LOGGER.error("Error loading memory: %s", err)
 
-        self._loaded = True
+            self._loaded = True
 
     def _read_file(self) -> dict[str, Any] | None:
         """Read memory file (runs in executor)."""
@@ -76,18 +248,62 @@ class AssistantMemory:
             return None
 
     async def async_save(self) -> None:
-        """Save memory to storage."""
+        """Write pending changes to storage now."""
+        if not self._dirty and (self._writer is None or self._writer.done()):
+            return
+        self._dirty = True
+        self._flush.set()
+        self._schedule_save()
+        if self._writer is not None:
+            await asyncio.shield(self._writer)
+
+    def _schedule_save(self) -> None:
+        """Mark memory as changed and make sure the writer task runs."""
+        self._dirty = True
+        if self._writer is None or self._writer.done():
+            self._writer = self.hass.async_create_background_task(
+                self._async_writer(), f"{DOMAIN} memory writer {self.entry_id}"
+            )
+
+    async def _async_writer(self) -> None:
+        """Write snapshots until no change is pending (the only writer)."""
         try:
-            await self.hass.async_add_executor_job(self._write_file)
-            _LOGGER.debug("Saved memory for entry %s", self.entry_id)
-        except Exception as err:
-            _LOGGER.error("Error saving memory: %s", err)
-
-    def _write_file(self) -> None:
+            await asyncio.wait_for(self._flush.wait(), SAVE_DELAY)
+        except TimeoutError:
+            pass
+
+        while self._dirty:
+            self._dirty = False
+            self._flush.clear()
+            snapshot = {
+                **self._data,
+                "commands": self._commands.as_dict(),
+                "routine_counts": self._routines.as_dict(),
+            }
+            try:
+                await self.hass.async_add_executor_job(self._write_file, snapshot)
+                _LOGGER.debug("Saved memory for entry %s", self.entry_id)
+            except Exception as err:
+                _LOGGER.error("Error saving memory: %s", err)
+
+    def _write_file(self, data: Mapping[str, Any]) -> None:
         """Write memory file (runs in executor)."""
         self._storage_path.parent.mkdir(parents=True, exist_ok=True)
         with open(self._storage_path, "w", encoding="utf-8") as f:
-            json.dump(self._data, f, indent=2, ensure_ascii=False)
+            json.dump(data, f, indent=2, ensure_ascii=False)
+
+    def _update(self, **changes: Any) -> None:
+        """Swap in a new data dict with some top-level keys replaced."""
+        self._data = {**self._data, **changes}
+        self._schedule_save()
+
+    def snapshot(self) -> Mapping[str, Any]:
+        """Return the current memory data.
+
+        Changes never modify a returned snapshot, so it can be read (or
+        serialised) without locking. Treat it as read-only.
+        """
+        return self._data
 
     # =========================================================================
     # Preferences
@@ -102,32 +318,45 @@ class AssistantMemory:
             - "Svegliami sempre alle 7"
         """
         await self.async_load()
+        preference = preference[:MAX_TEXT_LENGTH]
+        now = dt_util.utcnow().isoformat()
+        preferences = self._data["preferences"]
+
+        # A preference said again (compared by normalised form) gains relevance
+        key = normalize_key(preference)
+        for index, existing in enumerate(preferences):
+            if normalize_key(existing["text"]) == key:
+                self._update(
+                    preferences=[
+                        *preferences[:index],
+                        _said_again(existing, now),
+                        *preferences[index + 1 :],
+                    ]
+                )
+                return
 
         entry = {
             "text": preference,
             "category": category,
-            "added": dt_util.utcnow().isoformat(),
+            "added": now,
         }
-
-        # Avoid duplicates
-        existing = [p["text"].lower() for p in self._data["preferences"]]
-        if preference.lower() not in existing:
-            self._data["preferences"].append(entry)
-            await self.async_save()
-            _LOGGER.info("Added preference: %s", preference)
+        preferences = [*preferences, entry]
+        if len(preferences) > 2 * self.limits.preferences:
+            preferences = _most_relevant(preferences, self.limits.preferences)
+        self._update(preferences=preferences)
+        _LOGGER.info("Added preference: %s", preference)
 
     async def remove_preference(self, preference_text: str) -> bool:
         """Remove a preference by text (partial match)."""
         await self.async_load()
 
-        initial_len = len(self._data["preferences"])
-        self._data["preferences"] = [
+        preferences = [
             p for p in self._data["preferences"]
             if preference_text.lower() not in p["text"].lower()
         ]
 
-        if len(self._data["preferences"]) < initial_len:
-            await self.async_save()
+        if len(preferences) < len(self._data["preferences"]):
+            self._update(preferences=preferences)
             return True
         return False
 
@@ -147,29 +376,42 @@ class AssistantMemory:
             - "Il codice dell'allarme è 1234"
         """
         await self.async_load()
+        note = note[:MAX_TEXT_LENGTH]
+        now = dt_util.utcnow().isoformat()
+        notes = self._data["notes"]
+
+        # A note said again (compared by normalised form) gains relevance and
+        # its lifetime starts over
+        key = normalize_key(note)
+        for index, existing in enumerate(notes):
+            if normalize_key(existing["text"]) == key:
+                self._update(
+                    notes=[*notes[:index], _said_again(existing, now), *notes[index + 1 :]]
+                )
+                return
 
         entry = {
             "text": note,
             "tags": tags or [],
-            "added": dt_util.utcnow().isoformat(),
+            "added": now,
         }
-
-        self._data["notes"].append(entry)
-        await self.async_save()
+        notes = [*notes, entry]
+        if len(notes) > 2 * self.limits.notes:
+            notes = _most_relevant(notes, self.limits.notes)
+        self._update(notes=notes)
         _LOGGER.info("Added note: %s", note)
 
     async def remove_note(self, note_text: str) -> bool:
         """Remove a note by text (partial match)."""
         await self.async_load()
 
-        initial_len = len(self._data["notes"])
-        self._data["notes"] = [
+        notes = [
             n for n in self._data["notes"]
             if note_text.lower() not in n["text"].lower()
         ]
 
-        if len(self._data["notes"]) < initial_len:
-            await self.async_save()
+        if len(notes) < len(self._data["notes"]):
+            self._update(notes=notes)
             return True
         return False
 
@@ -187,17 +429,30 @@ class AssistantMemory:
         Examples:
             - set_context("user_name", "Simone")
             - set_context("wake_time", "07:00")
+
+        Keys are normalised, so "User Name" and "user_name" are the same key.
         """
         await self.async_load()
-        self._data["context"][key] = {
-            "value": value,
-            "updated": dt_util.utcnow().isoformat(),
+        key = normalize_key(key)
+        if isinstance(value, str):
+            value = value[:MAX_TEXT_LENGTH]
+        context = self._data["context"]
+        uses = int(context[key].get("uses", 1)) + 1 if key in context else 1
+        context = {
+            **context,
+            key: {"value": value, "updated": dt_util.utcnow().isoformat(), "uses": uses},
         }
-        await self.async_save()
+        if len(context) > 2 * self.limits.context:
+            context = dict(
+                _most_relevant(
+                    list(context.items()), self.limits.context, itemgetter(1)
+                )
+            )
+        self._update(context=context)
 
     def get_context(self, key: str, default: Any = None) -> Any:
         """Get a context value."""
-        ctx = self._data.get("context", {}).get(key)
+        ctx = self._data.get("context", {}).get(normalize_key(key))
         return ctx["value"] if ctx else default
 
     def get_all_context(self) -> dict[str, Any]:
@@ -208,24 +463,40 @@ class AssistantMemory:
     # Stats & Tracking
     # =========================================================================
 
-    async def record_interaction(self, command: str | None = None) -> None:
-        """Record an interaction for stats."""
+    async def record_interaction(
+        self, command: str | None = None, area_id: str | None = None
+    ) -> None:
+        """Record an interaction for stats.
+
+        Args:
+            command: The user's utterance.
+            area_id: Area of the satellite it came from, if any.
+        """
         await self.async_load()
 
-        self._data["stats"]["total_interactions"] += 1
-        self._data["stats"]["last_interaction"] = dt_util.utcnow().isoformat()
+        now = dt_util.utcnow()
+        stats = dict(self._data["stats"])
+        stats["total_interactions"] += 1
+        stats["last_interaction"] = now.isoformat()
 
+        # Counted in the sketch; stats.frequent_commands is refreshed from it
+        # by async_prune
         if command:
-            cmd_lower = command.lower()
-            freq = self._data["stats"]["frequent_commands"]
-            freq[cmd_lower] = freq.get(cmd_lower, 0) + 1
+            command = command[:MAX_TEXT_LENGTH]
+            self._commands.add(command, now.timestamp())
+            self._routines.add(
+                command, area_id, dt_util.as_local(now).hour, now.timestamp()
+            )
 
-            # Keep only top 20 commands
-            if len(freq) > 20:
-                sorted_cmds = sorted(freq.items(), key=lambda x: x[1], reverse=True)
-                self._data["stats"]["frequent_commands"] = dict(sorted_cmds[:20])
+        self._update(stats=stats)
 
-        await self.async_save()
+    def is_habitual(self, command: str) -> bool:
+        """Return whether a command is one this agent is given regularly."""
+        return self._commands.is_habitual(command, dt_util.utcnow().timestamp())
+
+    def predict_routines(self, hour: int) -> list[Routine]:
+        """Return the commands this agent is regularly given at a local hour."""
+        return self._routines.predict(hour, dt_util.utcnow().timestamp())
 
     def get_stats(self) -> dict[str, Any]:
         """Get usage statistics."""
@@ -241,71 +512,328 @@ class AssistantMemory:
         Returns:
             Formatted string with user preferences, notes, and context.
         """
-        parts = []
-
-        # User context
-        context = self.get_all_context()
-        if context:
-            parts.append("### Informazioni Utente")
-            for key, value in context.items():
-                # Make key human-readable
-                readable_key = key.replace("_", " ").title()
-                parts.append(f"- {readable_key}: {value}")
-
-        # Preferences
-        preferences = self.get_preferences()
-        if preferences:
-            parts.append("\n### Preferenze Utente")
-            for pref in preferences[-10:]:  # Last 10 preferences
-                parts.append(f"- {pref['text']}")
-
-        # Notes
-        notes = self.get_notes()
-        if notes:
-            parts.append("\n### Note da Ricordare")
-            for note in notes[-5:]:  # Last 5 notes
-                parts.append(f"- {note['text']}")
-
-        # Stats summary
-        stats = self.get_stats()
-        if stats.get("total_interactions", 0) > 0:
-            parts.append(f"\n### Statistiche")
-            parts.append(f"- Interazioni totali: {stats['total_interactions']}")
-            if stats.get("last_interaction"):
-                try:
-                    last = datetime.fromisoformat(stats["last_interaction"])
-                    parts.append(f"- Ultima interazione: {last.strftime('%d/%m/%Y %H:%M')}")
-                except ValueError:
-                    pass
-
-        return "\n".join(parts) if parts else ""
+        # Snapshots are never modified, so an identical one renders the same
+        data = self._data
+        if self._prompt is None or self._prompt[0] is not data:
+            self._prompt = (data, render_memory_prompt(data))
+        return self._prompt[1]
 
     # =========================================================================
     # Cleanup
     # =========================================================================
 
-    async def async_clear(self) -> None:
-        """Clear all memory."""
-        self._data = {
-            "version": 1,
-            "preferences": [],
-            "notes": [],
-            "routines": [],
-            "context": {},
-            "stats": {
-                "total_interactions": 0,
-                "last_interaction": None,
-                "frequent_commands": {},
+    async def async_prune(self, limits: MemoryLimits | None = None) -> None:
+        """Forget expired notes and the least relevant facts beyond the limits.
+
+        Runs in the background every PRUNE_INTERVAL, never while a request
+        is being handled.
+
+        Args:
+            limits: Limits to apply from now on; the current ones if None.
+        """
+        if limits is not None:
+            self.limits = limits
+        await self.async_load()
+
+        data = self._data
+        now = dt_util.utcnow()
+        self._last_prune = now.isoformat()
+        pruned = prune_snapshot(data, self.limits, now) or data
+
+        stats = pruned.get("stats", {})
+        frequent = {
+            command: round(count, 2)
+            for command, count in self._commands.top(
+                MAX_FREQUENT_COMMANDS, now.timestamp()
+            )
+        }
+        if frequent != stats.get("frequent_commands"):
+            pruned = {**pruned, "stats": {**stats, "frequent_commands": frequent}}
+
+        routines = [
+            routine.as_dict() for routine in self._routines.routines(now.timestamp())
+        ]
+        if routines != pruned.get("routines"):
+            pruned = {**pruned, "routines": routines}
+        if pruned is data:
+            return
+
+        for category in ("preferences", "notes", "context"):
+            if removed := len(data.get(category, ())) - len(pruned[category]):
+                self._pruned[category] = self._pruned.get(category, 0) + removed
+        self._data = pruned
+        self._schedule_save()
+        _LOGGER.debug("Pruned memory for entry %s", self.entry_id)
+
+    @property
+    def metrics(self) -> dict[str, Any]:
+        """Return memory sizes and pruning statistics for diagnostics."""
+        data = self._data
+        return {
+            "preferences": len(data.get("preferences", ())),
+            "notes": len(data.get("notes", ())),
+            "context": len(data.get("context", ())),
+            "commands_tracked": {
+                window: len(sketch) for window, sketch in self._commands.windows.items()
             },
+            "routines": len(data.get("routines", ())),
+            "prompt_chars": len(self.build_memory_prompt()),
+            "pruned": dict(self._pruned),
+            "last_prune": self._last_prune,
         }
-        await self.async_save()
+
+    async def async_clear(self) -> None:
+        """Clear all memory."""
+        self._data = _empty_data()
+        self._commands = CommandStats(dt_util.utcnow().timestamp())
+        self._routines = RoutineStats()
+        self._schedule_save()
         _LOGGER.info("Cleared memory for entry %s", self.entry_id)
 
     async def async_delete_storage(self) -> None:
         """Delete storage file."""
+        if self._writer is not None:
+            self._writer.cancel()
+        self._dirty = False
         try:
-            if self._storage_path.exists():
+            if await self.hass.async_add_executor_job(self._storage_path.exists):
                 await self.hass.async_add_executor_job(self._storage_path.unlink)
                 _LOGGER.info("Deleted memory storage for entry %s", self.entry_id)
         except Exception as err:
             _LOGGER.error("Error deleting memory storage: %s", err)
+
+
+def render_memory_prompt(data: Mapping[str, Any]) -> str:
+    """Build the memory section of the prompt from a memory snapshot."""
+    parts = []
+
+    # User context
+    context = data.get("context", {})
+    if context:
+        parts.append("### Informazioni Utente")
+        for key, value in _most_relevant(
+            list(context.items()), PROMPT_CONTEXT, itemgetter(1)
+        ):
+            # Make key human-readable
+            readable_key = key.replace("_", " ").title()
+            parts.append(f"- {readable_key}: {value['value']}")
+
+    # Preferences
+    preferences = data.get("preferences", [])
+    if preferences:
+        parts.append("\n### Preferenze Utente")
+        for pref in _most_relevant(preferences, PROMPT_PREFERENCES):
+            parts.append(f"- {pref['text']}")
+
+    # Notes
+    notes = data.get("notes", [])
+    if notes:
+        parts.append("\n### Note da Ricordare")
+        for note in _most_relevant(notes, PROMPT_NOTES):
+            parts.append(f"- {note['text']}")
+
+    # Stats summary
+    stats = data.get("stats", {})
+    if stats.get("total_interactions", 0) > 0:
+        parts.append(f"\n### Statistiche")
+        parts.append(f"- Interazioni totali: {stats['total_interactions']}")
+        if stats.get("last_interaction"):
+            try:
+                last = datetime.fromisoformat(stats["last_interaction"])
+                parts.append(f"- Ultima interazione: {last.strftime('%d/%m/%Y %H:%M')}")
+            except ValueError:
+                pass
+
+    return "\n".join(parts) if parts else ""
+
+
+def prune_snapshot(
+    data: Mapping[str, Any], limits: MemoryLimits, now: datetime
+) -> dict[str, Any] | None:
+    """Return memory data without expired notes and within the limits.
+
+    The least relevant facts of a category over its limit are dropped.
+
+    Returns:
+        The new data, or None if nothing had to be dropped.
+    """
+    changes: dict[str, Any] = {}
+    timestamp = now.timestamp()
+
+    notes = data.get("notes", [])
+    kept = [note for note in notes if not _note_expired(note, limits, timestamp)]
+    kept = _most_relevant(kept, limits.notes)
+    if len(kept) < len(notes):
+        changes["notes"] = kept
+
+    preferences = data.get("preferences", [])
+    if len(preferences) > limits.preferences:
+        changes["preferences"] = _most_relevant(preferences, limits.preferences)
+
+    context = data.get("context", {})
+    if len(context) > limits.context:
+        changes["context"] = dict(
+            _most_relevant(list(context.items()), limits.context, itemgetter(1))
+        )
+
+    return {**data, **changes} if changes else None
+
+
+def merge_snapshots(
+    shared: Mapping[str, Any], overlay: Mapping[str, Any]
+) -> dict[str, Any]:
+    """Merge an agent's overlay into the household memory.
+
+    Overlay context keys win, overlay preferences and notes are appended
+    unless the household already has the same fact, and stats come from the
+    overlay (they are per agent).
+    """
+
+    def _merge(items: str) -> list[dict[str, Any]]:
+        seen = {normalize_key(item["text"]) for item in shared.get(items, [])}
+        return [
+            *shared.get(items, []),
+            *(
+                item
+                for item in overlay.get(items, [])
+                if normalize_key(item["text"]) not in seen
+            ),
+        ]
+
+    return {
+        **shared,
+        "preferences": _merge("preferences"),
+        "notes": _merge("notes"),
+        "context": {**shared.get("context", {}), **overlay.get("context", {})},
+        "stats": overlay.get("stats", {}),
+    }
+
+
+class LayeredMemory:
+    """Household memory shared by all agents plus one agent's overlay.
+
+    Facts learned from conversation go to the household memory; interaction
+    stats, and anything written to the overlay directly, stay with the agent.
+    """
+
+    def __init__(self, shared: AssistantMemory, overlay: AssistantMemory) -> None:
+        """Initialize the layered memory.
+
+        Args:
+            shared: Household memory owned by hass.data[DOMAIN].
+            overlay: This agent's own memory.
+        """
+        self.shared = shared
+        self.overlay = overlay
+        self.entry_id = overlay.entry_id
+        self._prompt: tuple[Mapping[str, Any], Mapping[str, Any], str] | None = None
+
+    async def async_load(self) -> None:
+        """Load both layers."""
+        await self.shared.async_load()
+        await self.overlay.async_load()
+
+    async def async_save(self) -> None:
+        """Write pending changes of both layers."""
+        await self.shared.async_save()
+        await self.overlay.async_save()
+
+    async def add_preference(self, preference: str, category: str = "general") -> None:
+        """Add a household preference."""
+        await self.shared.add_preference(preference, category)
+
+    async def add_note(self, note: str, tags: list[str] | None = None) -> None:
+        """Add a household note."""
+        await self.shared.add_note(note, tags)
+
+    async def set_context(self, key: str, value: Any) -> None:
+        """Set a household context value."""
+        await self.shared.set_context(key, value)
+
+    def get_context(self, key: str, default: Any = None) -> Any:
+        """Get a context value, preferring the agent's overlay."""
+        return self.overlay.get_context(
+            key, self.shared.get_context(key, default)
+        )
+
+    async def record_interaction(
+        self, command: str | None = None, area_id: str | None = None
+    ) -> None:
+        """Record an interaction in the agent's own stats."""
+        await self.overlay.record_interaction(command, area_id)
+
+    def is_habitual(self, command: str) -> bool:
+        """Return whether the agent is given a command regularly."""
+        return self.overlay.is_habitual(command)
+
+    def predict_routines(self, hour: int) -> list[Routine]:
+        """Return the agent's routines at a local hour."""
+        return self.overlay.predict_routines(hour)
+
+    def snapshot(self) -> Mapping[str, Any]:
+        """Return the merged memory data."""
+        return merge_snapshots(self.shared.snapshot(), self.overlay.snapshot())
+
+    def build_memory_prompt(self) -> str:
+        """Build the memory section of the prompt from both layers."""
+        shared = self.shared.snapshot()
+        overlay = self.overlay.snapshot()
+        cached = self._prompt
+        if cached is None or cached[0] is not shared or cached[1] is not overlay:
+            cached = self._prompt = (
+                shared,
+                overlay,
+                render_memory_prompt(merge_snapshots(shared, overlay)),
+            )
+        return cached[2]
+
+    async def async_prune(self, limits: MemoryLimits | None = None) -> None:
+        """Prune both layers.
+
+        The household memory is pruned with the limits of every agent that
+        shares it, so the smallest ones apply to it.
+        """
+        await self.shared.async_prune(limits)
+        await self.overlay.async_prune(limits)
+
+    @property
+    def metrics(self) -> dict[str, Any]:
+        """Return the memory statistics of both layers."""
+        return {"household": self.shared.metrics, "agent": self.overlay.metrics}
+
+    async def async_delete_storage(self) -> None:
+        """Delete the agent's overlay; the household memory is kept."""
+        await self.overlay.async_delete_storage()
+
+
+def async_acquire_household_memory(
+    hass: HomeAssistant, entry_id: str
+) -> AssistantMemory:
+    """Return the household memory, creating it for the first agent.
+
+    The memory is loaded on its first async_load().
+
+    Args:
+        hass: Home Assistant instance.
+        entry_id: Config entry taking a reference; release it on unload.
+    """
+    domain_data = hass.data.setdefault(DOMAIN, {})
+    household = domain_data.get(HOUSEHOLD_MEMORY_KEY)
+    if household is None:
+        household = domain_data[HOUSEHOLD_MEMORY_KEY] = {
+            "memory": AssistantMemory(hass, HOUSEHOLD_MEMORY_ID),
+            "users": set(),
+        }
+    household["users"].add(entry_id)
+    return household["memory"]
+
+
+async def async_release_household_memory(hass: HomeAssistant, entry_id: str) -> None:
+    """Drop an agent's reference, flushing the household memory on the last one."""
+    household = hass.data.get(DOMAIN, {}).get(HOUSEHOLD_MEMORY_KEY)
+    if household is None:
+        return
+    household["users"].discard(entry_id)
+    await household["memory"].async_save()
+    if not household["users"]:
+        hass.data[DOMAIN].pop(HOUSEHOLD_MEMORY_KEY)
@@ -0,0 +1,429 @@
+"""Pool of z.ai API endpoints for z.ai Conversation.
+
+A config entry can spread its requests over several (api_key, base_url)
+pairs. Each endpoint has its own client and shared request scheduler; the
+pool routes requests by least outstanding requests or latency EWMA, ejects
+endpoints that keep failing and probes them back in, and pins conversations
+to one endpoint so the upstream prompt cache keeps hitting.
+"""
+
+from __future__ import annotations
+
+from collections import OrderedDict
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from functools import partial
+import logging
+import time
+from typing import Any
+
+import anthropic
+from anthropic.types import Message, RawMessageStreamEvent
+import httpx
+
+from homeassistant.core import HomeAssistant
+
+from .const import (
+    LOAD_BALANCING_LATENCY,
+    LOAD_BALANCING_LEAST_OUTSTANDING,
+)
+from .recorder import RequestRecorder
+from .scheduler import (
+    PRIORITY_INTERACTIVE,
+    RequestScheduler,
+    async_get_scheduler,
+    estimate_tokens,
+    scheduler_key,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+# Retries after a 429 once the scheduler has waited out the rate limit
+MAX_RATE_LIMIT_RETRIES = 1
+
+# Consecutive 5xx/timeouts before an endpoint is ejected
+EJECT_AFTER_FAILURES = 3
+
+# Ejection backoff, doubled on every failed probe
+EJECT_BASE_SECONDS = 30.0
+EJECT_MAX_SECONDS = 300.0
+
+# Weight of the newest sample in the latency moving average
+LATENCY_EWMA_ALPHA = 0.3
+
+# Conversations remembered for endpoint stickiness
+MAX_STICKY_SESSIONS = 256
+
+# Cheap request used to open a pooled connection ahead of a turn
+WARM_UP_PATH = "/v1/models"
+WARM_UP_TIMEOUT = 5.0
+
+
+def parse_endpoints(
+    api_key: str, base_url: str, extra: str | None
+) -> list[tuple[str, str]]:
+    """Return the (api_key, base_url) pairs configured for an entry.
+
+    Args:
+        api_key: API key of the config entry.
+        base_url: Base URL of the config entry.
+        extra: Extra endpoints, one per line as "api_key" or
+            "api_key base_url". Blank lines and lines starting with # are
+            ignored.
+    """
+    endpoints = [(api_key, base_url)]
+    for line in (extra or "").splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        parts = line.split()
+        pair = (parts[0], parts[1] if len(parts) > 1 else base_url)
+        if pair not in endpoints:
+            endpoints.append(pair)
+    return endpoints
+
+
+def _is_endpoint_failure(err: anthropic.AnthropicError) -> bool:
+    """Return True if an error says something about the endpoint's health."""
+    if isinstance(err, (anthropic.APITimeoutError, anthropic.APIConnectionError)):
+        return True
+    return isinstance(err, anthropic.APIStatusError) and err.status_code >= 500
+
+
+@dataclass
+class PoolEndpoint:
+    """One API key and base URL in the pool."""
+
+    key: str
+    base_url: str
+    client: anthropic.AsyncAnthropic
+    scheduler: RequestScheduler
+    outstanding: int = 0
+    latency_ewma: float | None = None
+    requests: int = 0
+    failures: int = 0
+    consecutive_failures: int = 0
+    ejections: int = 0
+    ejected_until: float = 0.0
+    probing: bool = field(default=False)
+
+    def is_available(self, now: float) -> bool:
+        """Return True if the endpoint may take a request."""
+        if self.ejected_until <= 0:
+            return True
+        # Ejection over: let a single probe request through
+        return now >= self.ejected_until and not self.probing
+
+    def cost(self, strategy: str) -> float:
+        """Return the routing cost of sending one more request here."""
+        if strategy == LOAD_BALANCING_LATENCY:
+            return (self.latency_ewma or 0.0) * (self.outstanding + 1)
+        return self.outstanding + (self.latency_ewma or 0.0) / 1000
+
+    def record_success(self, latency: float) -> None:
+        """Record a successful request."""
+        self.requests += 1
+        self.consecutive_failures = 0
+        if self.ejected_until:
+            _LOGGER.info("z.ai endpoint %s is healthy again", self.base_url)
+        self.ejected_until = 0.0
+        self.ejections = 0
+        if self.latency_ewma is None:
+            self.latency_ewma = latency
+        else:
+            self.latency_ewma += LATENCY_EWMA_ALPHA * (latency - self.latency_ewma)
+
+    def record_failure(self) -> None:
+        """Record a 5xx or timeout, ejecting the endpoint if it keeps failing."""
+        self.requests += 1
+        self.failures += 1
+        self.consecutive_failures += 1
+        if self.ejected_until or self.consecutive_failures >= EJECT_AFTER_FAILURES:
+            self.ejections += 1
+            backoff = min(
+                EJECT_MAX_SECONDS, EJECT_BASE_SECONDS * 2 ** (self.ejections - 1)
+            )
+            self.ejected_until = time.monotonic() + backoff
+            _LOGGER.warning(
+                "Ejecting z.ai endpoint %s for %.0fs after %d failures",
+                self.base_url,
+                backoff,
+                self.consecutive_failures,
+            )
+
+    @property
+    def metrics(self) -> dict[str, Any]:
+        """Return routing and health metrics."""
+        return {
+            "base_url": self.base_url,
+            "outstanding": self.outstanding,
+            "latency_ewma": (
+                round(self.latency_ewma, 3) if self.latency_ewma is not None else None
+            ),
+            "requests": self.requests,
+            "failures": self.failures,
+            "ejected_for": round(max(0.0, self.ejected_until - time.monotonic()), 1),
+            "scheduler": self.scheduler.metrics,
+        }
+
+
+class ZaiClientPool:
+    """Route requests over the endpoints configured for one entry."""
+
+    def __init__(
+        self,
+        endpoints: list[PoolEndpoint],
+        strategy: str = LOAD_BALANCING_LEAST_OUTSTANDING,
+    ) -> None:
+        """Initialize the pool."""
+        self.endpoints = endpoints
+        self.strategy = strategy
+        self._sessions: OrderedDict[str, PoolEndpoint] = OrderedDict()
+        # Set while requests are being recorded
+        self.recorder: RequestRecorder | None = None
+
+    @property
+    def client(self) -> anthropic.AsyncAnthropic:
+        """Return the client of the entry's primary endpoint."""
+        return self.endpoints[0].client
+
+    @property
+    def api_keys(self) -> list[str]:
+        """Return the API keys of the endpoints."""
+        return [endpoint.client.api_key for endpoint in self.endpoints]
+
+    def select(
+        self, session_id: str | None = None, exclude: set[str] | None = None
+    ) -> PoolEndpoint:
+        """Pick the endpoint for a request.
+
+        Args:
+            session_id: Conversation ID; a conversation sticks to the endpoint
+                it started on while that endpoint is healthy.
+            exclude: Endpoint keys that already failed this request.
+        """
+        now = time.monotonic()
+        exclude = exclude or set()
+
+        if session_id and (pinned := self._sessions.get(session_id)):
+            if pinned.key not in exclude and pinned.is_available(now):
+                self._sessions.move_to_end(session_id)
+                return pinned
+
+        candidates = [
+            endpoint
+            for endpoint in self.endpoints
+            if endpoint.key not in exclude and endpoint.is_available(now)
+        ]
+        if candidates:
+            endpoint = min(candidates, key=lambda e: e.cost(self.strategy))
+        else:
+            # Everything is ejected: use whatever comes back first
+            endpoint = min(
+                (e for e in self.endpoints if e.key not in exclude),
+                key=lambda e: e.ejected_until,
+                default=self.endpoints[0],
+            )
+
+        if session_id:
+            self._sessions[session_id] = endpoint
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > MAX_STICKY_SESSIONS:
+                self._sessions.popitem(last=False)
+        return endpoint
+
+    @asynccontextmanager
+    async def _async_request(
+        self,
+        model_args: dict[str, Any],
+        priority: int,
+        session_id: str | None,
+        **kwargs: Any,
+    ) -> AsyncIterator[Any]:
+        """Send a raw messages.create request and hold its slot while in use.
+
+        The raw response is requested so each endpoint's scheduler can learn
+        the account's rate limits from the response headers. A 429 pauses the
+        scheduler for the advertised Retry-After and the request is queued
+        again; a 5xx or timeout fails over to another endpoint if there is one.
+        """
+        tokens = estimate_tokens(model_args)
+        tried: set[str] = set()
+        rate_limited = 0
+
+        while True:
+            endpoint = self.select(session_id, tried)
+            async with endpoint.scheduler.async_slot(priority, tokens):
+                probe = endpoint.ejected_until > 0
+                endpoint.probing = probe
+                endpoint.outstanding += 1
+                start = time.monotonic()
+                try:
+                    try:
+                        response = (
+                            await endpoint.client.messages.with_raw_response.create(
+                                **model_args, **kwargs
+                            )
+                        )
+                    except anthropic.RateLimitError as err:
+                        endpoint.scheduler.record_rate_limited(err.response.headers)
+                        if rate_limited >= MAX_RATE_LIMIT_RETRIES:
+                            raise
+                        rate_limited += 1
+                        continue
+                    except anthropic.AnthropicError as err:
+                        if not _is_endpoint_failure(err):
+                            raise
+                        endpoint.record_failure()
+                        tried.add(endpoint.key)
+                        if len(tried) >= len(self.endpoints):
+                            raise
+                        _LOGGER.debug(
+                            "z.ai endpoint %s failed, trying another",
+                            endpoint.base_url,
+                        )
+                        continue
+
+                    endpoint.record_success(time.monotonic() - start)
+                    endpoint.scheduler.update_from_headers(response.headers)
+                    try:
+                        yield response
+                    except anthropic.AnthropicError as err:
+                        # Streams can still fail after the headers arrived
+                        if _is_endpoint_failure(err):
+                            endpoint.record_failure()
+                        raise
+                    return
+                finally:
+                    endpoint.outstanding -= 1
+                    if probe:
+                        endpoint.probing = False
+
+    async def async_create_message(
+        self,
+        model_args: dict[str, Any],
+        priority: int = PRIORITY_INTERACTIVE,
+        session_id: str | None = None,
+    ) -> Message:
+        """Send a messages.create request through the pool."""
+        if (recorder := self.recorder) is None:
+            async with self._async_request(
+                model_args, priority, session_id
+            ) as response:
+                return response.parse()
+
+        request = recorder.snapshot(model_args)
+        start = time.monotonic()
+        try:
+            async with self._async_request(
+                model_args, priority, session_id
+            ) as response:
+                message = response.parse()
+        except anthropic.AnthropicError as err:
+            recorder.record(request, start, error=str(err))
+            raise
+        recorder.record(request, start, response=message.model_dump(mode="json"))
+        return message
+
+    async def async_stream_message(
+        self,
+        model_args: dict[str, Any],
+        priority: int = PRIORITY_INTERACTIVE,
+        session_id: str | None = None,
+    ) -> AsyncIterator[RawMessageStreamEvent]:
+        """Stream a messages.create request through the pool.
+
+        The scheduler slot is held until the stream is exhausted or closed;
+        a caller that may stop early must close it (contextlib.aclosing).
+        """
+        if (recorder := self.recorder) is None:
+            async with self._async_request(
+                model_args, priority, session_id, stream=True
+            ) as response:
+                async for event in response.parse():
+                    yield event
+            return
+
+        request = {**recorder.snapshot(model_args), "stream": True}
+        start = time.monotonic()
+        events: list[dict[str, Any]] = []
+        first_event: float | None = None
+        error: str | None = None
+        try:
+            async with self._async_request(
+                model_args, priority, session_id, stream=True
+            ) as response:
+                async for event in response.parse():
+                    if first_event is None:
+                        first_event = time.monotonic() - start
+                    events.append(event.model_dump(mode="json"))
+                    yield event
+        except anthropic.AnthropicError as err:
+            error = str(err)
+            raise
+        finally:
+            recorder.record(
+                request, start, events=events, first_event=first_event, error=error
+            )
+
+    async def async_warm_up(self) -> None:
+        """Open a connection to the endpoint the next request will likely use.
+
+        Any answer, even an error status, leaves a connection in the HTTP
+        pool, so TLS setup is out of the way when the real request is sent.
+        """
+        endpoint = self.select()
+        start = time.monotonic()
+        try:
+            await endpoint.client.with_options(
+                max_retries=0, timeout=WARM_UP_TIMEOUT
+            ).get(WARM_UP_PATH, cast_to=httpx.Response)
+        except anthropic.APIStatusError:
+            pass
+        except anthropic.AnthropicError as err:
+            _LOGGER.debug("Warm-up of %s failed: %s", endpoint.base_url, err)
+            return
+        _LOGGER.debug(
+            "Warmed up %s in %.3fs", endpoint.base_url, time.monotonic() - start
+        )
+
+    @property
+    def metrics(self) -> dict[str, Any]:
+        """Return pool metrics for diagnostics."""
+        return {
+            "strategy": self.strategy,
+            "sticky_sessions": len(self._sessions),
+            "endpoints": [endpoint.metrics for endpoint in self.endpoints],
+        }
+
+
+async def async_create_pool(
+    hass: HomeAssistant,
+    endpoints: list[tuple[str, str]],
+    strategy: str,
+    max_in_flight: int,
+) -> ZaiClientPool:
+    """Create the clients for a list of (api_key, base_url) pairs."""
+    pool_endpoints: list[PoolEndpoint] = []
+    for api_key, base_url in endpoints:
+        client = await hass.async_add_executor_job(
+            partial(
+                anthropic.AsyncAnthropic,
+                api_key=api_key,
+                base_url=base_url,
+                default_headers={"x-api-key": api_key},
+                # Retries and failover are the pool's; SDK retries would
+                # multiply the attempts of every 429 and 5xx
+                max_retries=0,
+            )
+        )
+        pool_endpoints.append(
+            PoolEndpoint(
+                key=scheduler_key(api_key, base_url),
+                base_url=base_url,
+                client=client,
+                scheduler=async_get_scheduler(hass, api_key, base_url, max_in_flight),
+            )
+        )
+    return ZaiClientPool(pool_endpoints, strategy)
@@ -0,0 +1,241 @@
+"""Frequent command tracking for z.ai Conversation.
+
+Utterances are normalised into command templates (case, accents,
+punctuation, politeness and numbers folded away, so "Set the heating to 21°
+please" and "set the heating to 19" are the same command) and counted with
+Space-Saving: at most CAPACITY counters, where a new command past capacity
+takes over the smallest counter and inherits its count as its error bound.
+Every command said more often than 1/CAPACITY of the time is guaranteed to
+keep a counter, and commands just below the top are not thrown away.
+
+Counts decay with forward decay: an occurrence at time t adds
+2 ** ((t - landmark) / half_life) instead of 1, so the current count is the
+stored weight scaled by 2 ** ((landmark - now) / half_life) and no counter
+has to be touched as time passes. There is one sketch per window (a day and
+a week half-life), so both recent and steady habits show up.
+"""
+
+from __future__ import annotations
+
+import heapq
+from operator import itemgetter
+import re
+from typing import Any, Final
+
+from .memory_intent import fold_text
+
+# Counters per window
+CAPACITY: Final = 64
+
+# Half-life of the counts of each window, in seconds
+WINDOW_DAY: Final = "day"
+WINDOW_WEEK: Final = "week"
+HALF_LIVES: Final[dict[str, float]] = {
+    WINDOW_DAY: 86400.0,
+    WINDOW_WEEK: 7 * 86400.0,
+}
+
+# Weekly count a command needs (at least) to be a habit of the household
+HABITUAL_COUNT: Final = 3.0
+
+# Weights are rescaled to a new landmark once they grow past 2 ** this
+_RESCALE_EXPONENT: Final = 32.0
+
+_NUMBER: Final = re.compile(r"\d+(?:[.,]\d+)?")
+_NON_WORD: Final = re.compile(r"[^\w#]+")
+_POLITENESS: Final = re.compile(
+    r"\b(?:please|per favore|per piacere|s il te plait|s il vous plait|"
+    r"bitte|por favor)\b"
+)
+
+
+def command_template(text: str) -> str:
+    """Return the template of an utterance that its count is kept under."""
+    folded = _NUMBER.sub("#", fold_text(text))
+    folded = _NON_WORD.sub(" ", folded)
+    return " ".join(_POLITENESS.sub(" ", folded).split())
+
+
+class HeavyHitters:
+    """Space-Saving counters with exponentially decaying counts.
+
+    Tracked commands are in a dict; a heap of (weight, key) finds the
+    smallest counter to replace. Weights only grow, so heap entries are
+    refreshed lazily when they reach the top: counting a tracked command
+    is one dict update, counting a new one past capacity O(log CAPACITY)
+    amortised.
+    """
+
+    def __init__(
+        self, half_life: float, landmark: float, capacity: int = CAPACITY
+    ) -> None:
+        """Initialize empty counters.
+
+        Args:
+            half_life: Seconds after which a count is worth half.
+            landmark: Time the stored weights are relative to.
+            capacity: Most counters kept.
+        """
+        self.capacity = capacity
+        self.half_life = half_life
+        self.landmark = landmark
+        # Key -> [weight, error], both relative to the landmark
+        self._counters: dict[str, list[float]] = {}
+        # One (weight, key) entry per counter, possibly lower than its weight
+        self._heap: list[tuple[float, str]] = []
+
+    def __len__(self) -> int:
+        """Return the number of counters in use."""
+        return len(self._counters)
+
+    def _scale(self, now: float) -> float:
+        """Return the weight of one occurrence at now."""
+        return 2.0 ** ((now - self.landmark) / self.half_life)
+
+    def add(self, key: str, now: float, count: float = 1.0) -> None:
+        """Count occurrences of key at now."""
+        if (now - self.landmark) / self.half_life > _RESCALE_EXPONENT:
+            self._rescale(now)
+        weight = count * self._scale(now)
+
+        if (counter := self._counters.get(key)) is not None:
+            counter[0] += weight
+            return
+
+        if len(self._counters) < self.capacity:
+            self._counters[key] = [weight, 0.0]
+            heapq.heappush(self._heap, (weight, key))
+            return
+
+        # Replace the smallest counter, refreshing stale heap entries on the way
+        while True:
+            stored, victim = self._heap[0]
+            current = self._counters[victim][0]
+            if stored == current:
+                break
+            heapq.heapreplace(self._heap, (current, victim))
+        del self._counters[victim]
+        self._counters[key] = [current + weight, current]
+        heapq.heapreplace(self._heap, (current + weight, key))
+
+    def _rescale(self, now: float) -> None:
+        """Move the landmark to now so weights stay small."""
+        factor = 1 / self._scale(now)
+        for counter in self._counters.values():
+            counter[0] *= factor
+            counter[1] *= factor
+        self._heap = [(counter[0], key) for key, counter in self._counters.items()]
+        heapq.heapify(self._heap)
+        self.landmark = now
+
+    def count(self, key: str, now: float) -> tuple[float, float]:
+        """Return the estimated and the guaranteed count of key at now."""
+        if (counter := self._counters.get(key)) is None:
+            return 0.0, 0.0
+        factor = 1 / self._scale(now)
+        return counter[0] * factor, (counter[0] - counter[1]) * factor
+
+    def top(self, count: int, now: float) -> list[tuple[str, float]]:
+        """Return the count most frequent keys with their estimated counts."""
+        factor = 1 / self._scale(now)
+        return [
+            (key, counter[0] * factor)
+            for key, counter in heapq.nlargest(
+                count, self._counters.items(), key=lambda item: item[1][0]
+            )
+        ]
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the counters as JSON-serialisable data."""
+        return {
+            "landmark": self.landmark,
+            "counters": {key: list(counter) for key, counter in self._counters.items()},
+        }
+
+    @classmethod
+    def from_dict(
+        cls, half_life: float, data: dict[str, Any], capacity: int = CAPACITY
+    ) -> HeavyHitters:
+        """Restore counters saved with as_dict."""
+        sketch = cls(half_life, float(data["landmark"]), capacity)
+        counters = sorted(
+            (
+                (key, [float(counter[0]), float(counter[1])])
+                for key, counter in data.get("counters", {}).items()
+            ),
+            key=lambda item: item[1][0],
+            reverse=True,
+        )[:capacity]
+        sketch._counters = dict(counters)
+        sketch._heap = [(counter[0], key) for key, counter in counters]
+        heapq.heapify(sketch._heap)
+        return sketch
+
+
+class CommandStats:
+    """Decaying counts of the commands an agent is given, per window."""
+
+    def __init__(self, now: float) -> None:
+        """Initialize empty counts.
+
+        Args:
+            now: Current time, as a timestamp.
+        """
+        self.windows = {
+            window: HeavyHitters(half_life, now)
+            for window, half_life in HALF_LIVES.items()
+        }
+
+    def add(self, text: str, now: float, count: float = 1.0) -> str:
+        """Count an utterance in every window.
+
+        Returns:
+            The command template it was counted under.
+        """
+        template = command_template(text)
+        if template:
+            for sketch in self.windows.values():
+                sketch.add(template, now, count)
+        return template
+
+    def top(
+        self, count: int, now: float, window: str = WINDOW_WEEK
+    ) -> list[tuple[str, float]]:
+        """Return the most frequent command templates of a window."""
+        return self.windows[window].top(count, now)
+
+    def is_habitual(self, text: str, now: float) -> bool:
+        """Return whether an utterance is one of the household's habits."""
+        template = command_template(text)
+        _, guaranteed = self.windows[WINDOW_WEEK].count(template, now)
+        return guaranteed >= HABITUAL_COUNT
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the counts as JSON-serialisable data."""
+        return {window: sketch.as_dict() for window, sketch in self.windows.items()}
+
+    @classmethod
+    def from_data(cls, data: dict[str, Any], now: float) -> CommandStats:
+        """Restore counts from memory data.
+
+        Memory written before the sketch keeps exact counts in
+        stats.frequent_commands; those are counted as of now.
+        """
+        stats = cls(now)
+        saved = data.get("commands")
+        if isinstance(saved, dict):
+            for window, half_life in HALF_LIVES.items():
+                if window in saved:
+                    try:
+                        stats.windows[window] = HeavyHitters.from_dict(
+                            half_life, saved[window]
+                        )
+                    except (KeyError, TypeError, ValueError, IndexError):
+                        pass
+            return stats
+
+        frequent = data.get("stats", {}).get("frequent_commands", {})
+        for command, count in sorted(frequent.items(), key=itemgetter(1)):
+            if isinstance(count, (int, float)) and count > 0:
+                stats.add(command, now, float(count))
+        return stats
@@ -3,11 +3,11 @@
 from __future__ import annotations
 
 from functools import partial
+import importlib
 import logging
 from types import MappingProxyType
 from typing import Any
 
-import anthropic
 import voluptuous as vol
 
 from homeassistant.config_entries import (
@@ -34,17 +34,37 @@ from homeassistant.helpers.selector import (
 )
 
 from .const import (
+    CONF_ADAPTIVE_ROUTING,
     CONF_AREA_FILTER,
     CONF_BASE_URL,
     CONF_CHAT_MODEL,
+    CONF_EXTRA_ENDPOINTS,
+    CONF_FAST_MODEL,
+    CONF_LAZY_STARTUP,
     CONF_LLM_HASS_API,
+    CONF_LOAD_BALANCING,
+    CONF_LOCAL_CONFIRMATION,
+    CONF_MAX_CONTEXT,
+    CONF_MAX_IN_FLIGHT,
+    CONF_MAX_NOTES,
+    CONF_MAX_PREFERENCES,
     CONF_MAX_TOKENS,
     CONF_MEMORY_ENABLED,
+    CONF_NAME_HINTS,
+    CONF_NOTE_TTL,
     CONF_OUTPUT_LANGUAGE,
     CONF_PERSONALITY,
     CONF_PROMPT,
     CONF_RECOMMENDED,
+    CONF_REQUEST_RECORDING,
+    CONF_ROUTINE_PREFETCH,
+    CONF_ROUTING_THRESHOLD,
+    CONF_SATELLITE_CONTEXT,
+    CONF_SHARED_MEMORY,
     CONF_TEMPERATURE,
+    CONF_TOOL_RESULT_COMPACTION,
+    CONF_TRACE_EXPORT,
+    CONF_TRACE_SAMPLE_RATE,
     CONF_USE_CUSTOM_PROMPT,
     DEFAULT,
     DEFAULT_BASE_URL,
@@ -56,6 +76,7 @@ from .const import (
     LANGUAGE_ITALIAN,
     LANGUAGE_OPTIONS,
     LANGUAGE_SPANISH,
+    LOAD_BALANCING_OPTIONS,
     MODELS,
     PERSONALITY_CONCISE,
     PERSONALITY_FORMAL,
@@ -93,6 +114,11 @@ async def validate_input(hass: HomeAssistant, data: dict[str, Any]) -> None:
     api_key = data[CONF_API_KEY]
     base_url = data.get(CONF_BASE_URL, DEFAULT_BASE_URL)
 
+    # The SDK is only imported once it is needed
+    anthropic = await hass.async_add_import_executor_job(
+        importlib.import_module, "anthropic"
+    )
+
     client = await hass.async_add_executor_job(
         partial(
             anthropic.AsyncAnthropic,
@@ -140,6 +166,9 @@ class ZaiConfigFlow(ConfigFlow, domain=DOMAIN):
         errors: dict[str, str] = {}
 
         if user_input is not None:
+            anthropic = await self.hass.async_add_import_executor_job(
+                importlib.import_module, "anthropic"
+            )
             try:
                 await validate_input(self.hass, user_input)
             except anthropic.APITimeoutError:
@@ -213,6 +242,14 @@ class ZaiOptionsFlowHandler(OptionsFlow):
             )
         ] = BooleanSelector()
 
+        # Household memory toggle
+        schema_dict[
+            vol.Optional(
+                CONF_SHARED_MEMORY,
+                default=options.get(CONF_SHARED_MEMORY, DEFAULT[CONF_SHARED_MEMORY]),
+            )
+        ] = BooleanSelector()
+
         # Use custom prompt toggle
         schema_dict[
             vol.Optional(
@@ -240,6 +277,50 @@ class ZaiOptionsFlowHandler(OptionsFlow):
             )
         )
 
+        # Adaptive model routing toggle
+        schema_dict[
+            vol.Optional(
+                CONF_ADAPTIVE_ROUTING,
+                default=options.get(CONF_ADAPTIVE_ROUTING, DEFAULT[CONF_ADAPTIVE_ROUTING]),
+            )
+        ] = BooleanSelector()
+
+        # Name hints toggle
+        schema_dict[
+            vol.Optional(
+                CONF_NAME_HINTS,
+                default=options.get(CONF_NAME_HINTS, DEFAULT[CONF_NAME_HINTS]),
+            )
+        ] = BooleanSelector()
+
+        # Local confirmation toggle
+        schema_dict[
+            vol.Optional(
+                CONF_LOCAL_CONFIRMATION,
+                default=options.get(
+                    CONF_LOCAL_CONFIRMATION, DEFAULT[CONF_LOCAL_CONFIRMATION]
+                ),
+            )
+        ] = BooleanSelector()
+
+        # Routine prefetch toggle
+        schema_dict[
+            vol.Optional(
+                CONF_ROUTINE_PREFETCH,
+                default=options.get(
+                    CONF_ROUTINE_PREFETCH, DEFAULT[CONF_ROUTINE_PREFETCH]
+                ),
+            )
+        ] = BooleanSelector()
+
+        # Lazy startup toggle
+        schema_dict[
+            vol.Optional(
+                CONF_LAZY_STARTUP,
+                default=options.get(CONF_LAZY_STARTUP, DEFAULT[CONF_LAZY_STARTUP]),
+            )
+        ] = BooleanSelector()
+
         # LLM API selector
         schema_dict[
             vol.Optional(
@@ -301,6 +382,30 @@ class ZaiOptionsFlowHandler(OptionsFlow):
                         )
                     )
                 ),
+                vol.Optional(
+                    CONF_FAST_MODEL,
+                    default=options.get(CONF_FAST_MODEL, DEFAULT[CONF_FAST_MODEL]),
+                ): (
+                    SelectSelector(
+                        SelectSelectorConfig(
+                            mode=SelectSelectorMode.DROPDOWN,
+                            options=MODELS,
+                            custom_value=True,
+                        )
+                    )
+                ),
+                vol.Optional(
+                    CONF_ROUTING_THRESHOLD,
+                    default=options.get(CONF_ROUTING_THRESHOLD, DEFAULT[CONF_ROUTING_THRESHOLD]),
+                ): (
+                    NumberSelector(
+                        NumberSelectorConfig(
+                            min=0,
+                            max=6,
+                            mode=NumberSelectorMode.BOX,
+                        )
+                    )
+                ),
                 vol.Optional(
                     CONF_MAX_TOKENS,
                     default=options.get(CONF_MAX_TOKENS, DEFAULT[CONF_MAX_TOKENS]),
@@ -326,6 +431,63 @@ class ZaiOptionsFlowHandler(OptionsFlow):
                         )
                     )
                 ),
+                vol.Optional(
+                    CONF_MAX_IN_FLIGHT,
+                    default=options.get(CONF_MAX_IN_FLIGHT, DEFAULT[CONF_MAX_IN_FLIGHT]),
+                ): (
+                    NumberSelector(
+                        NumberSelectorConfig(
+                            min=1,
+                            max=32,
+                            mode=NumberSelectorMode.BOX,
+                        )
+                    )
+                ),
+                vol.Optional(
+                    CONF_EXTRA_ENDPOINTS,
+                    default=options.get(CONF_EXTRA_ENDPOINTS, DEFAULT[CONF_EXTRA_ENDPOINTS]),
+                ): TextSelector(TextSelectorConfig(multiline=True)),
+                vol.Optional(
+                    CONF_LOAD_BALANCING,
+                    default=options.get(CONF_LOAD_BALANCING, DEFAULT[CONF_LOAD_BALANCING]),
+                ): (
+                    SelectSelector(
+                        SelectSelectorConfig(
+                            mode=SelectSelectorMode.DROPDOWN,
+                            options=LOAD_BALANCING_OPTIONS,
+                            translation_key=CONF_LOAD_BALANCING,
+                        )
+                    )
+                ),
+                vol.Optional(
+                    CONF_TOOL_RESULT_COMPACTION,
+                    default=options.get(
+                        CONF_TOOL_RESULT_COMPACTION, DEFAULT[CONF_TOOL_RESULT_COMPACTION]
+                    ),
+                ): TextSelector(TextSelectorConfig(multiline=True)),
+                vol.Optional(
+                    CONF_TRACE_SAMPLE_RATE,
+                    default=options.get(CONF_TRACE_SAMPLE_RATE, DEFAULT[CONF_TRACE_SAMPLE_RATE]),
+                ): (
+                    NumberSelector(
+                        NumberSelectorConfig(
+                            min=0,
+                            max=1,
+                            step=0.05,
+                            mode=NumberSelectorMode.SLIDER,
+                        )
+                    )
+                ),
+                vol.Optional(
+                    CONF_TRACE_EXPORT,
+                    default=options.get(CONF_TRACE_EXPORT, DEFAULT[CONF_TRACE_EXPORT]),
+                ): TextSelector(),
+                vol.Optional(
+                    CONF_REQUEST_RECORDING,
+                    default=options.get(
+                        CONF_REQUEST_RECORDING, DEFAULT[CONF_REQUEST_RECORDING]
+                    ),
+                ): TextSelector(),
                 vol.Optional(
                     CONF_AREA_FILTER,
                     default=options.get(CONF_AREA_FILTER, DEFAULT[CONF_AREA_FILTER]),
@@ -346,6 +508,60 @@ class ZaiOptionsFlowHandler(OptionsFlow):
                         )
                     )
                 ),
+                vol.Optional(
+                    CONF_SATELLITE_CONTEXT,
+                    default=options.get(
+                        CONF_SATELLITE_CONTEXT, DEFAULT[CONF_SATELLITE_CONTEXT]
+                    ),
+                ): BooleanSelector(),
+                vol.Optional(
+                    CONF_NOTE_TTL,
+                    default=options.get(CONF_NOTE_TTL, DEFAULT[CONF_NOTE_TTL]),
+                ): (
+                    NumberSelector(
+                        NumberSelectorConfig(
+                            min=0,
+                            max=365,
+                            mode=NumberSelectorMode.BOX,
+                        )
+                    )
+                ),
+                vol.Optional(
+                    CONF_MAX_PREFERENCES,
+                    default=options.get(CONF_MAX_PREFERENCES, DEFAULT[CONF_MAX_PREFERENCES]),
+                ): (
+                    NumberSelector(
+                        NumberSelectorConfig(
+                            min=1,
+                            max=500,
+                            mode=NumberSelectorMode.BOX,
+                        )
+                    )
+                ),
+                vol.Optional(
+                    CONF_MAX_NOTES,
+                    default=options.get(CONF_MAX_NOTES, DEFAULT[CONF_MAX_NOTES]),
+                ): (
+                    NumberSelector(
+                        NumberSelectorConfig(
+                            min=1,
+                            max=500,
+                            mode=NumberSelectorMode.BOX,
+                        )
+                    )
+                ),
+                vol.Optional(
+                    CONF_MAX_CONTEXT,
+                    default=options.get(CONF_MAX_CONTEXT, DEFAULT[CONF_MAX_CONTEXT]),
+                ): (
+                    NumberSelector(
+                        NumberSelectorConfig(
+                            min=1,
+                            max=500,
+                            mode=NumberSelectorMode.BOX,
+                        )
+                    )
+                ),
             }
         )
 
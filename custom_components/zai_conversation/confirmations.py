@@ -0,0 +1,209 @@
+"""Local confirmations of simple device commands for z.ai Conversation.
+
+Most device commands take two model calls: one returns the tool call, the
+second only turns its result into "Fatto! Ho acceso le luci.". When every
+tool call of a round was a simple actuation intent and succeeded on all its
+targets, that answer is predictable, so the tool loop can stop there and
+confirm locally from the tool results, in the configured personality and
+output language.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Sequence
+from typing import Final
+
+from homeassistant.components import conversation
+
+from .const import (
+    LANGUAGE_ENGLISH,
+    LANGUAGE_FRENCH,
+    LANGUAGE_GERMAN,
+    LANGUAGE_ITALIAN,
+    LANGUAGE_SPANISH,
+    PERSONALITY_CONCISE,
+    PERSONALITY_FORMAL,
+    PERSONALITY_FRIENDLY,
+)
+
+# What each intent did, per language; only these intents are confirmed
+# locally. Phrases are past participles fitting the sentences below.
+ACTIONS: Final[dict[str, dict[str, str]]] = {
+    LANGUAGE_ENGLISH: {
+        "HassTurnOn": "turned on {names}",
+        "HassTurnOff": "turned off {names}",
+        "HassToggle": "toggled {names}",
+        "HassLightSet": "adjusted {names}",
+        "HassSetPosition": "moved {names}",
+        "HassMediaPause": "paused {names}",
+        "HassMediaUnpause": "resumed {names}",
+        "HassMediaNext": "skipped to the next track on {names}",
+        "HassMediaPrevious": "gone back a track on {names}",
+        "HassSetVolume": "set the volume of {names}",
+        "HassClimateSetTemperature": "set the temperature of {names}",
+    },
+    LANGUAGE_FRENCH: {
+        "HassTurnOn": "allumé {names}",
+        "HassTurnOff": "éteint {names}",
+        "HassToggle": "basculé {names}",
+        "HassLightSet": "réglé {names}",
+        "HassSetPosition": "déplacé {names}",
+        "HassMediaPause": "mis en pause {names}",
+        "HassMediaUnpause": "relancé {names}",
+        "HassMediaNext": "passé au morceau suivant sur {names}",
+        "HassMediaPrevious": "remis le morceau précédent sur {names}",
+        "HassSetVolume": "réglé le volume de {names}",
+        "HassClimateSetTemperature": "réglé la température de {names}",
+    },
+    LANGUAGE_ITALIAN: {
+        "HassTurnOn": "acceso {names}",
+        "HassTurnOff": "spento {names}",
+        "HassToggle": "commutato {names}",
+        "HassLightSet": "regolato {names}",
+        "HassSetPosition": "spostato {names}",
+        "HassMediaPause": "messo in pausa {names}",
+        "HassMediaUnpause": "ripreso {names}",
+        "HassMediaNext": "selezionato il brano successivo su {names}",
+        "HassMediaPrevious": "selezionato il brano precedente su {names}",
+        "HassSetVolume": "regolato il volume di {names}",
+        "HassClimateSetTemperature": "impostato la temperatura di {names}",
+    },
+    LANGUAGE_GERMAN: {
+        "HassTurnOn": "{names} eingeschaltet",
+        "HassTurnOff": "{names} ausgeschaltet",
+        "HassToggle": "{names} umgeschaltet",
+        "HassLightSet": "{names} eingestellt",
+        "HassSetPosition": "{names} bewegt",
+        "HassMediaPause": "{names} pausiert",
+        "HassMediaUnpause": "{names} fortgesetzt",
+        "HassMediaNext": "auf {names} den nächsten Titel gestartet",
+        "HassMediaPrevious": "auf {names} den vorherigen Titel gestartet",
+        "HassSetVolume": "die Lautstärke von {names} eingestellt",
+        "HassClimateSetTemperature": "die Temperatur von {names} eingestellt",
+    },
+    LANGUAGE_SPANISH: {
+        "HassTurnOn": "encendido {names}",
+        "HassTurnOff": "apagado {names}",
+        "HassToggle": "cambiado {names}",
+        "HassLightSet": "ajustado {names}",
+        "HassSetPosition": "movido {names}",
+        "HassMediaPause": "pausado {names}",
+        "HassMediaUnpause": "reanudado {names}",
+        "HassMediaNext": "pasado a la siguiente pista en {names}",
+        "HassMediaPrevious": "vuelto a la pista anterior en {names}",
+        "HassSetVolume": "ajustado el volumen de {names}",
+        "HassClimateSetTemperature": "ajustado la temperatura de {names}",
+    },
+}
+
+# Target types of an intent response that stand for all of their entities
+GROUP_TARGET_TYPES: Final = ("floor", "area")
+
+# More entities than this are left to the model to summarize
+MAX_CONFIRMED_NAMES: Final = 3
+
+CONJUNCTIONS: Final[dict[str, str]] = {
+    LANGUAGE_ENGLISH: "and",
+    LANGUAGE_FRENCH: "et",
+    LANGUAGE_ITALIAN: "e",
+    LANGUAGE_GERMAN: "und",
+    LANGUAGE_SPANISH: "y",
+}
+
+# Confirmation sentence per personality and language
+CONFIRMATIONS: Final[dict[str, dict[str, str]]] = {
+    PERSONALITY_FRIENDLY: {
+        LANGUAGE_ENGLISH: "Done! I've {actions}.",
+        LANGUAGE_FRENCH: "C'est fait ! J'ai {actions}.",
+        LANGUAGE_ITALIAN: "Fatto! Ho {actions}.",
+        LANGUAGE_GERMAN: "Erledigt! Ich habe {actions}.",
+        LANGUAGE_SPANISH: "¡Hecho! He {actions}.",
+    },
+    PERSONALITY_FORMAL: {
+        LANGUAGE_ENGLISH: "I have {actions}.",
+        LANGUAGE_FRENCH: "J'ai {actions} comme demandé.",
+        LANGUAGE_ITALIAN: "Ho {actions} come richiesto.",
+        LANGUAGE_GERMAN: "Ich habe wie gewünscht {actions}.",
+        LANGUAGE_SPANISH: "He {actions} como se solicitó.",
+    },
+    PERSONALITY_CONCISE: {
+        LANGUAGE_ENGLISH: "{actions}.",
+        LANGUAGE_FRENCH: "{actions}.",
+        LANGUAGE_ITALIAN: "{actions}.",
+        LANGUAGE_GERMAN: "{actions}.",
+        LANGUAGE_SPANISH: "{actions}.",
+    },
+}
+
+
+def _join(items: list[str], conjunction: str) -> str:
+    """Join items as "a, b and c"."""
+    if len(items) == 1:
+        return items[0]
+    return f"{', '.join(items[:-1])} {conjunction} {items[-1]}"
+
+
+def _succeeded_names(result: object) -> list[str] | None:
+    """Return the names to confirm for an intent that succeeded on all targets.
+
+    Like Home Assistant's own speech, an intent aimed at a floor or area is
+    confirmed with the floor or area name (listed first among the successes,
+    before each of its entities), other intents with their entity names.
+
+    None if the intent failed, failed on a target, named no target or
+    succeeded on more than MAX_CONFIRMED_NAMES entities.
+    """
+    if not isinstance(result, dict) or result.get("response_type") != "action_done":
+        return None
+    data = result.get("data")
+    if not isinstance(data, dict) or data.get("failed"):
+        return None
+    targets = [
+        target
+        for target in data.get("success") or ()
+        if isinstance(target, dict) and target.get("name")
+    ]
+    for target_type in GROUP_TARGET_TYPES:
+        if group := [
+            str(target["name"])
+            for target in targets
+            if target.get("type") == target_type
+        ]:
+            return list(dict.fromkeys(group))
+    names = list(dict.fromkeys(str(target["name"]) for target in targets))
+    if not names or len(names) > MAX_CONFIRMED_NAMES:
+        return None
+    return names
+
+
+def build_confirmation(
+    results: Sequence[conversation.ToolResultContent],
+    language: str,
+    personality: str,
+) -> str | None:
+    """Return a local confirmation of a round of tool calls.
+
+    Args:
+        results: Tool results of the round.
+        language: Output language.
+        personality: Personality of the answer.
+
+    Returns None unless every call is a simple actuation intent that
+    succeeded on all of its targets; the model answers then.
+    """
+    actions = ACTIONS.get(language)
+    if not results or actions is None:
+        return None
+
+    conjunction = CONJUNCTIONS[language]
+    phrases: list[str] = []
+    for content in results:
+        template = actions.get(content.tool_name)
+        names = _succeeded_names(content.tool_result)
+        if template is None or names is None:
+            return None
+        phrases.append(template.format(names=_join(names, conjunction)))
+
+    sentence = CONFIRMATIONS.get(personality, CONFIRMATIONS[PERSONALITY_FRIENDLY])
+    text = sentence[language].format(actions=_join(phrases, conjunction))
+    return text[0].upper() + text[1:]
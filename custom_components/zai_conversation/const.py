@@ -23,6 +23,26 @@ CONF_MEMORY_ENABLED: Final = "memory_enabled"
 CONF_AREA_FILTER: Final = "area_filter"
 CONF_USE_CUSTOM_PROMPT: Final = "use_custom_prompt"
 CONF_OUTPUT_LANGUAGE: Final = "output_language"
+CONF_MAX_IN_FLIGHT: Final = "max_in_flight"
+CONF_EXTRA_ENDPOINTS: Final = "extra_endpoints"
+CONF_LOAD_BALANCING: Final = "load_balancing"
+CONF_ADAPTIVE_ROUTING: Final = "adaptive_routing"
+CONF_FAST_MODEL: Final = "fast_model"
+CONF_ROUTING_THRESHOLD: Final = "routing_threshold"
+CONF_SHARED_MEMORY: Final = "shared_memory"
+CONF_LAZY_STARTUP: Final = "lazy_startup"
+CONF_TRACE_SAMPLE_RATE: Final = "trace_sample_rate"
+CONF_TRACE_EXPORT: Final = "trace_export"
+CONF_REQUEST_RECORDING: Final = "request_recording"
+CONF_NAME_HINTS: Final = "name_hints"
+CONF_TOOL_RESULT_COMPACTION: Final = "tool_result_compaction"
+CONF_LOCAL_CONFIRMATION: Final = "local_confirmation"
+CONF_SATELLITE_CONTEXT: Final = "satellite_context"
+CONF_NOTE_TTL: Final = "note_ttl"
+CONF_MAX_PREFERENCES: Final = "max_preferences"
+CONF_MAX_NOTES: Final = "max_notes"
+CONF_MAX_CONTEXT: Final = "max_context"
+CONF_ROUTINE_PREFETCH: Final = "routine_prefetch"
 
 # Personality options
 PERSONALITY_FORMAL: Final = "formal"
@@ -50,8 +70,18 @@ LANGUAGE_OPTIONS: Final = [
     LANGUAGE_SPANISH,
 ]
 
+# Load balancing strategies for multiple API keys / endpoints
+LOAD_BALANCING_LEAST_OUTSTANDING: Final = "least_outstanding"
+LOAD_BALANCING_LATENCY: Final = "latency_ewma"
+
+LOAD_BALANCING_OPTIONS: Final = [
+    LOAD_BALANCING_LEAST_OUTSTANDING,
+    LOAD_BALANCING_LATENCY,
+]
+
 # Default values
 DEFAULT_BASE_URL: Final = "https://api.z.ai/api/anthropic"
+DEFAULT_MAX_IN_FLIGHT: Final = 4
 
 DEFAULT: Final = {
     CONF_CHAT_MODEL: "glm-4.7",
@@ -63,6 +93,26 @@ DEFAULT: Final = {
     CONF_AREA_FILTER: [],  # Empty = all areas
     CONF_USE_CUSTOM_PROMPT: True,  # Use our optimized prompt by default
     CONF_OUTPUT_LANGUAGE: LANGUAGE_ENGLISH,  # Default output language
+    CONF_MAX_IN_FLIGHT: DEFAULT_MAX_IN_FLIGHT,  # Shared per API key and base URL
+    CONF_EXTRA_ENDPOINTS: "",  # Extra "api_key [base_url]" lines
+    CONF_LOAD_BALANCING: LOAD_BALANCING_LEAST_OUTSTANDING,
+    CONF_ADAPTIVE_ROUTING: False,  # Send simple commands to the fast model
+    CONF_FAST_MODEL: "glm-4-flash",
+    CONF_ROUTING_THRESHOLD: 1,  # Highest complexity score for the fast model
+    CONF_SHARED_MEMORY: False,  # One household memory for all agents
+    CONF_LAZY_STARTUP: False,  # Create the client on the first turn
+    CONF_TRACE_SAMPLE_RATE: 0.0,  # Fraction of turns exported as OTLP traces
+    CONF_TRACE_EXPORT: "zai_conversation_traces.jsonl",  # File or collector URL
+    CONF_REQUEST_RECORDING: "",  # Requests recorded to this file, off if empty
+    CONF_NAME_HINTS: True,  # Add exact entity and area names to the utterance
+    CONF_TOOL_RESULT_COMPACTION: "",  # "tool_name mode" lines, all compact if empty
+    CONF_LOCAL_CONFIRMATION: False,  # Confirm simple commands without a 2nd call
+    CONF_SATELLITE_CONTEXT: False,  # Detail only the satellite's area and floor
+    CONF_NOTE_TTL: 30,  # Days a note is kept after it was last said, 0 = forever
+    CONF_MAX_PREFERENCES: 50,  # Most relevant facts kept per memory category
+    CONF_MAX_NOTES: 50,
+    CONF_MAX_CONTEXT: 50,
+    CONF_ROUTINE_PREFETCH: False,  # Prepare learned routines before their hour
 }
 
 # Available GLM-4 models
@@ -80,3 +130,44 @@ SUBENTRY_CONVERSATION: Final = "conversation"
 
 # Memory storage key
 MEMORY_KEY: Final = "memory"
+
+# Household memory shared by all agents (in hass.data[DOMAIN])
+HOUSEHOLD_MEMORY_KEY: Final = "household_memory"
+
+# Versioned device context builder of an entry
+DEVICE_CONTEXT_KEY: Final = "device_context"
+
+# Model router key
+ROUTER_KEY: Final = "router"
+
+# Turn tracer of an entry
+TRACER_KEY: Final = "tracer"
+
+# Entity and area name resolver of an entry
+RESOLVER_KEY: Final = "name_resolver"
+
+# Tool result compactor of an entry
+COMPACTOR_KEY: Final = "tool_results"
+
+# Caches of an entry kept across reloads, and the parked ones (in
+# hass.data[DOMAIN])
+CACHES_KEY: Final = "caches"
+STANDBY_KEY: Final = "standby"
+
+# Services
+SERVICE_PREWARM: Final = "prewarm"
+SERVICE_PROCESS_BATCH: Final = "process_batch"
+
+ATTR_PROMPTS: Final = "prompts"
+ATTR_MAX_CONCURRENCY: Final = "max_concurrency"
+ATTR_LANGUAGE: Final = "language"
+
+DEFAULT_BATCH_CONCURRENCY: Final = 4
+MAX_BATCH_CONCURRENCY: Final = 16
+
+# Setup timings and the lazy initialization task of an entry
+STARTUP_KEY: Final = "startup"
+READY_KEY: Final = "ready"
+
+# Shared request schedulers, keyed by API key and base URL
+SCHEDULERS_KEY: Final = "schedulers"
@@ -2,51 +2,149 @@
 
 from __future__ import annotations
 
-from collections.abc import Iterable
+import asyncio
+from collections.abc import AsyncGenerator, AsyncIterator, Iterable
+from contextlib import aclosing, nullcontext
+import dataclasses
+from datetime import datetime
+import json
 import logging
 import re
-from typing import Any, Literal
-
-import anthropic
-from anthropic.types import (
-    Message,
-    MessageParam,
-    TextBlockParam,
-    ToolParam,
-)
+import time
+from typing import TYPE_CHECKING, Any, Literal
+
+import voluptuous as vol
 import voluptuous_openapi
 
 from homeassistant.components import conversation
+from homeassistant.components.conversation import trace
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
+from homeassistant.const import ATTR_DEVICE_ID
+from homeassistant.core import Context, HomeAssistant, ServiceResponse, SupportsResponse
 from homeassistant.exceptions import HomeAssistantError
-from homeassistant.helpers import llm
+from homeassistant.helpers import (
+    chat_session,
+    config_validation as cv,
+    entity_platform,
+    llm,
+)
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
+from homeassistant.helpers.event import async_track_time_change
 
-from .assistant_memory import AssistantMemory
+from . import async_wait_ready
+from .assistant_memory import AssistantMemory, LayeredMemory
 from .const import (
+    ATTR_LANGUAGE,
+    ATTR_MAX_CONCURRENCY,
+    ATTR_PROMPTS,
+    CACHES_KEY,
+    COMPACTOR_KEY,
+    CONF_ADAPTIVE_ROUTING,
     CONF_AREA_FILTER,
     CONF_CHAT_MODEL,
+    CONF_FAST_MODEL,
     CONF_LLM_HASS_API,
+    CONF_LOCAL_CONFIRMATION,
     CONF_MAX_TOKENS,
     CONF_MEMORY_ENABLED,
+    CONF_NAME_HINTS,
     CONF_OUTPUT_LANGUAGE,
     CONF_PERSONALITY,
     CONF_PROMPT,
     CONF_RECOMMENDED,
+    CONF_ROUTINE_PREFETCH,
+    CONF_ROUTING_THRESHOLD,
+    CONF_SATELLITE_CONTEXT,
     CONF_TEMPERATURE,
     CONF_USE_CUSTOM_PROMPT,
     DEFAULT,
+    DEFAULT_BATCH_CONCURRENCY,
+    DEVICE_CONTEXT_KEY,
     DOMAIN,
+    MAX_BATCH_CONCURRENCY,
     MEMORY_KEY,
+    RESOLVER_KEY,
+    ROUTER_KEY,
+    SERVICE_PREWARM,
+    SERVICE_PROCESS_BATCH,
+    TRACER_KEY,
 )
+from .confirmations import build_confirmation
 from .device_manager import DeviceContextBuilder
-from .prompt_templates import build_system_prompt
+from .disk_cache import SECTION_PROMPTS, SECTION_TOOLS, DiskCache, content_key
+from .memory_intent import (
+    INTENT_CONTEXT,
+    INTENT_NOTE,
+    LANGUAGE_TRIGGERS,
+    MemoryIntentClassifier,
+    base_language,
+)
+from .model_router import (
+    ROUTE_FAST,
+    ROUTE_LARGE,
+    ModelRouter,
+    RouteDecision,
+    is_valid_response,
+)
+from .name_resolver import NameHint, NameResolver, format_name_hints
+from .prompt_templates import build_context_section, build_prompt_prefix
+from .routines import PREFETCH_MINUTE
+from .scheduler import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE
+from .speech_stream import SentenceChunker
+from .tool_results import ToolResultCompactor
+from .tracing import SPAN_KIND_CLIENT, Span, Tracer, TurnTrace
+
+if TYPE_CHECKING:
+    # The SDK is imported on first use (see async_wait_ready)
+    from anthropic.types import (
+        Message,
+        MessageParam,
+        RawMessageStreamEvent,
+        TextBlockParam,
+        ToolParam,
+        ToolUseBlock,
+    )
+
+    from .client_pool import ZaiClientPool
 
 _LOGGER = logging.getLogger(__name__)
 
 MAX_TOOL_ITERATIONS = 10
 
+# Formatted tool schemas kept per entity
+MAX_TOOL_CACHE = 256
+
+# Built system prompts kept per entity
+MAX_PROMPT_CACHE = 16
+
+# Nesting followed into a tool's parameter schema for its cache key
+MAX_SCHEMA_DEPTH = 12
+
+# Memory addresses in reprs, which differ between runs
+_ADDRESS = re.compile(r" at 0x[0-9a-fA-F]+")
+
+# Token counts reported for batch items
+USAGE_FIELDS = (
+    "input_tokens",
+    "output_tokens",
+    "cache_creation_input_tokens",
+    "cache_read_input_tokens",
+)
+
+# Streams report input tokens at the start; output tokens are final only in
+# the message_delta event
+INPUT_USAGE_FIELDS = (
+    "input_tokens",
+    "cache_creation_input_tokens",
+    "cache_read_input_tokens",
+)
+
+# Span attributes of the token counts with a GenAI semantic convention name
+USAGE_SPAN_ATTRIBUTES = {
+    "input_tokens": "gen_ai.usage.input_tokens",
+    "output_tokens": "gen_ai.usage.output_tokens",
+}
+
 
 async def async_setup_entry(
     hass: HomeAssistant,
@@ -56,16 +154,69 @@ async def async_setup_entry(
     """Set up conversation entities."""
     # Get or create memory instance
     memory = None
+    router = None
+    device_builder = None
+    tracer = None
+    resolver = None
+    compactor = None
+    caches = None
     if hass.data.get(DOMAIN) and hass.data[DOMAIN].get(config_entry.entry_id):
         memory = hass.data[DOMAIN][config_entry.entry_id].get(MEMORY_KEY)
+        router = hass.data[DOMAIN][config_entry.entry_id].get(ROUTER_KEY)
+        device_builder = hass.data[DOMAIN][config_entry.entry_id].get(
+            DEVICE_CONTEXT_KEY
+        )
+        tracer = hass.data[DOMAIN][config_entry.entry_id].get(TRACER_KEY)
+        resolver = hass.data[DOMAIN][config_entry.entry_id].get(RESOLVER_KEY)
+        compactor = hass.data[DOMAIN][config_entry.entry_id].get(COMPACTOR_KEY)
+        caches = hass.data[DOMAIN][config_entry.entry_id].get(CACHES_KEY)
+
+    async_add_entities(
+        [
+            ZaiConversationEntity(
+                config_entry,
+                hass,
+                memory,
+                router,
+                device_builder,
+                tracer,
+                resolver,
+                compactor,
+                caches.tool_cache if caches else None,
+                caches.prompt_cache if caches else None,
+                caches.disk_cache if caches else None,
+            )
+        ]
+    )
 
-    async_add_entities([ZaiConversationEntity(config_entry, hass, memory)])
+    platform = entity_platform.async_get_current_platform()
+    platform.async_register_entity_service(
+        SERVICE_PREWARM,
+        {vol.Optional(ATTR_DEVICE_ID): cv.string},
+        "async_prewarm",
+    )
+    platform.async_register_entity_service(
+        SERVICE_PROCESS_BATCH,
+        {
+            vol.Required(ATTR_PROMPTS): vol.All(
+                cv.ensure_list, [cv.string], vol.Length(min=1)
+            ),
+            vol.Optional(
+                ATTR_MAX_CONCURRENCY, default=DEFAULT_BATCH_CONCURRENCY
+            ): vol.All(vol.Coerce(int), vol.Range(min=1, max=MAX_BATCH_CONCURRENCY)),
+            vol.Optional(ATTR_LANGUAGE): cv.string,
+        },
+        "async_process_batch",
+        supports_response=SupportsResponse.ONLY,
+    )
 
 
 def _format_tool(
     tool: llm.Tool, custom_serializer: Any | None = None
 ) -> ToolParam:
     """Format tool for z.ai API."""
+    from anthropic.types import ToolParam
+
     return ToolParam(
         name=tool.name,
         description=tool.description or "",
@@ -75,14 +226,67 @@ def _format_tool(
     )
 
 
+def _schema_fingerprint(value: Any, depth: int = 0) -> str:
+    """Describe a voluptuous schema (or serializer) in a stable way.
+
+    Two schemas with the same fingerprint convert to the same JSON schema.
+    Functions are described by name, other validators by their attributes;
+    unlike repr() the result is the same in every run, so it can key the
+    disk cache.
+    """
+    if depth > MAX_SCHEMA_DEPTH:
+        return "..."
+    depth += 1
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return repr(value)
+    if isinstance(value, dict):
+        items = sorted(
+            f"{_schema_fingerprint(key, depth)}:{_schema_fingerprint(item, depth)}"
+            for key, item in value.items()
+        )
+        return "{" + ",".join(items) + "}"
+    if isinstance(value, (list, tuple, set, frozenset)):
+        items = [_schema_fingerprint(item, depth) for item in value]
+        if isinstance(value, (set, frozenset)):
+            items.sort()
+        return f"{type(value).__name__}[{','.join(items)}]"
+    if isinstance(value, type) or (
+        callable(value) and hasattr(value, "__qualname__")
+    ):
+        return f"{getattr(value, '__module__', '')}.{value.__qualname__}"
+    if attributes := getattr(value, "__dict__", None):
+        return (
+            f"{type(value).__qualname__}({_schema_fingerprint(attributes, depth)})"
+        )
+    return _ADDRESS.sub("", repr(value))
+
+
+def _tool_key(tool: llm.Tool, custom_serializer: Any | None) -> str:
+    """Return the cache key of a tool's formatted schema."""
+    return content_key(
+        tool.name,
+        tool.description or "",
+        _schema_fingerprint(tool.parameters),
+        _schema_fingerprint(custom_serializer),
+    )
+
+
 def _convert_content(
     chat_content: Iterable[conversation.Content],
+    compactor: ToolResultCompactor | None = None,
 ) -> list[MessageParam]:
     """Transform HA chat_log content into z.ai/Anthropic API format.
 
     NOTE: SystemContent is skipped here - it is handled separately
     via the 'system' parameter of the API call.
+
+    Args:
+        chat_content: Chat log content to convert.
+        compactor: Reduces tool results to what the model needs; without
+            it they are sent as the tool returned them.
     """
+    from anthropic.types import MessageParam, TextBlockParam
+
     messages: list[MessageParam] = []
 
     for content in chat_content:
@@ -144,7 +348,11 @@ def _convert_content(
             tool_result_block = {
                 "type": "tool_result",
                 "tool_use_id": content.tool_call_id,
-                "content": content.tool_result if content.tool_result else "",
+                "content": (
+                    compactor.compact(content).content
+                    if compactor
+                    else content.tool_result if content.tool_result else ""
+                ),
                 "is_error": False,
             }
 
@@ -166,84 +374,297 @@ def _convert_content(
     return messages
 
 
-async def _process_message(
+def _latest_user_text(chat_log: conversation.ChatLog) -> str | None:
+    """Return the text of the latest user utterance in a chat log."""
+    return next(
+        (
+            content.content
+            for content in reversed(chat_log.content)
+            if isinstance(content, conversation.UserContent)
+        ),
+        None,
+    )
+
+
+def _add_name_hints(messages: list[MessageParam], hints: TextBlockParam) -> None:
+    """Add name hints after the latest user utterance in messages.
+
+    Tool results are user messages too; the utterance is the latest user
+    message with text in it.
+    """
+    from anthropic.types import TextBlockParam
+
+    for message in reversed(messages):
+        if message["role"] != "user":
+            continue
+        content = message["content"]
+        if isinstance(content, str):
+            message["content"] = [TextBlockParam(type="text", text=content), hints]
+            return
+        if any(block.get("type") == "text" for block in content):
+            content.append(hints)
+            return
+
+
+def _round_tool_results(
     chat_log: conversation.ChatLog,
-    message: Message,
-    agent_id: str,
+) -> list[conversation.ToolResultContent]:
+    """Return the tool results of the latest round of tool calls."""
+    results: list[conversation.ToolResultContent] = []
+    for content in reversed(chat_log.content):
+        if not isinstance(content, conversation.ToolResultContent):
+            break
+        results.append(content)
+    results.reverse()
+    return results
+
+
+def _tool_outcomes(chat_log: conversation.ChatLog) -> tuple[int, int]:
+    """Count the tool calls of the latest turn and how many of them failed."""
+    calls = failed = 0
+    for content in reversed(chat_log.content):
+        if isinstance(content, conversation.UserContent):
+            break
+        if isinstance(content, conversation.ToolResultContent):
+            calls += 1
+            result = content.tool_result
+            if isinstance(result, dict) and (
+                "error" in result or result.get("response_type") == "error"
+            ):
+                failed += 1
+    return calls, failed
+
+
+def _add_usage(
+    usage: dict[str, int] | None,
+    source: Any,
+    fields: tuple[str, ...] = USAGE_FIELDS,
 ) -> None:
-    """Transform a z.ai message into HA conversation content."""
-    content_text = ""
-    assistant_added = False
+    """Add the token counts of a Usage or MessageDeltaUsage to a dict."""
+    if usage is None or source is None:
+        return
+    for field in fields:
+        if count := getattr(source, field, None):
+            usage[field] = usage.get(field, 0) + count
+
 
+async def _message_to_deltas(
+    message: Message,
+    usage: dict[str, int] | None = None,
+) -> AsyncGenerator[conversation.AssistantContentDeltaDict]:
+    """Transform a complete z.ai message into HA assistant content deltas."""
+    _add_usage(usage, message.usage)
+    yield {"role": "assistant"}
     for block in message.content:
         if block.type == "text":
-            content_text += block.text
+            yield {"content": block.text}
         elif block.type == "tool_use":
-            async for _ in chat_log.async_add_assistant_content(
-                conversation.AssistantContent(
-                    agent_id=agent_id,
-                    tool_calls=[
+            yield {
+                "tool_calls": [
+                    llm.ToolInput(
+                        tool_name=block.name,
+                        tool_args=block.input,
+                        id=block.id,
+                    )
+                ]
+            }
+
+
+async def _transform_stream(
+    stream: AsyncIterator[RawMessageStreamEvent],
+    usage: dict[str, int] | None = None,
+) -> AsyncGenerator[conversation.AssistantContentDeltaDict]:
+    """Transform z.ai stream events into HA assistant content deltas."""
+    tool_block: ToolUseBlock | None = None
+    tool_json = ""
+
+    async for event in stream:
+        if event.type == "message_start":
+            _add_usage(usage, event.message.usage, INPUT_USAGE_FIELDS)
+            yield {"role": "assistant"}
+        elif event.type == "message_delta":
+            _add_usage(usage, event.usage)
+        elif event.type == "content_block_start":
+            if event.content_block.type == "tool_use":
+                tool_block = event.content_block
+                tool_json = ""
+            elif event.content_block.type == "text" and event.content_block.text:
+                yield {"content": event.content_block.text}
+        elif event.type == "content_block_delta":
+            if event.delta.type == "text_delta":
+                yield {"content": event.delta.text}
+            elif event.delta.type == "input_json_delta":
+                tool_json += event.delta.partial_json
+        elif event.type == "content_block_stop" and tool_block is not None:
+            try:
+                tool_args = json.loads(tool_json) if tool_json else {}
+            except json.JSONDecodeError:
+                _LOGGER.warning("Ignoring tool call with invalid input: %s", tool_json)
+            else:
+                yield {
+                    "tool_calls": [
                         llm.ToolInput(
-                            tool_name=block.name,
-                            tool_args=block.input,
-                            id=block.id,
+                            tool_name=tool_block.name,
+                            tool_args=tool_args,
+                            id=tool_block.id,
                         )
-                    ],
-                )
-            ):
-                pass
-            assistant_added = True
+                    ]
+                }
+            tool_block = None
 
-    if content_text:
-        chat_log.async_add_assistant_content_without_tools(
-            conversation.AssistantContent(content=content_text, agent_id=agent_id)
-        )
-        assistant_added = True
 
-    if not assistant_added:
-        chat_log.async_add_assistant_content_without_tools(
-            conversation.AssistantContent(
-                content="Sorry, I couldn't get a response from the model.",
-                agent_id=agent_id,
-            )
-        )
+async def _chunk_for_speech(
+    deltas: AsyncIterator[conversation.AssistantContentDeltaDict],
+    language: str,
+    clean: bool,
+) -> AsyncGenerator[conversation.AssistantContentDeltaDict]:
+    """Regroup text deltas into whole sentences for the voice pipeline.
 
+    Text that the model writes after a tool call is held back and sent as a
+    new assistant message, which the chat log only starts once the tool
+    results are in.
+    """
+    chunker = SentenceChunker(language, clean)
+    held: list[str] = []
+    after_tool = False
+
+    async for delta in deltas:
+        if "tool_calls" in delta:
+            if rest := chunker.flush():
+                yield {"content": rest}
+            after_tool = True
+            yield delta
+        elif "content" in delta:
+            if after_tool:
+                held.append(delta["content"])
+                continue
+            for chunk in chunker.feed(delta["content"]):
+                yield {"content": chunk}
+        else:
+            yield delta
 
-# Patterns to detect memory-related user messages (Italian + English)
-_MEMORY_PREFERENCE_PATTERNS = re.compile(
-    r"(?:ricorda(?:ti)?|remember|nota(?:ti)?|note|salva|save|annota|preferisco|i prefer|mi piace|i like|"
-    r"non mi piace|i don'?t like|la mia .+ (?:preferit[ao]|ideale|favorit[ae])|my (?:favorite|preferred|ideal))",
-    re.IGNORECASE,
-)
+    if rest := chunker.flush():
+        yield {"content": rest}
+
+    if held:
+        yield {"role": "assistant"}
+        chunker = SentenceChunker(language, clean)
+        for chunk in chunker.feed("".join(held)):
+            yield {"content": chunk}
+        if rest := chunker.flush():
+            yield {"content": rest}
+
+
+def _trace_model_call(
+    model: str, iteration: int, context_version: int | None
+) -> None:
+    """Record which model and device context snapshot a model call used."""
+    _LOGGER.debug(
+        "Calling %s (iteration %d) with device context version %s",
+        model,
+        iteration,
+        context_version,
+    )
+    trace.async_conversation_trace_append(
+        trace.ConversationTraceEventType.AGENT_DETAIL,
+        {
+            "model": model,
+            "iteration": iteration,
+            "device_context_version": context_version,
+        },
+    )
+
+
+def _start_model_span(
+    turn: TurnTrace, model: str, iteration: int, route: str | None
+) -> Span:
+    """Start the span of one messages.create call."""
+    return turn.start_span(
+        f"chat {model}",
+        SPAN_KIND_CLIENT,
+        parent=turn.root,
+        **{
+            "gen_ai.operation.name": "chat",
+            "gen_ai.system": DOMAIN,
+            "gen_ai.request.model": model,
+            "zai.iteration": iteration,
+            "zai.route": route,
+        },
+    )
+
+
+def _usage_span_attributes(usage: dict[str, int]) -> dict[str, int]:
+    """Return token counts as span attributes."""
+    return {
+        USAGE_SPAN_ATTRIBUTES.get(field, f"zai.usage.{field}"): count
+        for field, count in usage.items()
+    }
 
-_MEMORY_NOTE_PATTERNS = re.compile(
-    r"(?:ricordami|remind me|annotati|note to self|da ricordare|don'?t forget|non dimenticare|segna(?:ti)?)",
-    re.IGNORECASE,
-)
+
+# Home Assistant 2025.10 added a required satellite_id to ConversationInput
+_INPUT_HAS_SATELLITE_ID = "satellite_id" in {
+    input_field.name
+    for input_field in dataclasses.fields(conversation.ConversationInput)
+}
+
+
+def build_conversation_input(**kwargs: Any) -> conversation.ConversationInput:
+    """Return the input of a turn not started by a satellite.
+
+    Sets satellite_id to None on Home Assistant versions that require it.
+    """
+    if _INPUT_HAS_SATELLITE_ID:
+        kwargs.setdefault("satellite_id", None)
+    return conversation.ConversationInput(**kwargs)
+
+
+# Compiled once, one per language: the triggers of one language must not
+# match utterances in another
+_MEMORY_CLASSIFIERS = {
+    language: MemoryIntentClassifier([language]) for language in LANGUAGE_TRIGGERS
+}
 
 
 async def _extract_and_save_memory(
-    memory: AssistantMemory,
+    memory: AssistantMemory | LayeredMemory,
     user_text: str,
+    languages: Iterable[str | None],
 ) -> None:
     """Detect memory-related intents in user text and save to memory.
 
-    This analyzes the user's message for preference/note patterns and
-    automatically persists them to the assistant's memory.
+    This classifies the user's message as a note, preference or user
+    context and persists the normalised fact to the assistant's memory.
+    The first of languages with memory triggers selects the classifier.
     """
     text = user_text.strip()
     if len(text) < 5:
         return
 
+    classifier = next(
+        (
+            _MEMORY_CLASSIFIERS[code]
+            for language in languages
+            if language and (code := base_language(language)) in _MEMORY_CLASSIFIERS
+        ),
+        None,
+    )
+    if classifier is None:
+        return
+
     try:
-        if _MEMORY_NOTE_PATTERNS.search(text):
-            # It's a note/reminder - save the full text
-            await memory.add_note(text)
-            _LOGGER.debug("Saved note from user: %s", text[:80])
-        elif _MEMORY_PREFERENCE_PATTERNS.search(text):
-            # It's a preference - save the full text
-            await memory.add_preference(text)
-            _LOGGER.debug("Saved preference from user: %s", text[:80])
+        intent = classifier.classify(text)
+        if intent is None:
+            return
+
+        if intent.kind == INTENT_NOTE:
+            await memory.add_note(intent.fact)
+            _LOGGER.debug("Saved note from user: %s", intent.fact[:80])
+        elif intent.kind == INTENT_CONTEXT and intent.context_key:
+            await memory.set_context(intent.context_key, intent.fact)
+            _LOGGER.debug("Saved %s from user: %s", intent.context_key, intent.fact[:80])
+        else:
+            await memory.add_preference(intent.fact)
+            _LOGGER.debug("Saved preference from user: %s", intent.fact[:80])
     except Exception:
         _LOGGER.debug("Failed to extract memory from user input", exc_info=True)
 
@@ -262,58 +683,397 @@ class ZaiConversationEntity(
         self,
         entry: ConfigEntry,
         hass: HomeAssistant,
-        memory: AssistantMemory | None = None,
+        memory: AssistantMemory | LayeredMemory | None = None,
+        router: ModelRouter | None = None,
+        device_builder: DeviceContextBuilder | None = None,
+        tracer: Tracer | None = None,
+        resolver: NameResolver | None = None,
+        compactor: ToolResultCompactor | None = None,
+        tool_cache: dict[tuple[str, str], ToolParam] | None = None,
+        prompt_cache: dict[tuple[str, ...], str] | None = None,
+        disk_cache: DiskCache | None = None,
     ) -> None:
-        """Initialize the conversation entity."""
+        """Initialize the conversation entity.
+
+        The tool and prompt caches are passed in when they are kept warm
+        across reloads (see standby.py); the disk cache keeps their entries
+        across restarts.
+        """
         self.entry = entry
         self._attr_unique_id = entry.entry_id
         self._hass = hass
         self._memory = memory
-        self._device_builder = DeviceContextBuilder(hass)
+        self._router = router
+        self._device_builder = device_builder or DeviceContextBuilder(hass)
+        self._tracer = tracer or Tracer(hass, entry)
+        self._resolver = resolver
+        self._compactor = compactor or ToolResultCompactor(entry)
+        self._tool_cache: dict[str, ToolParam] = (
+            tool_cache if tool_cache is not None else {}
+        )
+        self._prompt_cache: dict[tuple[str, ...], str] = (
+            prompt_cache if prompt_cache is not None else {}
+        )
+        self._disk_cache = disk_cache
 
     @property
     def supported_languages(self) -> list[str] | Literal["*"]:
         """Return supported languages."""
         return "*"
 
+    async def async_added_to_hass(self) -> None:
+        """Start prefetching routines when enabled."""
+        await super().async_added_to_hass()
+        if self.entry.options.get(
+            CONF_ROUTINE_PREFETCH, DEFAULT[CONF_ROUTINE_PREFETCH]
+        ):
+            self.async_on_remove(
+                async_track_time_change(
+                    self.hass,
+                    self._async_prefetch_routines,
+                    minute=PREFETCH_MINUTE,
+                    second=0,
+                )
+            )
+
+    async def async_prepare(self, language: str | None = None) -> None:
+        """Start the prep work of a turn when a pipeline run starts."""
+        self.hass.async_create_background_task(
+            self.async_prewarm(), f"{DOMAIN} prewarm {self.entity_id}"
+        )
+
+    async def async_prewarm(self, device_id: str | None = None) -> None:
+        """Do the prep work of the next turn ahead of time.
+
+        Called when a voice session starts (wake word, automation trigger),
+        while speech-to-text is still running. Builds the device context,
+        formats the tool list, renders the memory prompt and opens a
+        connection to the API, so _async_handle_message finds them ready.
+        Best effort: anything that fails is simply done again by the turn.
+
+        Args:
+            device_id: Satellite that started the session, if known.
+        """
+        start = time.monotonic()
+        try:
+            await async_wait_ready(self.hass, self.entry.entry_id)
+        except Exception:
+            _LOGGER.debug("Not prewarming, client is not ready", exc_info=True)
+            return
+
+        options = self.entry.options
+        pool: ZaiClientPool = self.entry.runtime_data
+        warm_up = self.hass.async_create_task(pool.async_warm_up())
+
+        if options.get(CONF_USE_CUSTOM_PROMPT, DEFAULT[CONF_USE_CUSTOM_PROMPT]):
+            area_filter = options.get(CONF_AREA_FILTER, DEFAULT[CONF_AREA_FILTER])
+            try:
+                # Renders into the builder's cache for the coming turn
+                await self._device_builder.async_get_context(
+                    area_filter=area_filter if area_filter else None,
+                    focus_area=self._focus_area(device_id),
+                )
+            except Exception:
+                _LOGGER.debug("Failed to prewarm device context", exc_info=True)
+
+            try:
+                if self._memory and options.get(
+                    CONF_MEMORY_ENABLED, DEFAULT[CONF_MEMORY_ENABLED]
+                ):
+                    await self._memory.async_load()
+                    self._memory.build_memory_prompt()
+            except Exception:
+                _LOGGER.debug("Failed to prewarm memory prompt", exc_info=True)
+
+        if api_id := options.get(CONF_LLM_HASS_API):
+            try:
+                llm_api = await llm.async_get_api(
+                    self.hass,
+                    api_id,
+                    llm.LLMContext(
+                        platform=DOMAIN,
+                        context=Context(),
+                        language=self.hass.config.language,
+                        assistant=conversation.DOMAIN,
+                        device_id=device_id,
+                    ),
+                )
+                self._format_tools(llm_api)
+            except Exception:
+                _LOGGER.debug("Failed to prewarm tool list", exc_info=True)
+
+        await warm_up
+        _LOGGER.debug("Prewarmed %s in %.3fs", self.entity_id, time.monotonic() - start)
+
+    async def _async_prefetch_routines(self, now: datetime) -> None:
+        """Prepare the turns of the routines learned for the next hour.
+
+        Renders the device context of each routine's area (with satellite
+        context), resolves the names of each routine's command, then
+        prewarms like a voice session does. Best effort, like the prewarm.
+        """
+        options = self.entry.options
+        if self._memory is None or not options.get(
+            CONF_MEMORY_ENABLED, DEFAULT[CONF_MEMORY_ENABLED]
+        ):
+            return
+        hour = (now.hour + 1) % 24
+        if not (routines := self._memory.predict_routines(hour)):
+            return
+
+        area_filter = options.get(CONF_AREA_FILTER, DEFAULT[CONF_AREA_FILTER])
+        if options.get(
+            CONF_USE_CUSTOM_PROMPT, DEFAULT[CONF_USE_CUSTOM_PROMPT]
+        ) and options.get(CONF_SATELLITE_CONTEXT, DEFAULT[CONF_SATELLITE_CONTEXT]):
+            for area_id in {routine.area_id for routine in routines if routine.area_id}:
+                try:
+                    await self._device_builder.async_get_context(
+                        area_filter=area_filter if area_filter else None,
+                        focus_area=area_id,
+                    )
+                except Exception:
+                    _LOGGER.debug("Failed to prefetch device context", exc_info=True)
+
+        if self._resolver is not None and options.get(
+            CONF_NAME_HINTS, DEFAULT[CONF_NAME_HINTS]
+        ):
+            for routine in routines:
+                self._resolver.resolve(
+                    routine.command, area_filter=area_filter if area_filter else None
+                )
+
+        _LOGGER.debug(
+            "Prefetching %d routines of %02d:00 for %s",
+            len(routines),
+            hour,
+            self.entity_id,
+        )
+        await self.async_prewarm()
+
+    async def async_process_batch(
+        self,
+        prompts: list[str],
+        max_concurrency: int = DEFAULT_BATCH_CONCURRENCY,
+        language: str | None = None,
+    ) -> ServiceResponse:
+        """Answer a list of prompts, each in its own conversation.
+
+        All prompts share one system prompt (so one device context snapshot
+        and one cacheable prefix) and run at background priority, at most
+        max_concurrency at a time. Batch prompts are not added to memory.
+
+        Returns:
+            A result per prompt with the response, latency and token usage.
+        """
+        try:
+            await async_wait_ready(self.hass, self.entry.entry_id)
+        except Exception as err:
+            raise HomeAssistantError(
+                f"Sorry, z.ai is not ready yet: {err}"
+            ) from err
+
+        options = self.entry.options
+        semaphore = asyncio.Semaphore(max_concurrency)
+        prefix_lock = asyncio.Lock()
+        prefix: tuple[list[TextBlockParam], int | None] | None = None
+        batch_start = time.monotonic()
+
+        async def _async_process(prompt: str) -> dict[str, Any]:
+            nonlocal prefix
+            async with semaphore:
+                start = time.monotonic()
+                usage: dict[str, int] = {}
+                result: dict[str, Any] = {"prompt": prompt}
+                user_input = build_conversation_input(
+                    text=prompt,
+                    context=Context(),
+                    conversation_id=None,
+                    device_id=None,
+                    language=language or self.hass.config.language,
+                    agent_id=self.entity_id,
+                )
+                turn = self._tracer.start_turn(
+                    **{"gen_ai.agent.id": self.entity_id, "zai.batch": True}
+                )
+                try:
+                    with (
+                        chat_session.async_get_chat_session(self.hass) as session,
+                        conversation.async_get_chat_log(
+                            self.hass, session, user_input
+                        ) as chat_log,
+                    ):
+                        turn.root.set(
+                            **{"gen_ai.conversation.id": chat_log.conversation_id}
+                        )
+                        await chat_log.async_provide_llm_data(
+                            user_input.as_llm_context(DOMAIN),
+                            options.get(CONF_LLM_HASS_API),
+                            options.get(CONF_PROMPT),
+                            None,
+                        )
+                        async with prefix_lock:
+                            if prefix is None:
+                                with turn.span("system_prompt"):
+                                    prefix = await self._async_build_system_prompt(
+                                        chat_log, turn
+                                    )
+                        await self._async_handle_chat_log(
+                            chat_log,
+                            PRIORITY_BACKGROUND,
+                            prefix=prefix,
+                            usage=usage,
+                            turn=turn,
+                        )
+                        response = conversation.async_get_result_from_chat_log(
+                            user_input, chat_log
+                        ).response
+                    result["response"] = response.speech.get("plain", {}).get(
+                        "speech", ""
+                    )
+                except (conversation.ConverseError, HomeAssistantError) as err:
+                    turn.root.record_error(err)
+                    result["error"] = str(err)
+                except Exception as err:
+                    # One bad prompt must not abort the rest of the batch
+                    _LOGGER.exception("Unexpected error answering batch prompt")
+                    turn.root.record_error(err)
+                    result["error"] = f"{type(err).__name__}: {err}"
+                finally:
+                    self._tracer.async_finish(turn)
+                result["latency"] = round(time.monotonic() - start, 3)
+                result["usage"] = usage
+                return result
+
+        results = await asyncio.gather(*(_async_process(p) for p in prompts))
+
+        totals: dict[str, int] = {}
+        for result in results:
+            for field, count in result["usage"].items():
+                totals[field] = totals.get(field, 0) + count
+
+        return {
+            "results": list(results),
+            "errors": sum(1 for result in results if "error" in result),
+            "device_context_version": prefix[1] if prefix else None,
+            "duration": round(time.monotonic() - batch_start, 3),
+            "usage": totals,
+        }
+
     async def _async_handle_message(
         self,
         user_input: conversation.ConversationInput,
         chat_log: conversation.ChatLog,
     ) -> conversation.ConversationResult:
         """Handle a conversation message."""
+        turn = self._tracer.start_turn(
+            **{
+                "gen_ai.conversation.id": chat_log.conversation_id,
+                "gen_ai.agent.id": self.entity_id,
+                "zai.language": user_input.language,
+                "zai.device_id": user_input.device_id,
+            }
+        )
+        try:
+            return await self._async_handle_turn(user_input, chat_log, turn)
+        except Exception as err:
+            turn.root.record_error(err)
+            raise
+        finally:
+            self._tracer.async_finish(turn)
+
+    async def _async_handle_turn(
+        self,
+        user_input: conversation.ConversationInput,
+        chat_log: conversation.ChatLog,
+        turn: TurnTrace,
+    ) -> conversation.ConversationResult:
+        """Answer a conversation message, recording spans in turn."""
+        # With lazy startup the client and memory may still be on their way
+        try:
+            await async_wait_ready(self.hass, self.entry.entry_id)
+        except Exception as err:
+            raise HomeAssistantError(
+                f"Sorry, z.ai is not ready yet: {err}"
+            ) from err
+
         options = self.entry.options
         memory_enabled = options.get(CONF_MEMORY_ENABLED, DEFAULT[CONF_MEMORY_ENABLED])
 
         # Record interaction and extract memory from user input
-        try:
-            if self._memory and memory_enabled:
-                await self._memory.record_interaction(user_input.text)
-                await _extract_and_save_memory(self._memory, user_input.text)
-        except Exception:
-            _LOGGER.debug("Failed to process memory", exc_info=True)
+        if self._memory and memory_enabled:
+            with turn.span("memory"):
+                try:
+                    await self._memory.record_interaction(
+                        user_input.text,
+                        self._device_builder.satellite_area(user_input.device_id),
+                    )
+                    await _extract_and_save_memory(
+                        self._memory,
+                        user_input.text,
+                        (
+                            user_input.language,
+                            options.get(
+                                CONF_OUTPUT_LANGUAGE, DEFAULT[CONF_OUTPUT_LANGUAGE]
+                            ),
+                        ),
+                    )
+                except Exception:
+                    _LOGGER.debug("Failed to process memory", exc_info=True)
 
         try:
-            await chat_log.async_provide_llm_data(
-                user_input.as_llm_context(DOMAIN),
-                options.get(CONF_LLM_HASS_API),
-                options.get(CONF_PROMPT),
-                user_input.extra_system_prompt,
-            )
+            with turn.span(
+                "llm_data", **{"zai.llm_api": options.get(CONF_LLM_HASS_API)}
+            ):
+                await chat_log.async_provide_llm_data(
+                    user_input.as_llm_context(DOMAIN),
+                    options.get(CONF_LLM_HASS_API),
+                    options.get(CONF_PROMPT),
+                    user_input.extra_system_prompt,
+                )
         except conversation.ConverseError as err:
             return err.as_conversation_result()
 
-        await self._async_handle_chat_log(chat_log)
+        # Requests from a satellite are spoken: hold back emoji and Markdown
+        await self._async_handle_chat_log(
+            chat_log,
+            speech=user_input.device_id is not None,
+            turn=turn,
+            device_id=user_input.device_id,
+        )
 
         return conversation.async_get_result_from_chat_log(user_input, chat_log)
 
     async def _async_handle_chat_log(
         self,
         chat_log: conversation.ChatLog,
+        priority: int = PRIORITY_INTERACTIVE,
+        speech: bool = False,
+        prefix: tuple[list[TextBlockParam], int | None] | None = None,
+        usage: dict[str, int] | None = None,
+        turn: TurnTrace | None = None,
+        device_id: str | None = None,
     ) -> None:
-        """Process chat log with z.ai API."""
-        client: anthropic.AsyncAnthropic = self.entry.runtime_data
+        """Process chat log with z.ai API.
+
+        Args:
+            chat_log: Chat log to answer.
+            priority: Scheduler lane, PRIORITY_INTERACTIVE for voice and
+                text turns, PRIORITY_BACKGROUND for background work.
+            speech: The answer will be spoken; strip emoji and Markdown.
+            prefix: System prompt blocks and device context version to use
+                instead of building them (shared by a batch).
+            usage: Token counts of every model call are added to this dict.
+            turn: Trace to record the prompt, model call and tool spans in.
+            device_id: Satellite the request came from, if any.
+        """
+        import anthropic
+        from anthropic.types import MessageParam, TextBlockParam
+
+        pool: ZaiClientPool = self.entry.runtime_data
         options = self.entry.options
+        if turn is None:
+            # Not traced: record into a throwaway trace
+            turn = TurnTrace(sampled=False)
 
         # Get model configuration (use .get() with defaults to handle
         # entries configured before advanced options were added)
@@ -326,9 +1086,218 @@ class ZaiConversationEntity(
             max_tokens = options.get(CONF_MAX_TOKENS, DEFAULT[CONF_MAX_TOKENS])
             temperature = options.get(CONF_TEMPERATURE, DEFAULT[CONF_TEMPERATURE])
 
+        # Send simple utterances to the fast model, escalating if it fails
+        route: RouteDecision | None = None
+        if self._router and options.get(
+            CONF_ADAPTIVE_ROUTING, DEFAULT[CONF_ADAPTIVE_ROUTING]
+        ):
+            try:
+                route = self._route_utterance(chat_log, model)
+            except Exception:
+                _LOGGER.debug("Failed to route utterance", exc_info=True)
+
+        if prefix is None:
+            with turn.span("system_prompt"):
+                prefix = await self._async_build_system_prompt(
+                    chat_log, turn, device_id
+                )
+        system_prompt, context_version = prefix
+
+        # Format messages - skip SystemContent (index 0)
+        messages = _convert_content(chat_log.content[1:], self._compactor)
+
+        # Ensure we have at least one message
+        if not messages:
+            messages = [MessageParam(role="user", content="Hello")]
+
+        # Exact names of the entities and areas the utterance mentions, so
+        # intent tools get a name they can match
+        name_hints: TextBlockParam | None = None
+        if self._resolver and options.get(CONF_NAME_HINTS, DEFAULT[CONF_NAME_HINTS]):
+            with turn.span("name_hints") as span:
+                try:
+                    hints = self._resolve_names(chat_log)
+                except Exception:
+                    _LOGGER.debug("Failed to resolve names", exc_info=True)
+                    hints = []
+                span.set(**{"zai.name_hints": len(hints)})
+            if hints:
+                name_hints = TextBlockParam(
+                    type="text", text=format_name_hints(hints)
+                )
+                _add_name_hints(messages, name_hints)
+
+        # Format tools
+        tools: list[ToolParam] = []
+        if chat_log.llm_api:
+            tools = self._format_tools(chat_log.llm_api)
+
+        # Prepare API call parameters
+        model_args: dict[str, Any] = {
+            "model": route.model if route else model,
+            "messages": messages,
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+        }
+
+        if system_prompt:
+            model_args["system"] = system_prompt
+
+        if tools:
+            model_args["tools"] = tools
+
+        tool_names = {tool["name"] for tool in tools}
+        current_route = route.route if route else None
+        local_confirmation = options.get(
+            CONF_LOCAL_CONFIRMATION, DEFAULT[CONF_LOCAL_CONFIRMATION]
+        )
+        personality = options.get(CONF_PERSONALITY, DEFAULT[CONF_PERSONALITY])
+
+        # Tool call iteration loop
+        language = options.get(CONF_OUTPUT_LANGUAGE, DEFAULT[CONF_OUTPUT_LANGUAGE])
+        for iteration in range(MAX_TOOL_ITERATIONS):
+            call: Span | None = None
+            call_usage: dict[str, int] = {}
+            try:
+                deltas: AsyncIterator[conversation.AssistantContentDeltaDict] | None
+                deltas = None
+                stream: AsyncGenerator[RawMessageStreamEvent] | None = None
+                start = time.monotonic()
+
+                if route and self._router and current_route == ROUTE_FAST:
+                    # Fast model answers are checked before they are spoken,
+                    # so they are fetched whole instead of streamed
+                    _trace_model_call(model_args["model"], iteration, context_version)
+                    call = _start_model_span(
+                        turn, model_args["model"], iteration, current_route
+                    )
+                    message = await pool.async_create_message(
+                        model_args, priority, chat_log.conversation_id
+                    )
+                    call.end()
+                    # Both routes are timed around the model call only
+                    latency = call.duration_ms / 1000
+                    expects_tool = iteration == 0 and route.is_command and bool(tools)
+                    if is_valid_response(message, tool_names, expects_tool):
+                        self._router.record(ROUTE_FAST, latency)
+                        deltas = _message_to_deltas(message, call_usage)
+                    else:
+                        # No usable tool call or answer: escalate the rest of
+                        # the turn to the large model
+                        self._router.record(ROUTE_FAST, latency, escalated=True)
+                        _LOGGER.debug("Escalating to %s after invalid response", model)
+                        fast_usage: dict[str, int] = {}
+                        _add_usage(fast_usage, message.usage)
+                        call.set(
+                            **_usage_span_attributes(fast_usage),
+                            **{"zai.escalated": True},
+                        )
+                        # The escalated call was still paid for
+                        if usage is not None:
+                            for field, count in fast_usage.items():
+                                usage[field] = usage.get(field, 0) + count
+                        current_route = ROUTE_LARGE
+                        model_args["model"] = model
+                        start = time.monotonic()
+
+                if deltas is None:
+                    _trace_model_call(model_args["model"], iteration, context_version)
+                    call = _start_model_span(
+                        turn, model_args["model"], iteration, current_route
+                    )
+                    stream = pool.async_stream_message(
+                        model_args, priority, chat_log.conversation_id
+                    )
+                    deltas = _transform_stream(stream, call_usage)
+
+                assert call is not None
+                # Closing the stream gives its scheduler slot back even if
+                # the chat log stops reading early
+                async with aclosing(stream) if stream is not None else nullcontext():
+                    await self._async_add_deltas(
+                        chat_log, deltas, language, speech, start, turn, call
+                    )
+
+                # The call span ends with the stream, before tools run
+                if route and self._router and current_route == ROUTE_LARGE:
+                    self._router.record(ROUTE_LARGE, call.duration_ms / 1000)
+
+            except anthropic.AnthropicError as err:
+                if call is not None:
+                    call.record_error(err)
+                    call.end()
+                raise HomeAssistantError(
+                    f"Sorry, I had a problem talking to z.ai: {err}"
+                ) from err
+            finally:
+                if call is not None:
+                    call.set(**_usage_span_attributes(call_usage))
+                if usage is not None:
+                    for field, count in call_usage.items():
+                        usage[field] = usage.get(field, 0) + count
+
+            # Check if we need to continue with tool results
+            if not chat_log.unresponded_tool_results:
+                break
+
+            # Simple commands that all succeeded are confirmed without
+            # another model call
+            if local_confirmation and (
+                confirmation := build_confirmation(
+                    _round_tool_results(chat_log), language, personality
+                )
+            ):
+                _LOGGER.debug("Confirming locally: %s", confirmation)
+                chat_log.async_add_assistant_content_without_tools(
+                    conversation.AssistantContent(
+                        agent_id=self.entity_id, content=confirmation
+                    )
+                )
+                turn.root.set(**{"zai.local_confirmation": True})
+                break
+
+            # Add tool results and continue
+            messages = _convert_content(chat_log.content[1:], self._compactor)
+            if name_hints:
+                _add_name_hints(messages, name_hints)
+            model_args["messages"] = messages
+
+        if self._resolver:
+            tool_calls, failed_tool_calls = _tool_outcomes(chat_log)
+            self._resolver.record_turn(
+                name_hints is not None, iteration + 1, tool_calls, failed_tool_calls
+            )
+
+    def _focus_area(self, device_id: str | None) -> str | None:
+        """Return the area to scope the device context to, if any."""
+        if not self.entry.options.get(
+            CONF_SATELLITE_CONTEXT, DEFAULT[CONF_SATELLITE_CONTEXT]
+        ):
+            return None
+        return self._device_builder.satellite_area(device_id)
+
+    async def _async_build_system_prompt(
+        self,
+        chat_log: conversation.ChatLog,
+        turn: TurnTrace | None = None,
+        device_id: str | None = None,
+    ) -> tuple[list[TextBlockParam], int | None]:
+        """Build the system prompt blocks for a chat log.
+
+        Returns the blocks and the device context version they were built
+        from (None without the optimized prompt). With satellite context the
+        device context is scoped to the area of device_id.
+        """
+        from anthropic.types import TextBlockParam
+
+        options = self.entry.options
+        if turn is None:
+            turn = TurnTrace(sampled=False)
+
         # Extract system prompt from chat_log.content[0] (SystemContent)
         # After async_provide_llm_data, the first element is always SystemContent
         system_prompt: list[TextBlockParam] = []
+        context_version: int | None = None
 
         try:
             use_custom_prompt = options.get(CONF_USE_CUSTOM_PROMPT, DEFAULT[CONF_USE_CUSTOM_PROMPT])
@@ -342,18 +1311,31 @@ class ZaiConversationEntity(
                 # Get personality
                 personality = options.get(CONF_PERSONALITY, DEFAULT[CONF_PERSONALITY])
 
-                # Build device context
+                # Build device context (reused while nothing has changed)
                 area_filter = options.get(CONF_AREA_FILTER, DEFAULT[CONF_AREA_FILTER])
-                devices_context = await self._device_builder.build_context(
-                    area_filter=area_filter if area_filter else None,
-                )
+                focus_area = self._focus_area(device_id)
+                with turn.span("device_context") as span:
+                    device_context = await self._device_builder.async_get_context(
+                        area_filter=area_filter if area_filter else None,
+                        focus_area=focus_area,
+                    )
+                    span.set(
+                        **{
+                            "zai.device_context.version": device_context.version,
+                            "zai.device_context.chars": len(device_context.text),
+                            "zai.device_context.area": focus_area,
+                        }
+                    )
+                devices_context = device_context.text
+                context_version = device_context.version
 
                 # Build memory context
                 memory_context = ""
                 try:
                     if self._memory and options.get(CONF_MEMORY_ENABLED, DEFAULT[CONF_MEMORY_ENABLED]):
-                        await self._memory.async_load()
-                        memory_context = self._memory.build_memory_prompt()
+                        with turn.span("memory_prompt"):
+                            await self._memory.async_load()
+                            memory_context = self._memory.build_memory_prompt()
                 except Exception:
                     _LOGGER.debug("Failed to build memory context", exc_info=True)
 
@@ -363,22 +1345,28 @@ class ZaiConversationEntity(
                 # Get output language
                 output_language = options.get(CONF_OUTPUT_LANGUAGE, DEFAULT[CONF_OUTPUT_LANGUAGE])
 
-                # Build the complete prompt
-                custom_prompt = build_system_prompt(
-                    personality=personality,
-                    devices_context=devices_context,
-                    memory_context=memory_context,
-                    extra_instructions=extra_instructions,
-                    output_language=output_language,
-                )
+                # Build the prefix of the prompt (reused while the options are
+                # the same); devices and memory change from turn to turn and
+                # follow it in a block of their own
+                key = (personality, output_language, extra_instructions)
+                if (prompt_prefix := self._prompt_cache.get(key)) is None:
+                    if len(self._prompt_cache) >= MAX_PROMPT_CACHE:
+                        self._prompt_cache.clear()
+                    prompt_prefix = self._prompt_cache[key] = (
+                        self._build_prompt_prefix(key)
+                    )
 
                 # Create system prompt blocks with our custom prompt
                 system_prompt = [
                     TextBlockParam(
                         type="text",
-                        text=custom_prompt,
+                        text=prompt_prefix,
                         cache_control={"type": "ephemeral"},
-                    )
+                    ),
+                    TextBlockParam(
+                        type="text",
+                        text=build_context_section(devices_context, memory_context),
+                    ),
                 ]
 
                 # Also include HA-generated system content (tool instructions etc.)
@@ -417,51 +1405,164 @@ class ZaiConversationEntity(
             except Exception:
                 _LOGGER.warning("Failed to get any system prompt", exc_info=True)
 
-        # Format messages - skip SystemContent (index 0)
-        messages = _convert_content(chat_log.content[1:])
-
-        # Ensure we have at least one message
-        if not messages:
-            messages = [MessageParam(role="user", content="Hello")]
+        return system_prompt, context_version
 
-        # Format tools
-        tools: list[ToolParam] = []
-        if chat_log.llm_api:
-            tools = [
-                _format_tool(tool, chat_log.llm_api.custom_serializer)
-                for tool in chat_log.llm_api.tools
-            ]
+    async def _async_add_deltas(
+        self,
+        chat_log: conversation.ChatLog,
+        deltas: AsyncIterator[conversation.AssistantContentDeltaDict],
+        language: str,
+        speech: bool,
+        start: float,
+        turn: TurnTrace,
+        call: Span,
+    ) -> None:
+        """Feed model deltas to the chat log in whole sentences.
+
+        The call span ends with the stream; a span per tool call runs from
+        the tool call to its result.
+        """
+        tool_spans: dict[str, Span] = {}
+
+        async def _timed(
+            stream: AsyncIterator[conversation.AssistantContentDeltaDict],
+        ) -> AsyncGenerator[conversation.AssistantContentDeltaDict]:
+            first_chunk = True
+            async for delta in stream:
+                if first_chunk and delta.get("content"):
+                    first_chunk = False
+                    first_ms = (time.monotonic() - start) * 1000
+                    _LOGGER.debug("First sentence ready after %.0f ms", first_ms)
+                    call.set(**{"zai.first_sentence_ms": round(first_ms, 1)})
+                for tool_call in delta.get("tool_calls", ()):
+                    # The chat log starts the tool as soon as it sees the call
+                    tool_spans[tool_call.id] = turn.start_span(
+                        f"execute_tool {tool_call.tool_name}",
+                        parent=call,
+                        **{
+                            "gen_ai.tool.name": tool_call.tool_name,
+                            "gen_ai.tool.call.id": tool_call.id,
+                        },
+                    )
+                yield delta
+            call.end()
+
+        added = False
+        async for content in chat_log.async_add_delta_content_stream(
+            self.entity_id, _timed(_chunk_for_speech(deltas, language, speech))
+        ):
+            added = True
+            if isinstance(content, conversation.ToolResultContent) and (
+                span := tool_spans.pop(content.tool_call_id, None)
+            ):
+                result = content.tool_result
+                if isinstance(result, dict) and "error" in result:
+                    span.error = str(result.get("error_text") or result["error"])
+                # Compacted once here; later iterations reuse it
+                compacted = self._compactor.compact(content)
+                span.set(
+                    **{
+                        "zai.tool_result.mode": compacted.mode,
+                        "zai.tool_result.tokens": compacted.tokens,
+                        "zai.tool_result.tokens_saved": compacted.tokens_saved,
+                    }
+                )
+                span.end()
 
-        # Prepare API call parameters
-        model_args: dict[str, Any] = {
-            "model": model,
-            "messages": messages,
-            "max_tokens": max_tokens,
-            "temperature": temperature,
-        }
+        for span in tool_spans.values():
+            span.end()
 
-        if system_prompt:
-            model_args["system"] = system_prompt
+        if not added:
+            chat_log.async_add_assistant_content_without_tools(
+                conversation.AssistantContent(
+                    content="Sorry, I couldn't get a response from the model.",
+                    agent_id=self.entity_id,
+                )
+            )
 
-        if tools:
-            model_args["tools"] = tools
+    def _build_prompt_prefix(self, key: tuple[str, ...]) -> str:
+        """Build the custom prompt prefix, or take it from the disk cache.
+
+        Args:
+            key: Personality, output language and extra instructions.
+        """
+        disk_key = content_key(*key)
+        if self._disk_cache is not None and (
+            prompt := self._disk_cache.get(SECTION_PROMPTS, disk_key)
+        ):
+            return str(prompt)
+        personality, output_language, extra_instructions = key
+        prompt = build_prompt_prefix(
+            personality=personality,
+            extra_instructions=extra_instructions,
+            output_language=output_language,
+        )
+        if self._disk_cache is not None:
+            self._disk_cache.put(SECTION_PROMPTS, disk_key, prompt)
+        return prompt
 
-        # Tool call iteration loop
-        for _iteration in range(MAX_TOOL_ITERATIONS):
-            try:
-                message = await client.messages.create(**model_args)
+    def _format_tools(self, llm_api: llm.APIInstance) -> list[ToolParam]:
+        """Format the tools of an LLM API, reusing earlier conversions.
 
-                await _process_message(chat_log, message, self.entity_id)
+        Converting a voluptuous schema to JSON schema is the expensive part;
+        conversions are kept by a hash of the tool's name, description,
+        parameters and serializer, also in the disk cache.
+        """
+        if len(self._tool_cache) > MAX_TOOL_CACHE:
+            self._tool_cache.clear()
 
-            except anthropic.AnthropicError as err:
-                raise HomeAssistantError(
-                    f"Sorry, I had a problem talking to z.ai: {err}"
-                ) from err
+        tools: list[ToolParam] = []
+        for tool in llm_api.tools:
+            key = _tool_key(tool, llm_api.custom_serializer)
+            if (formatted := self._tool_cache.get(key)) is None:
+                if self._disk_cache is not None and (
+                    stored := self._disk_cache.get(SECTION_TOOLS, key)
+                ):
+                    formatted = stored
+                else:
+                    formatted = _format_tool(tool, llm_api.custom_serializer)
+                    if self._disk_cache is not None:
+                        self._disk_cache.put(SECTION_TOOLS, key, formatted)
+                self._tool_cache[key] = formatted
+            tools.append(formatted)
+        return tools
+
+    def _resolve_names(self, chat_log: conversation.ChatLog) -> list[NameHint]:
+        """Find the entities and areas the latest user utterance mentions."""
+        assert self._resolver is not None
+        if not (user_text := _latest_user_text(chat_log)):
+            return []
+        area_filter = self.entry.options.get(
+            CONF_AREA_FILTER, DEFAULT[CONF_AREA_FILTER]
+        )
+        return self._resolver.resolve(
+            user_text, area_filter=area_filter if area_filter else None
+        )
 
-            # Check if we need to continue with tool results
-            if not chat_log.unresponded_tool_results:
-                break
+    def _route_utterance(
+        self, chat_log: conversation.ChatLog, large_model: str
+    ) -> RouteDecision | None:
+        """Classify the latest user utterance and pick its model."""
+        assert self._router is not None
+        options = self.entry.options
 
-            # Add tool results and continue
-            messages = _convert_content(chat_log.content[1:])
-            model_args["messages"] = messages
+        user_text = _latest_user_text(chat_log)
+        fast_model = options.get(CONF_FAST_MODEL, DEFAULT[CONF_FAST_MODEL])
+        if not user_text or fast_model == large_model:
+            return None
+
+        # Looked up in the name index, which is kept up to date as names change
+        entity_mentions = area_mentions = 0
+        if self._resolver is not None:
+            entity_mentions, area_mentions = self._resolver.count_mentions(user_text)
+        return self._router.route(
+            user_text,
+            fast_model=fast_model,
+            large_model=large_model,
+            threshold=int(
+                options.get(CONF_ROUTING_THRESHOLD, DEFAULT[CONF_ROUTING_THRESHOLD])
+            ),
+            entity_mentions=entity_mentions,
+            area_mentions=area_mentions,
+            habitual=self._memory is not None and self._memory.is_habitual(user_text),
+        )
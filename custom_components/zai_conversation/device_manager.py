@@ -1,11 +1,49 @@
-"""Device context builder for z.ai Conversation."""
+"""Device context builder for z.ai Conversation.
+
+The builder keeps a version number that goes up on every state change and
+every area, device or entity registry update. A rendered context is tagged
+with the version it was rendered at, so callers can tell which snapshot the
+model saw and skip rendering again while nothing has changed.
+
+Noisy sensors would bump the version all the time, so state changes go
+through significance rules first: numeric values are rounded and compared
+against a per-device_class deadband, attribute changes only count when an
+attribute the context shows changes, and diagnostic and config entities are
+left out of the context altogether.
+
+Rendering reads an immutable snapshot of the states and registries taken on
+the event loop. Once the measured render time for the current number of
+states passes a few milliseconds, it runs in the executor instead, so large
+installations don't hold up the loop while the context is formatted.
+
+Each render also refreshes an index with one slotted entry per entity,
+holding the entity's formatted line. An entry is reused for as long as the
+entity's state object is the same one (states are immutable and replaced on
+every change), so a render only formats the entities that changed since the
+last one. Domains and area names are interned, as they repeat across
+thousands of entities. State values are not: an entry keeps Home Assistant's
+state object rather than a copy of its strings, translated values come from
+constant tables, and the value is otherwise only part of the entity's line.
+
+A context can be scoped to the area of the satellite a request came from:
+that area's devices in full, only the names of the devices in the other
+areas of its floor, and only the number of devices per domain elsewhere.
+Scoped contexts are cached per area, next to the full one.
+"""
 
 from __future__ import annotations
 
+from collections.abc import Callable, Mapping
+from dataclasses import dataclass, field
 import logging
+from operator import attrgetter, itemgetter
+import sys
+import time
+from types import MappingProxyType
 from typing import Any
 
-from homeassistant.core import HomeAssistant, State
+from homeassistant.const import EVENT_STATE_CHANGED, EntityCategory
+from homeassistant.core import CALLBACK_TYPE, Event, HomeAssistant, State, callback
 from homeassistant.helpers import area_registry as ar
 from homeassistant.helpers import device_registry as dr
 from homeassistant.helpers import entity_registry as er
@@ -130,6 +168,125 @@ SKIP_DOMAINS: set[str] = {
 }
 
 
+# Entity categories left out of the context
+EXCLUDED_ENTITY_CATEGORIES: frozenset[EntityCategory] = frozenset(
+    {EntityCategory.CONFIG, EntityCategory.DIAGNOSTIC}
+)
+
+
+# Renders expected to take longer than this run in the executor
+EXECUTOR_RENDER_SECONDS = 0.005
+
+# Until a render has been timed, offload from this many states on
+EXECUTOR_MIN_STATES = 2000
+
+# Weight of the newest sample in the render time moving average
+RENDER_COST_ALPHA = 0.3
+
+
+@dataclass(frozen=True, slots=True)
+class SignificanceRule:
+    """How a numeric value is shown and how much it must move to matter.
+
+    Attributes:
+        precision: Decimals shown in the context, None = as reported.
+        deadband: Changes smaller than this (from the last value that
+            mattered) don't change the context.
+    """
+
+    precision: int | None = None
+    deadband: float = 0.0
+
+
+# Numeric states by sensor/number device_class
+DEVICE_CLASS_SIGNIFICANCE: dict[str, SignificanceRule] = {
+    "power": SignificanceRule(precision=0, deadband=10.0),
+    "apparent_power": SignificanceRule(precision=0, deadband=10.0),
+    "reactive_power": SignificanceRule(precision=0, deadband=10.0),
+    "energy": SignificanceRule(precision=1, deadband=0.1),
+    "current": SignificanceRule(precision=1, deadband=0.1),
+    "voltage": SignificanceRule(precision=0, deadband=2.0),
+    "power_factor": SignificanceRule(precision=0, deadband=5.0),
+    "frequency": SignificanceRule(precision=1, deadband=0.2),
+    "signal_strength": SignificanceRule(precision=0, deadband=5.0),
+    "data_rate": SignificanceRule(precision=0, deadband=10.0),
+    "temperature": SignificanceRule(precision=1, deadband=0.2),
+    "humidity": SignificanceRule(precision=0, deadband=1.0),
+    "moisture": SignificanceRule(precision=0, deadband=1.0),
+    "pressure": SignificanceRule(precision=0, deadband=1.0),
+    "atmospheric_pressure": SignificanceRule(precision=0, deadband=1.0),
+    "illuminance": SignificanceRule(precision=0, deadband=20.0),
+    "battery": SignificanceRule(precision=0, deadband=5.0),
+    "carbon_dioxide": SignificanceRule(precision=0, deadband=25.0),
+    "pm25": SignificanceRule(precision=0, deadband=2.0),
+    "pm10": SignificanceRule(precision=0, deadband=2.0),
+    "volatile_organic_compounds": SignificanceRule(precision=0, deadband=10.0),
+    "sound_pressure": SignificanceRule(precision=0, deadband=3.0),
+    "wind_speed": SignificanceRule(precision=0, deadband=1.0),
+}
+
+# Numeric states by domain, when the device_class has no rule
+DOMAIN_SIGNIFICANCE: dict[str, SignificanceRule] = {
+    "sensor": SignificanceRule(precision=2),
+    "number": SignificanceRule(precision=2),
+    "input_number": SignificanceRule(precision=2),
+}
+
+# Numeric attributes shown by _format_attributes
+ATTRIBUTE_SIGNIFICANCE: dict[str, SignificanceRule] = {
+    "current_temperature": SignificanceRule(precision=1, deadband=0.2),
+    "temperature": SignificanceRule(precision=1),
+    "current_humidity": SignificanceRule(precision=0, deadband=1.0),
+    "humidity": SignificanceRule(precision=0, deadband=1.0),
+    "pressure": SignificanceRule(precision=0, deadband=1.0),
+    "wind_speed": SignificanceRule(precision=0, deadband=1.0),
+    "wind_bearing": SignificanceRule(precision=0, deadband=10.0),
+    "battery_level": SignificanceRule(precision=0, deadband=5.0),
+    "volume_level": SignificanceRule(precision=2),
+    "current_position": SignificanceRule(precision=0),
+}
+
+
+def significance_rule(domain: str, device_class: str | None) -> SignificanceRule | None:
+    """Return the significance rule for a numeric state, if any."""
+    if device_class and device_class in DEVICE_CLASS_SIGNIFICANCE:
+        return DEVICE_CLASS_SIGNIFICANCE[device_class]
+    return DOMAIN_SIGNIFICANCE.get(domain)
+
+
+def _to_float(value: Any) -> float | None:
+    """Return value as a float, or None if it isn't numeric."""
+    if isinstance(value, bool):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _round_value(value: Any, rule: SignificanceRule | None) -> Any:
+    """Round a numeric value to the precision of its rule."""
+    if rule is None or rule.precision is None:
+        return value
+    number = _to_float(value)
+    if number is None:
+        return value
+    if rule.precision == 0:
+        return round(number)
+    rounded = round(number, rule.precision)
+    # "21.0" reads as "21"
+    return int(rounded) if rounded.is_integer() else rounded
+
+
+def _is_small_change(old: float, new: float, rule: SignificanceRule) -> bool:
+    """Return True if a numeric change doesn't matter under a rule."""
+    if rule.deadband and abs(new - old) < rule.deadband:
+        return True
+    return rule.precision is not None and round(old, rule.precision) == round(
+        new, rule.precision
+    )
+
+
 def _translate_state(domain: str, state: str) -> str:
     """Translate state to human-readable format."""
     if domain in STATE_TRANSLATIONS:
@@ -154,7 +311,9 @@ def _format_attributes(domain: str, state: State) -> str:
     attrs = []
     for key in relevant_keys:
         if key in state.attributes:
-            value = state.attributes[key]
+            value = _round_value(
+                state.attributes[key], ATTRIBUTE_SIGNIFICANCE.get(key)
+            )
             if value is None:
                 continue
 
@@ -192,18 +351,488 @@ def _format_attributes(domain: str, state: State) -> str:
     return ", ".join(attrs) if attrs else ""
 
 
+@dataclass(frozen=True, slots=True)
+class DeviceContext:
+    """A rendered device context and the version it was rendered at."""
+
+    text: str
+    version: int
+
+
+@dataclass(frozen=True, slots=True)
+class IndexEntry:
+    """An entity's line in the device context.
+
+    Valid while the entity's state is the same object.
+    """
+
+    state: State
+    domain: str
+    name: str
+    line: str
+
+
+# Headings of a context scoped to an area
+SCOPE_HERE_HEADING = "## {area} (area della richiesta)"
+SCOPE_FLOOR_HEADING = "## Stesso piano (solo nomi)"
+SCOPE_OTHER_HEADING = "## Altre aree (numero di dispositivi)"
+NO_AREA_NAME = "Altro (senza area)"
+
+# Order of the entities within an area, and without one
+_BY_DOMAIN_AND_NAME = attrgetter("domain", "name")
+_BY_NAME = attrgetter("name")
+
+
+@dataclass(frozen=True, slots=True)
+class ContextSnapshot:
+    """What rendering the device context reads, captured on the event loop.
+
+    States are immutable, so holding on to them is enough to render from
+    another thread while the loop moves on.
+    """
+
+    states: tuple[State, ...]
+    areas: Mapping[str, str]
+    entity_to_area: Mapping[str, str | None]
+    excluded: frozenset[str]
+    version: int
+    # Floor of each area that has one
+    area_floors: Mapping[str, str] = field(default_factory=dict)
+    # Index of the previous render, reused where states are unchanged
+    index: Mapping[str, IndexEntry] = field(default_factory=dict)
+
+
+def _index_entry(state: State, domain: str) -> IndexEntry:
+    """Format an entity's line in the device context."""
+    entity_id = state.entity_id
+    name = state.attributes.get("friendly_name", entity_id)
+    translated_state = _translate_state(domain, state.state)
+
+    # For sensors, append unit (numbers rounded to their significance)
+    if domain == "sensor" and "unit_of_measurement" in state.attributes:
+        value = _round_value(
+            state.state,
+            significance_rule(domain, state.attributes.get("device_class")),
+        )
+        translated_state = f"{value} {state.attributes['unit_of_measurement']}"
+
+    line = f"- {name} ({entity_id}): {translated_state}"
+    if attrs := _format_attributes(domain, state):
+        line += f" [{attrs}]"
+    return IndexEntry(state, domain, name, line)
+
+
+def index_states(snapshot: ContextSnapshot) -> dict[str, IndexEntry]:
+    """Return the index of the snapshot's states.
+
+    Entries of the previous index whose state is unchanged are reused; the
+    others are formatted again. Entities left out of the context have none.
+    """
+    previous = snapshot.index
+    index: dict[str, IndexEntry] = {}
+    for state in snapshot.states:
+        entity_id = state.entity_id
+        # Skip diagnostic/config entities
+        if entity_id in snapshot.excluded:
+            continue
+        entry = previous.get(entity_id)
+        if entry is not None and entry.state is state:
+            index[entity_id] = entry
+            continue
+
+        # Skip unwanted domains
+        domain = sys.intern(state.domain)
+        if domain in SKIP_DOMAINS:
+            continue
+        index[entity_id] = _index_entry(state, domain)
+    return index
+
+
+def index_size(index: Mapping[str, IndexEntry]) -> int:
+    """Return the bytes an index holds on its own.
+
+    That is the mapping, its entries and their lines; states, names and the
+    interned domains are shared with Home Assistant and not counted.
+    """
+    return sys.getsizeof(index) + sum(
+        sys.getsizeof(entry) + sys.getsizeof(entry.line) for entry in index.values()
+    )
+
+
+def render_context(
+    snapshot: ContextSnapshot,
+    area_filter: list[str] | None,
+    domain_filter: list[str] | None,
+    include_unavailable: bool,
+    focus_area: str | None = None,
+    index: Mapping[str, IndexEntry] | None = None,
+) -> str:
+    """Render the device context from a snapshot.
+
+    Only reads the snapshot, so it is safe to run in the executor.
+
+    Args:
+        snapshot: States and registries to render.
+        area_filter: Area IDs to include. None = all areas.
+        domain_filter: Domains to include. None = all domains.
+        include_unavailable: Whether to include unavailable entities.
+        focus_area: Area ID to scope the context to. None, or an area that
+            doesn't exist or is filtered out = the full context.
+        index: Index of the snapshot's states, built if not given.
+    """
+    if index is None:
+        index = index_states(snapshot)
+    scoped = (
+        focus_area is not None
+        and focus_area in snapshot.areas
+        and (not area_filter or focus_area in area_filter)
+    )
+
+    # Group entities by area (by area ID when scoped, as areas on the focus
+    # area's floor are told apart by ID)
+    devices_by_area: dict[str, list[IndexEntry]] = {}
+    no_area_devices: list[IndexEntry] = []
+
+    for entity_id, entry in index.items():
+        # Apply domain filter
+        if domain_filter and entry.domain not in domain_filter:
+            continue
+
+        # Skip unavailable if not requested
+        if not include_unavailable and entry.state.state in (
+            "unavailable",
+            "unknown",
+        ):
+            continue
+
+        # Get area
+        area_id = snapshot.entity_to_area.get(entity_id)
+
+        # Apply area filter
+        if area_filter and area_id not in area_filter:
+            continue
+
+        if area_id and area_id in snapshot.areas:
+            group = area_id if scoped else snapshot.areas[area_id]
+            if group not in devices_by_area:
+                devices_by_area[group] = []
+            devices_by_area[group].append(entry)
+        else:
+            no_area_devices.append(entry)
+
+    if scoped:
+        return _render_scoped(snapshot, devices_by_area, no_area_devices, focus_area)
+
+    # Build output string
+    output_parts = []
+
+    # Sorted areas, by domain and name within an area
+    for area_name in sorted(devices_by_area.keys()):
+        output_parts.append(f"\n## {area_name}")
+        devices = sorted(devices_by_area[area_name], key=_BY_DOMAIN_AND_NAME)
+        output_parts.extend(device.line for device in devices)
+
+    # Devices without area
+    if no_area_devices:
+        output_parts.append("\n## Altro (senza area)")
+        devices = sorted(no_area_devices, key=_BY_NAME)
+        output_parts.extend(device.line for device in devices)
+
+    return "\n".join(output_parts)
+
+
+def _domain_counts(devices: list[IndexEntry]) -> str:
+    """Summarise devices as their number per domain."""
+    counts: dict[str, int] = {}
+    for device in devices:
+        counts[device.domain] = counts.get(device.domain, 0) + 1
+    return ", ".join(f"{domain} {counts[domain]}" for domain in sorted(counts))
+
+
+def _render_scoped(
+    snapshot: ContextSnapshot,
+    devices_by_area: dict[str, list[IndexEntry]],
+    no_area_devices: list[IndexEntry],
+    focus_area: str,
+) -> str:
+    """Render the device context scoped to an area.
+
+    The area's devices in full, names only for the other areas on its
+    floor, and counts per domain for the remaining areas.
+    """
+    floor = snapshot.area_floors.get(focus_area)
+    output_parts = [f"\n{SCOPE_HERE_HEADING.format(area=snapshot.areas[focus_area])}"]
+    devices = sorted(devices_by_area.get(focus_area, ()), key=_BY_DOMAIN_AND_NAME)
+    output_parts.extend(device.line for device in devices)
+
+    same_floor: list[tuple[str, list[IndexEntry]]] = []
+    elsewhere: list[tuple[str, list[IndexEntry]]] = []
+    for area_id, devices in devices_by_area.items():
+        if area_id == focus_area:
+            continue
+        if floor is not None and snapshot.area_floors.get(area_id) == floor:
+            same_floor.append((snapshot.areas[area_id], devices))
+        else:
+            elsewhere.append((snapshot.areas[area_id], devices))
+
+    if same_floor:
+        output_parts.append(f"\n{SCOPE_FLOOR_HEADING}")
+        for area_name, devices in sorted(same_floor, key=itemgetter(0)):
+            names = sorted({str(device.name) for device in devices})
+            output_parts.append(f"- {area_name}: {', '.join(names)}")
+
+    # Devices without area last
+    elsewhere.sort(key=itemgetter(0))
+    if no_area_devices:
+        elsewhere.append((NO_AREA_NAME, no_area_devices))
+    if elsewhere:
+        output_parts.append(f"\n{SCOPE_OTHER_HEADING}")
+        for area_name, devices in elsewhere:
+            output_parts.append(f"- {area_name}: {_domain_counts(devices)}")
+
+    return "\n".join(output_parts)
+
+
+def _timed_render(
+    snapshot: ContextSnapshot, *args: Any
+) -> tuple[str, dict[str, IndexEntry], float]:
+    """Render the device context.
+
+    Returns it with the refreshed index and the seconds both took.
+    """
+    start = time.perf_counter()
+    index = index_states(snapshot)
+    text = render_context(snapshot, *args, index=index)
+    return text, index, time.perf_counter() - start
+
+
+# Events that change what the device context would contain (state changes
+# are filtered by significance first)
+_REGISTRY_EVENTS = (
+    ar.EVENT_AREA_REGISTRY_UPDATED,
+    dr.EVENT_DEVICE_REGISTRY_UPDATED,
+    er.EVENT_ENTITY_REGISTRY_UPDATED,
+)
+
+
 class DeviceContextBuilder:
     """Build optimized device context for LLM."""
 
-    def __init__(self, hass: HomeAssistant):
-        """Initialize the device context builder."""
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        excluded_categories: frozenset[EntityCategory] = EXCLUDED_ENTITY_CATEGORIES,
+    ):
+        """Initialize the device context builder.
+
+        Args:
+            hass: Home Assistant instance.
+            excluded_categories: Entity categories left out of the context.
+        """
         self.hass = hass
+        self._excluded_categories = excluded_categories
+        self.version = 0
+        self._tracking = False
+        self._cache: dict[tuple[Any, ...], DeviceContext] = {}
+        self._hits = 0
+        self._misses = 0
+        self._ignored = 0
+        # Last numeric value that counted as a change, per entity
+        self._baselines: dict[str, float] = {}
+        # Area names, entity areas, excluded entities and area floors; kept
+        # until a registry changes
+        self._registry_view: (
+            tuple[dict[str, str], dict[str, str | None], frozenset[str], dict[str, str]]
+            | None
+        ) = None
+        # Render time per state (seconds), to decide where to render
+        self._render_cost: float | None = None
+        self._inline_renders = 0
+        self._executor_renders = 0
+        # Formatted line per entity, refreshed by every render
+        self._index: dict[str, IndexEntry] = {}
+        self._reused_lines = 0
+        self._scoped_renders = 0
+
+    @callback
+    def async_start(self) -> CALLBACK_TYPE:
+        """Start versioning on state and registry changes.
+
+        Returns a callback that stops it. Until started every request renders
+        the context again.
+        """
+        unsubs: list[Callable[[], None]] = [
+            self.hass.bus.async_listen(event_type, self._async_bump_version)
+            for event_type in _REGISTRY_EVENTS
+        ]
+        unsubs.append(
+            self.hass.bus.async_listen(EVENT_STATE_CHANGED, self._async_state_changed)
+        )
+        self._tracking = True
+
+        @callback
+        def _async_stop() -> None:
+            self._tracking = False
+            self._cache.clear()
+            self._baselines.clear()
+            self._registry_view = None
+            self._index = {}
+            for unsub in unsubs:
+                unsub()
+
+        return _async_stop
+
+    @callback
+    def async_clear_renders(self) -> None:
+        """Drop the rendered contexts; versioning, baselines and index stay."""
+        self._cache.clear()
+
+    @callback
+    def _async_bump_version(self, _event: Event) -> None:
+        """Note that the device context may have changed."""
+        self.version += 1
+        self._registry_view = None
+
+    @callback
+    def _async_state_changed(self, event: Event) -> None:
+        """Bump the version if a state change shows in the context."""
+        if self.is_significant(event.data["old_state"], event.data["new_state"]):
+            self.version += 1
+        else:
+            self._ignored += 1
+
+    def is_significant(self, old: State | None, new: State | None) -> bool:
+        """Return True if going from old to new changes the device context.
+
+        Numeric states within their deadband, attribute changes that the
+        context doesn't show, and entities left out of the context don't.
+        """
+        if old is None or new is None:
+            # Added or removed
+            return True
+
+        entity_id = new.entity_id
+        domain = new.domain
+        if domain in SKIP_DOMAINS or self._is_excluded(entity_id):
+            return False
+
+        if old.state != new.state:
+            rule = significance_rule(domain, new.attributes.get("device_class"))
+            value = _to_float(new.state)
+            if rule is None or value is None:
+                self._baselines.pop(entity_id, None)
+                return True
+            baseline = self._baselines.get(entity_id)
+            if baseline is None:
+                baseline = _to_float(old.state)
+            if baseline is not None and _is_small_change(baseline, value, rule):
+                self._baselines[entity_id] = baseline
+                return self._attributes_changed(domain, old, new)
+            self._baselines[entity_id] = value
+            return True
+
+        return self._attributes_changed(domain, old, new)
+
+    def _attributes_changed(self, domain: str, old: State, new: State) -> bool:
+        """Return True if an attribute shown in the context changed."""
+        if old.attributes.get("friendly_name") != new.attributes.get("friendly_name"):
+            return True
+        if domain == "sensor" and old.attributes.get(
+            "unit_of_measurement"
+        ) != new.attributes.get("unit_of_measurement"):
+            return True
+        for key in DOMAIN_RELEVANT_ATTRS.get(domain, ()):
+            before = old.attributes.get(key)
+            after = new.attributes.get(key)
+            if before == after:
+                continue
+            rule = ATTRIBUTE_SIGNIFICANCE.get(key)
+            before_value = _to_float(before)
+            after_value = _to_float(after)
+            if (
+                rule is not None
+                and before_value is not None
+                and after_value is not None
+                and _is_small_change(before_value, after_value, rule)
+            ):
+                continue
+            return True
+        return False
+
+    def _is_excluded(self, entity_id: str) -> bool:
+        """Return True if an entity's category keeps it out of the context."""
+        entry = er.async_get(self.hass).async_get(entity_id)
+        return entry is not None and entry.entity_category in self._excluded_categories
+
+    def changed_since(self, version: int) -> bool:
+        """Return True if the context may differ from the one at version."""
+        return not self._tracking or version != self.version
+
+    def satellite_area(self, device_id: str | None) -> str | None:
+        """Return the area of the device a request came from, if it has one."""
+        if device_id is None:
+            return None
+        device = dr.async_get(self.hass).async_get(device_id)
+        return device.area_id if device is not None else None
+
+    async def async_get_context(
+        self,
+        area_filter: list[str] | None = None,
+        domain_filter: list[str] | None = None,
+        include_unavailable: bool = False,
+        focus_area: str | None = None,
+    ) -> DeviceContext:
+        """Return the device context, rendering it only if it changed.
+
+        Arguments are the same as for build_context().
+        """
+        key = (
+            tuple(area_filter or ()),
+            tuple(domain_filter or ()),
+            include_unavailable,
+            focus_area,
+        )
+        cached = self._cache.get(key)
+        if cached is not None and not self.changed_since(cached.version):
+            self._hits += 1
+            return cached
+
+        self._misses += 1
+        # The snapshot pins the states and registries to one version, so the
+        # render belongs to it even if it runs in the executor
+        snapshot = self._async_snapshot()
+        count = len(snapshot.states)
+        args = (snapshot, area_filter, domain_filter, include_unavailable, focus_area)
+        if focus_area is not None:
+            self._scoped_renders += 1
+        if self._should_offload(count):
+            self._executor_renders += 1
+            text, index, elapsed = await self.hass.async_add_executor_job(
+                _timed_render, *args
+            )
+        else:
+            self._inline_renders += 1
+            text, index, elapsed = _timed_render(*args)
+        self._record_render_cost(elapsed, count)
+        if self._tracking:
+            self._reused_lines = sum(
+                1
+                for entity_id, entry in index.items()
+                if snapshot.index.get(entity_id) is entry
+            )
+            self._index = index
+
+        context = DeviceContext(text, snapshot.version)
+        if self._tracking:
+            self._cache[key] = context
+        return context
 
     async def build_context(
         self,
         area_filter: list[str] | None = None,
         domain_filter: list[str] | None = None,
         include_unavailable: bool = False,
+        focus_area: str | None = None,
     ) -> str:
         """Build device context string grouped by area.
 
@@ -211,115 +840,105 @@ class DeviceContextBuilder:
             area_filter: List of area IDs to include. None = all areas.
             domain_filter: List of domains to include. None = all domains.
             include_unavailable: Whether to include unavailable entities.
+            focus_area: Area ID to scope the context to (e.g. the satellite's
+                area). None = every area in full.
 
         Returns:
             Formatted string with devices grouped by area.
         """
+        context = await self.async_get_context(
+            area_filter, domain_filter, include_unavailable, focus_area
+        )
+        return context.text
+
+    @callback
+    def _async_snapshot(self) -> ContextSnapshot:
+        """Capture what the next render reads."""
+        view = self._registry_view
+        if view is None:
+            view = self._build_registry_view()
+            if self._tracking:
+                self._registry_view = view
+        areas, entity_to_area, excluded, area_floors = view
+        return ContextSnapshot(
+            states=tuple(self.hass.states.async_all()),
+            areas=areas,
+            entity_to_area=entity_to_area,
+            excluded=excluded,
+            version=self.version,
+            area_floors=area_floors,
+            index=MappingProxyType(self._index),
+        )
+
+    def _build_registry_view(
+        self,
+    ) -> tuple[dict[str, str], dict[str, str | None], frozenset[str], dict[str, str]]:
+        """Return area names, entity areas, excluded entities and area floors."""
         area_reg = ar.async_get(self.hass)
         entity_reg = er.async_get(self.hass)
         device_reg = dr.async_get(self.hass)
 
-        # Build area mapping
-        areas: dict[str, str] = {
-            area.id: area.name for area in area_reg.async_list_areas()
+        areas = {
+            area.id: sys.intern(area.name) for area in area_reg.async_list_areas()
+        }
+        area_floors = {
+            area.id: area.floor_id
+            for area in area_reg.async_list_areas()
+            if area.floor_id
         }
 
-        # Build entity to area mapping
         entity_to_area: dict[str, str | None] = {}
+        excluded: set[str] = set()
         for entity in entity_reg.entities.values():
+            if entity.entity_category in self._excluded_categories:
+                excluded.add(entity.entity_id)
+                continue
             area_id = entity.area_id
             if not area_id and entity.device_id:
                 device = device_reg.async_get(entity.device_id)
                 if device:
                     area_id = device.area_id
             entity_to_area[entity.entity_id] = area_id
-
-        # Group entities by area
-        devices_by_area: dict[str, list[dict[str, Any]]] = {}
-        no_area_devices: list[dict[str, Any]] = []
-
-        for state in self.hass.states.async_all():
-            entity_id = state.entity_id
-            domain = entity_id.split(".")[0]
-
-            # Skip unwanted domains
-            if domain in SKIP_DOMAINS:
-                continue
-
-            # Apply domain filter
-            if domain_filter and domain not in domain_filter:
-                continue
-
-            # Skip unavailable if not requested
-            if not include_unavailable and state.state in ("unavailable", "unknown"):
-                continue
-
-            # Get area
-            area_id = entity_to_area.get(entity_id)
-
-            # Apply area filter
-            if area_filter and area_id not in area_filter:
-                continue
-
-            # Build device info
-            friendly_name = state.attributes.get("friendly_name", entity_id)
-            translated_state = _translate_state(domain, state.state)
-
-            # For sensors, append unit
-            if domain == "sensor" and "unit_of_measurement" in state.attributes:
-                translated_state = f"{state.state} {state.attributes['unit_of_measurement']}"
-
-            attrs = _format_attributes(domain, state)
-
-            device_info = {
-                "entity_id": entity_id,
-                "name": friendly_name,
-                "domain": domain,
-                "state": translated_state,
-                "attributes": attrs,
-            }
-
-            if area_id and area_id in areas:
-                area_name = areas[area_id]
-                if area_name not in devices_by_area:
-                    devices_by_area[area_name] = []
-                devices_by_area[area_name].append(device_info)
-            else:
-                no_area_devices.append(device_info)
-
-        # Build output string
-        output_parts = []
-
-        # Sorted areas
-        for area_name in sorted(devices_by_area.keys()):
-            devices = devices_by_area[area_name]
-            output_parts.append(f"\n## {area_name}")
-
-            # Group by domain within area
-            by_domain: dict[str, list[dict[str, Any]]] = {}
-            for device in devices:
-                d = device["domain"]
-                if d not in by_domain:
-                    by_domain[d] = []
-                by_domain[d].append(device)
-
-            for domain in sorted(by_domain.keys()):
-                for device in sorted(by_domain[domain], key=lambda x: x["name"]):
-                    line = f"- {device['name']} ({device['entity_id']}): {device['state']}"
-                    if device["attributes"]:
-                        line += f" [{device['attributes']}]"
-                    output_parts.append(line)
-
-        # Devices without area
-        if no_area_devices:
-            output_parts.append("\n## Altro (senza area)")
-            for device in sorted(no_area_devices, key=lambda x: x["name"]):
-                line = f"- {device['name']} ({device['entity_id']}): {device['state']}"
-                if device["attributes"]:
-                    line += f" [{device['attributes']}]"
-                output_parts.append(line)
-
-        return "\n".join(output_parts)
+        return areas, entity_to_area, frozenset(excluded), area_floors
+
+    def _should_offload(self, count: int) -> bool:
+        """Return True if rendering count states would hold the loop too long."""
+        if self._render_cost is None:
+            return count >= EXECUTOR_MIN_STATES
+        return self._render_cost * count > EXECUTOR_RENDER_SECONDS
+
+    def _record_render_cost(self, elapsed: float, count: int) -> None:
+        """Update the moving average of the render time per state."""
+        if not count:
+            return
+        cost = elapsed / count
+        if self._render_cost is None:
+            self._render_cost = cost
+        else:
+            self._render_cost += RENDER_COST_ALPHA * (cost - self._render_cost)
+
+    @property
+    def metrics(self) -> dict[str, Any]:
+        """Return versioning, cache and render statistics."""
+        return {
+            "version": self.version,
+            "tracking": self._tracking,
+            "cached_renders": len(self._cache),
+            "hits": self._hits,
+            "misses": self._misses,
+            "ignored_state_changes": self._ignored,
+            "inline_renders": self._inline_renders,
+            "executor_renders": self._executor_renders,
+            "scoped_renders": self._scoped_renders,
+            "offload_above_states": (
+                int(EXECUTOR_RENDER_SECONDS / self._render_cost)
+                if self._render_cost
+                else EXECUTOR_MIN_STATES
+            ),
+            "index_entities": len(self._index),
+            "index_bytes": index_size(self._index),
+            "index_reused_lines": self._reused_lines,
+        }
 
     def get_available_areas(self) -> list[dict[str, str]]:
         """Get list of available areas."""
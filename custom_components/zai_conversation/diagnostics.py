@@ -0,0 +1,68 @@
+"""Diagnostics support for z.ai Conversation."""
+
+from __future__ import annotations
+
+from typing import Any
+
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import CONF_API_KEY
+from homeassistant.core import HomeAssistant
+
+from .const import (
+    CACHES_KEY,
+    COMPACTOR_KEY,
+    CONF_EXTRA_ENDPOINTS,
+    DEVICE_CONTEXT_KEY,
+    DOMAIN,
+    MEMORY_KEY,
+    RESOLVER_KEY,
+    ROUTER_KEY,
+    STARTUP_KEY,
+    TRACER_KEY,
+)
+
+TO_REDACT = {CONF_API_KEY, CONF_EXTRA_ENDPOINTS}
+
+
+async def async_get_config_entry_diagnostics(
+    hass: HomeAssistant, entry: ConfigEntry
+) -> dict[str, Any]:
+    """Return diagnostics for a config entry."""
+    diagnostics: dict[str, Any] = {
+        "data": async_redact_data(dict(entry.data), TO_REDACT),
+        "options": async_redact_data(dict(entry.options), TO_REDACT),
+    }
+
+    entry_data = hass.data.get(DOMAIN, {}).get(entry.entry_id, {})
+
+    if startup := entry_data.get(STARTUP_KEY):
+        diagnostics["startup"] = startup
+
+    if pool := getattr(entry, "runtime_data", None):
+        diagnostics["pool"] = pool.metrics
+        if pool.recorder is not None:
+            diagnostics["recording"] = pool.recorder.metrics
+
+    if memory := entry_data.get(MEMORY_KEY):
+        diagnostics["memory"] = memory.metrics
+
+    if router := entry_data.get(ROUTER_KEY):
+        diagnostics["model_routing"] = router.metrics
+
+    if device_builder := entry_data.get(DEVICE_CONTEXT_KEY):
+        diagnostics["device_context"] = device_builder.metrics
+
+    if resolver := entry_data.get(RESOLVER_KEY):
+        diagnostics["name_hints"] = resolver.metrics
+
+    if compactor := entry_data.get(COMPACTOR_KEY):
+        diagnostics["tool_results"] = compactor.metrics
+
+    if caches := entry_data.get(CACHES_KEY):
+        diagnostics["disk_cache"] = caches.disk_cache.metrics
+
+    if tracer := entry_data.get(TRACER_KEY):
+        diagnostics["tracing"] = tracer.metrics
+
+    return diagnostics
@@ -0,0 +1,353 @@
+"""Persistent cache of prompt artefacts for z.ai Conversation.
+
+After a restart every agent starts cold: tool schemas are converted from
+voluptuous again, system prompts are rebuilt and the name index tokenizes
+every entity and area name again, all while the first requests come in.
+These artefacts are deterministic, so they are kept in one file per entry
+under .storage, keyed by content:
+
+- ``tools``: formatted tool schemas, by hash of the tool name, description,
+  parameters and serializer
+- ``prompts``: system prompt prefixes, by hash of the personality, language
+  and extra instructions (devices and memory change every turn and are not
+  cached)
+- ``names``: the words of each entity and area name, by name
+
+The file starts with a table of contents and is memory-mapped, so loading it
+only reads the table; an entry is decoded the first time it is asked for.
+Names are checked against the current registries by the name index itself
+(a name that no longer exists is simply not asked for, and is dropped on the
+next save). The whole file is ignored after a Home Assistant or integration
+upgrade, as either can change what the artefacts look like.
+
+Changes are written by a background task that coalesces everything arriving
+within SAVE_DELAY, to a new file that replaces the old one.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from collections import OrderedDict
+import hashlib
+import json
+import logging
+import mmap
+import os
+from pathlib import Path
+import struct
+from typing import Any, Final
+
+from homeassistant.core import HomeAssistant, callback
+
+from .const import DOMAIN
+
+_LOGGER = logging.getLogger(__name__)
+
+SECTION_TOOLS: Final = "tools"
+SECTION_PROMPTS: Final = "prompts"
+SECTION_NAMES: Final = "names"
+
+# Entries kept per section, most recently used first
+MAX_ENTRIES: Final[dict[str, int]] = {
+    SECTION_TOOLS: 256,
+    SECTION_PROMPTS: 8,
+    SECTION_NAMES: 1,
+}
+
+# Bumped when the file layout changes
+CACHE_VERSION: Final = 1
+
+# Seconds of changes written together
+SAVE_DELAY: Final = 30.0
+
+# Magic, layout version and table of contents length
+_HEADER = struct.Struct("<4sIQ")
+_MAGIC: Final = b"ZAIC"
+
+
+def content_key(*parts: str) -> str:
+    """Return the cache key of an artefact built from parts."""
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        digest.update(part.encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _read_file(
+    path: Path, fingerprint: str
+) -> tuple[mmap.mmap, dict[str, dict[str, list[int]]]] | None:
+    """Map a cache file and read its table of contents.
+
+    Returns None if there is no usable file for fingerprint.
+    """
+    try:
+        with open(path, "rb") as file:
+            if os.fstat(file.fileno()).st_size < _HEADER.size:
+                return None
+            data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    except FileNotFoundError:
+        return None
+
+    try:
+        magic, version, length = _HEADER.unpack_from(data)
+        if magic != _MAGIC or version != CACHE_VERSION:
+            raise ValueError("unknown layout")
+        toc = json.loads(data[_HEADER.size : _HEADER.size + length])
+        if toc.get("fingerprint") != fingerprint:
+            data.close()
+            return None
+        sections: dict[str, dict[str, list[int]]] = toc["sections"]
+        # Offsets in the file count from the end of the table of contents
+        base = _HEADER.size + length
+        for entries in sections.values():
+            for position in entries.values():
+                position[0] += base
+        return data, sections
+    except (ValueError, KeyError, struct.error):
+        _LOGGER.warning("Ignoring unreadable z.ai cache file %s", path)
+        data.close()
+        return None
+
+
+def _write_file(
+    path: Path,
+    fingerprint: str,
+    sections: dict[str, dict[str, bytes]],
+) -> tuple[mmap.mmap, dict[str, dict[str, list[int]]]]:
+    """Write a cache file and map it.
+
+    Returns the new mapping and its table of contents.
+    """
+    toc: dict[str, dict[str, list[int]]] = {}
+    offset = 0
+    for section, entries in sections.items():
+        toc[section] = {}
+        for key, blob in entries.items():
+            toc[section][key] = [offset, len(blob)]
+            offset += len(blob)
+    header = json.dumps(
+        {"fingerprint": fingerprint, "sections": toc}, separators=(",", ":")
+    ).encode()
+    # Offsets in the file count from the end of the table of contents;
+    # the returned ones from the start of the file
+    base = _HEADER.size + len(header)
+    for entries in toc.values():
+        for position in entries.values():
+            position[0] += base
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp = path.with_suffix(".tmp")
+    with open(temp, "wb") as file:
+        file.write(_HEADER.pack(_MAGIC, CACHE_VERSION, len(header)))
+        file.write(header)
+        for entries in sections.values():
+            for blob in entries.values():
+                file.write(blob)
+    os.replace(temp, path)
+
+    with open(path, "rb") as file:
+        data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    return data, toc
+
+
+class DiskCache:
+    """Content-keyed artefacts of an entry, kept across restarts."""
+
+    def __init__(self, hass: HomeAssistant, entry_id: str) -> None:
+        """Initialize the cache; nothing is read until async_load."""
+        self.hass = hass
+        self.entry_id = entry_id
+        self._path = (
+            Path(hass.config.path(".storage")) / f"{DOMAIN}.{entry_id}.cache"
+        )
+        self._fingerprint: str | None = None
+        self._data: mmap.mmap | None = None
+        self._toc: dict[str, dict[str, list[int]]] = {}
+        # Entries added or decoded since the file was mapped, per section
+        self._values: dict[str, dict[str, Any]] = {}
+        # Keys per section, least recently used first
+        self._order: dict[str, OrderedDict[str, None]] = {}
+        self._dirty = False
+        self._writer: asyncio.Task[None] | None = None
+        self._closed = False
+        self._hits: dict[str, int] = {}
+        self._misses: dict[str, int] = {}
+        self._saves = 0
+
+    async def async_load(self, fingerprint: str) -> None:
+        """Map the cache file, if it was written for fingerprint.
+
+        Args:
+            fingerprint: Versions the artefacts depend on; a file written
+                with another fingerprint is ignored and replaced.
+        """
+        if self._fingerprint is not None:
+            return
+        self._fingerprint = fingerprint
+        try:
+            mapped = await self.hass.async_add_executor_job(
+                _read_file, self._path, fingerprint
+            )
+        except OSError as err:
+            _LOGGER.warning("Error reading z.ai cache file: %s", err)
+            mapped = None
+        if mapped is not None:
+            self._data, self._toc = mapped
+            # Stored entries are older than any used before the load
+            for section, entries in self._toc.items():
+                order = OrderedDict.fromkeys(entries)
+                for key in self._order.get(section, ()):
+                    order[key] = None
+                    order.move_to_end(key)
+                self._order[section] = order
+        if self._dirty:
+            self._schedule_save()
+
+    @callback
+    def get(self, section: str, key: str) -> Any | None:
+        """Return a cached artefact, or None."""
+        values = self._values.setdefault(section, {})
+        if key in values:
+            value = values[key]
+        elif self._data is not None and (
+            position := self._toc.get(section, {}).get(key)
+        ):
+            offset, length = position
+            try:
+                value = values[key] = json.loads(self._data[offset : offset + length])
+            except ValueError:
+                # Unreadable entry: forget it so it isn't copied on the next save
+                _LOGGER.debug("Dropping unreadable %s cache entry %s", section, key)
+                del self._toc[section][key]
+                self._order.get(section, {}).pop(key, None)
+                self._misses[section] = self._misses.get(section, 0) + 1
+                return None
+        else:
+            self._misses[section] = self._misses.get(section, 0) + 1
+            return None
+        self._hits[section] = self._hits.get(section, 0) + 1
+        self._order.setdefault(section, OrderedDict())[key] = None
+        self._order[section].move_to_end(key)
+        return value
+
+    @callback
+    def put(self, section: str, key: str, value: Any) -> None:
+        """Cache an artefact; it is written to disk shortly after."""
+        self._values.setdefault(section, {})[key] = value
+        order = self._order.setdefault(section, OrderedDict())
+        order[key] = None
+        order.move_to_end(key)
+        self._dirty = True
+        self._schedule_save()
+
+    def _schedule_save(self) -> None:
+        """Start the writer unless it is already waiting."""
+        if self._closed or self._fingerprint is None:
+            return
+        if self._writer is None or self._writer.done():
+            self._writer = self.hass.async_create_background_task(
+                self._async_writer(), f"{DOMAIN} cache writer {self.entry_id}"
+            )
+
+    async def _async_writer(self) -> None:
+        """Write the changes of the next SAVE_DELAY seconds.
+
+        Changes made while a save is being written are saved SAVE_DELAY
+        later by the same task.
+        """
+        while True:
+            await asyncio.sleep(SAVE_DELAY)
+            await self.async_save()
+            if not self._dirty or self._closed:
+                return
+
+    async def async_save(self) -> None:
+        """Write the cache file now if anything changed."""
+        if not self._dirty or self._fingerprint is None:
+            return
+        self._dirty = False
+
+        # Most recently used entries, as bytes; entries that were never
+        # decoded are copied from the current file as they are
+        sections: dict[str, dict[str, bytes]] = {}
+        for section, order in self._order.items():
+            keys = list(order)[-MAX_ENTRIES.get(section, 1) :]
+            values = self._values.get(section, {})
+            stored = self._toc.get(section, {})
+            blobs: dict[str, bytes] = {}
+            for key in keys:
+                if key in values:
+                    try:
+                        blobs[key] = json.dumps(
+                            values[key], separators=(",", ":"), ensure_ascii=False
+                        ).encode()
+                    except (TypeError, ValueError):
+                        _LOGGER.debug("Not caching %s entry %s", section, key)
+                        del order[key]
+                        del values[key]
+                elif self._data is not None and key in stored:
+                    offset, length = stored[key]
+                    blobs[key] = self._data[offset : offset + length]
+            sections[section] = blobs
+            for key in list(order)[: -MAX_ENTRIES.get(section, 1)]:
+                del order[key]
+                values.pop(key, None)
+
+        try:
+            data, toc = await self.hass.async_add_executor_job(
+                _write_file, self._path, self._fingerprint, sections
+            )
+        except OSError as err:
+            _LOGGER.error("Error writing z.ai cache file: %s", err)
+            return
+
+        previous, self._data, self._toc = self._data, data, toc
+        if previous is not None:
+            previous.close()
+        self._saves += 1
+        _LOGGER.debug("Saved z.ai cache for entry %s", self.entry_id)
+
+    @callback
+    def async_shutdown(self) -> None:
+        """Close the cache in the background."""
+        self.hass.async_create_background_task(
+            self.async_close(), f"{DOMAIN} cache close {self.entry_id}"
+        )
+
+    async def async_close(self) -> None:
+        """Write pending changes and unmap the file."""
+        if self._writer is not None and not self._writer.done():
+            self._writer.cancel()
+        await self.async_save()
+        self._closed = True
+        if self._data is not None:
+            self._data.close()
+            self._data = None
+
+    async def async_delete_storage(self) -> None:
+        """Delete the cache file."""
+        self._closed = True
+        self._dirty = False
+        if self._writer is not None:
+            self._writer.cancel()
+        if self._data is not None:
+            self._data.close()
+            self._data = None
+        try:
+            if await self.hass.async_add_executor_job(self._path.exists):
+                await self.hass.async_add_executor_job(self._path.unlink)
+        except OSError as err:
+            _LOGGER.error("Error deleting z.ai cache file: %s", err)
+
+    @property
+    def metrics(self) -> dict[str, Any]:
+        """Return cache statistics for diagnostics."""
+        return {
+            "loaded": self._data is not None,
+            "file_bytes": len(self._data) if self._data is not None else 0,
+            "entries": {section: len(order) for section, order in self._order.items()},
+            "hits": dict(self._hits),
+            "misses": dict(self._misses),
+            "saves": self._saves,
+        }
@@ -10,11 +10,11 @@ from homeassistant.helpers.entity import Entity
 from .const import CONF_CHAT_MODEL, DEFAULT, DOMAIN
 
 if TYPE_CHECKING:
-    import anthropic
-
     from homeassistant.config_entries import ConfigEntry
 
-    type ZaiConfigEntry = ConfigEntry[anthropic.AsyncAnthropic]
+    from .client_pool import ZaiClientPool
+
+    type ZaiConfigEntry = ConfigEntry[ZaiClientPool]
 
 
 class ZaiBaseLLMEntity(Entity):
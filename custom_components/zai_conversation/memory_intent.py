@@ -0,0 +1,358 @@
+"""Memory intent classifier for z.ai Conversation.
+
+Detects utterances that ask the assistant to remember something (notes,
+preferences, facts about the user) in every supported output language. The
+trigger phrases of a language are compiled once into a keyword automaton
+(Aho-Corasick), so an utterance that has nothing to do with memory costs one
+linear pass over its characters. Utterances are classified with the
+classifier of their own language only: a trigger of one language can be an
+everyday word in another ("guarda" is "save" in Spanish but "watch" in
+Italian). Matches are normalised to the core fact, so memory stores "I prefer
+warm lights in the evening" rather than "Remember that I prefer warm lights in
+the evening, please.", and facts can be deduplicated by normalised form.
+"""
+
+from __future__ import annotations
+
+from collections import deque
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass
+import re
+import unicodedata
+from typing import Final
+
+INTENT_NOTE: Final = "note"
+INTENT_PREFERENCE: Final = "preference"
+INTENT_CONTEXT: Final = "context"
+
+# When an utterance matches several kinds, the first one wins
+_INTENT_PRIORITY: Final = (INTENT_NOTE, INTENT_CONTEXT, INTENT_PREFERENCE)
+
+
+@dataclass(frozen=True, slots=True)
+class Trigger:
+    """A trigger phrase for one kind of memory intent.
+
+    Attributes:
+        kind: INTENT_NOTE, INTENT_PREFERENCE or INTENT_CONTEXT.
+        strip: Drop the phrase from the saved fact ("remember that ...");
+            otherwise it carries meaning and is kept ("I prefer ...").
+        context_key: For INTENT_CONTEXT, the context key the value is saved to.
+        prefix: Match at the start of a word ("lieblings" in
+            "Lieblingsfarbe") instead of whole words only.
+    """
+
+    kind: str
+    strip: bool = True
+    context_key: str | None = None
+    prefix: bool = False
+
+
+def _note(*phrases: str) -> dict[str, Trigger]:
+    return dict.fromkeys(phrases, Trigger(INTENT_NOTE))
+
+
+def _pref(
+    *phrases: str, strip: bool = True, prefix: bool = False
+) -> dict[str, Trigger]:
+    return dict.fromkeys(
+        phrases, Trigger(INTENT_PREFERENCE, strip=strip, prefix=prefix)
+    )
+
+
+def _name(*phrases: str) -> dict[str, Trigger]:
+    return dict.fromkeys(phrases, Trigger(INTENT_CONTEXT, context_key="user_name"))
+
+
+# Trigger phrases per language (lowercase)
+LANGUAGE_TRIGGERS: Final[dict[str, dict[str, Trigger]]] = {
+    "en": {
+        **_note(
+            "remind me", "note to self", "note that", "don't forget", "dont forget"
+        ),
+        **_pref("remember", "save that", "keep in mind"),
+        **_pref(
+            "i prefer",
+            "i like",
+            "i love",
+            "i don't like",
+            "i dont like",
+            "i hate",
+            "my favorite",
+            "my favourite",
+            "my preferred",
+            "my ideal",
+            strip=False,
+        ),
+        **_name("my name is"),
+    },
+    "fr": {
+        **_note(
+            "rappelle-moi", "rappelle moi", "n'oublie pas", "note pour moi", "note que"
+        ),
+        **_pref("souviens-toi", "souviens toi", "retiens", "enregistre"),
+        **_pref(
+            "je préfère",
+            "j'aime",
+            "je n'aime pas",
+            "je déteste",
+            "mon préféré",
+            "ma préférée",
+            "mon idéal",
+            "ma température idéale",
+            strip=False,
+        ),
+        **_name("je m'appelle", "mon nom est"),
+    },
+    "it": {
+        **_note(
+            "ricordami",
+            "annotati",
+            "da ricordare",
+            "non dimenticare",
+            "segnati",
+            "segna",
+            "nota che",
+            "annota",
+        ),
+        **_pref("ricordati", "ricorda", "salva"),
+        **_pref(
+            "preferisco",
+            "mi piace",
+            "mi piacciono",
+            "non mi piace",
+            "odio",
+            "il mio preferito",
+            "la mia preferita",
+            "la mia ideale",
+            "il mio ideale",
+            "la mia temperatura ideale",
+            strip=False,
+        ),
+        **_name("mi chiamo", "il mio nome è"),
+    },
+    "de": {
+        **_note("erinnere mich", "vergiss nicht", "notiz für mich", "notiere"),
+        **_pref("merk dir", "merke dir", "speichere"),
+        **_pref(
+            "ich bevorzuge",
+            "ich mag",
+            "ich mag keine",
+            "ich mag kein",
+            "ich hasse",
+            "meine ideale",
+            strip=False,
+        ),
+        **_pref("mein lieblings", "meine lieblings", strip=False, prefix=True),
+        **_name("ich heiße", "ich heisse", "mein name ist", "nenn mich"),
+    },
+    "es": {
+        **_note("recuérdame", "recuerdame", "no olvides", "apunta", "anota"),
+        **_pref("recuerda", "guarda", "ten en cuenta"),
+        **_pref(
+            "prefiero",
+            "me gusta",
+            "me gustan",
+            "no me gusta",
+            "odio",
+            "mi favorito",
+            "mi favorita",
+            "mi ideal",
+            strip=False,
+        ),
+        **_name("me llamo", "mi nombre es"),
+    },
+}
+
+# Filler words left between a stripped trigger and the fact
+_LEADING_FILLERS: Final = re.compile(
+    r"^(?:(?:that|to|of|about|que|de|che|di|dass|an)\b\s*|(?:qu'|d'|,|:)\s*)",
+    re.IGNORECASE,
+)
+_POLITENESS: Final = re.compile(
+    r"\b(?:please|per favore|per piacere|s'il te pla[iî]t|s'il vous pla[iî]t|"
+    r"bitte|por favor)\b",
+    re.IGNORECASE,
+)
+_TRAILING: Final = re.compile(r"[\s,.;:!?]+$")
+_NON_WORD: Final = re.compile(r"[^\w]+")
+
+
+def fold_text(text: str) -> str:
+    """Casefold and strip accents (é -> e, ß -> ss)."""
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def base_language(language: str) -> str:
+    """Return the language of a language tag ("it-IT" -> "it")."""
+    return language.replace("_", "-").partition("-")[0].lower()
+
+
+def normalize_key(text: str) -> str:
+    """Return the deduplication key of a fact or context key.
+
+    "Prefer warm lights!" and "prefer  WARM lights" share a key, and so do
+    the context keys "User Name" and "user_name".
+    """
+    return _NON_WORD.sub("_", fold_text(text)).strip("_")
+
+
+@dataclass(frozen=True, slots=True)
+class MemoryIntent:
+    """A memory intent found in an utterance."""
+
+    kind: str
+    fact: str
+    language: str
+    context_key: str | None = None
+
+
+class KeywordAutomaton:
+    """Aho-Corasick automaton matching many phrases in one pass."""
+
+    def __init__(self) -> None:
+        """Initialize an empty automaton."""
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._out: list[list[tuple[int, object]]] = [[]]
+        self._built = True
+
+    def add(self, phrase: str, payload: object) -> None:
+        """Add a phrase; payload is returned with each of its matches."""
+        node = 0
+        for char in phrase:
+            nxt = self._goto[node].get(char)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][char] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            node = nxt
+        self._out[node].append((len(phrase), payload))
+        self._built = False
+
+    def build(self) -> None:
+        """Compute failure links; call after the last add()."""
+        queue: deque[int] = deque()
+        for child in self._goto[0].values():
+            self._fail[child] = 0
+            queue.append(child)
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(char, 0)
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+        self._built = True
+
+    def find(self, text: str) -> Iterator[tuple[int, int, object]]:
+        """Yield (start, end, payload) for every phrase found in text."""
+        if not self._built:
+            self.build()
+        goto = self._goto
+        fail = self._fail
+        node = 0
+        for index, char in enumerate(text):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            for length, payload in self._out[node]:
+                yield index + 1 - length, index + 1, payload
+
+
+class MemoryIntentClassifier:
+    """Classify utterances into memory intents for the registered languages.
+
+    Register the languages an utterance may be in, usually just one: the
+    triggers of every registered language are matched against it.
+    """
+
+    def __init__(self, languages: Iterable[str] | None = None) -> None:
+        """Initialize and compile the classifier.
+
+        Args:
+            languages: Languages to load from LANGUAGE_TRIGGERS. None = all.
+        """
+        self._automaton = KeywordAutomaton()
+        for language in languages or LANGUAGE_TRIGGERS:
+            self.register_language(language, LANGUAGE_TRIGGERS[language])
+        self._automaton.build()
+
+    def register_language(
+        self, language: str, triggers: dict[str, Trigger]
+    ) -> None:
+        """Add the trigger phrases of a language.
+
+        Phrases are matched on the lowercased utterance. Call this before the
+        first classify(); the automaton is rebuilt lazily otherwise.
+        """
+        for phrase, trigger in triggers.items():
+            self._automaton.add(phrase.lower(), (language, trigger))
+
+    def classify(self, text: str) -> MemoryIntent | None:
+        """Return the memory intent of an utterance, if any."""
+        # Questions ("do you remember my favourite colour?") are not requests
+        # to remember anything
+        if text.rstrip().endswith("?"):
+            return None
+
+        lowered = text.lower()
+        # Match offsets must map back onto text, so keep one char per char
+        if len(lowered) != len(text):
+            lowered = "".join(
+                low if len(low := char.lower()) == 1 else char for char in text
+            )
+
+        best: tuple[int, int, int, str, Trigger] | None = None
+        for start, end, payload in self._automaton.find(lowered):
+            # Whole words only
+            if start > 0 and lowered[start - 1].isalnum():
+                continue
+            language, trigger = payload  # type: ignore[misc]
+            if (
+                not trigger.prefix
+                and end < len(lowered)
+                and lowered[end].isalnum()
+                and lowered[end - 1].isalnum()
+            ):
+                continue
+            rank = _INTENT_PRIORITY.index(trigger.kind)
+            candidate = (rank, start, -(end - start), language, trigger)
+            if best is None or candidate[:3] < best[:3]:
+                best = candidate
+
+        if best is None:
+            return None
+
+        _, start, neg_length, language, trigger = best
+        end = start - neg_length
+        fact = text[end:] if trigger.strip else text[start:]
+        if trigger.kind == INTENT_CONTEXT:
+            fact = re.split(r"[,.;:!?]| and | e | et | und | y ", fact, maxsplit=1)[0]
+        fact = _clean_fact(fact)
+        if not fact:
+            return None
+        return MemoryIntent(
+            kind=trigger.kind,
+            fact=fact,
+            language=language,
+            context_key=trigger.context_key,
+        )
+
+
+def _clean_fact(fact: str) -> str:
+    """Reduce a matched fragment to its core fact."""
+    fact = _POLITENESS.sub("", fact)
+    fact = " ".join(fact.split())
+    while True:
+        stripped = _LEADING_FILLERS.sub("", fact, count=1)
+        if stripped == fact:
+            break
+        fact = stripped
+    fact = _TRAILING.sub("", fact)
+    return fact[:1].upper() + fact[1:]
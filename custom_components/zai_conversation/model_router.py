@@ -0,0 +1,218 @@
+"""Adaptive model routing for z.ai Conversation.
+
+Short device commands don't need the large model. The router scores each
+utterance locally (length, entities and areas mentioned, question versus
+command, multi-step wording, memory references, whether the household
+gives it regularly) and sends simple ones to a fast model. If the fast model
+does not come back with a usable answer the turn is escalated to the large
+model. Per-route latency and escalation stats are kept so the threshold can
+be tuned from diagnostics.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+import logging
+import re
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from anthropic.types import Message
+
+_LOGGER = logging.getLogger(__name__)
+
+ROUTE_FAST = "fast"
+ROUTE_LARGE = "large"
+
+# Weight of the newest sample in the latency moving average
+LATENCY_EWMA_ALPHA = 0.2
+
+# Question words for the supported output languages (en, fr, it, de, es)
+_QUESTION_PATTERN = re.compile(
+    r"\?|^(?:what|how|why|when|where|which|who|is|are|does|do|can|could|"
+    r"quoi|que|comment|pourquoi|quand|où|quel(?:le)?s?|est-ce|"
+    r"cosa|che|come|perch[ée]|quando|dove|quale|quali|chi|quant[oiae]|"
+    r"was|wie|warum|wann|wo|welche[rsnm]?|wer|ist|sind|"
+    r"qu[ée]|c[óo]mo|por qu[ée]|cu[áa]ndo|d[óo]nde|cu[áa]l(?:es)?|qui[ée]n)\b",
+    re.IGNORECASE,
+)
+
+# Wording that usually means several steps or a condition
+_MULTI_STEP_PATTERN = re.compile(
+    r"\b(?:and then|after that|if|unless|until|except|"
+    r"e poi|dopo|se|finch[ée]|tranne|"
+    r"puis|ensuite|si|sauf|jusqu'à|"
+    r"und dann|danach|wenn|falls|au[ßs]er|bis|"
+    r"y luego|despu[ée]s|si|excepto|hasta)\b",
+    re.IGNORECASE,
+)
+
+# Wording that refers to the assistant's memory
+_MEMORY_REFERENCE_PATTERN = re.compile(
+    r"\b(?:remember|recall|my (?:favou?rite|preferred|usual)|prefer|"
+    r"ricord|preferisc|preferit|solit|"
+    r"souviens|rappelle|préf[ée]r|habitude|"
+    r"erinner|bevorzug|lieblings|gewohnt|"
+    r"recuerd|prefier|favorit|habitual)",
+    re.IGNORECASE,
+)
+
+
+@dataclass(slots=True)
+class RouteDecision:
+    """Outcome of classifying one utterance."""
+
+    route: str
+    model: str
+    score: int
+    is_command: bool
+    signals: dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class _RouteStats:
+    """Latency and accuracy statistics for one route."""
+
+    requests: int = 0
+    escalations: int = 0
+    latency_avg: float = 0.0
+
+    def record(self, latency: float, escalated: bool) -> None:
+        """Record one model call on this route."""
+        self.requests += 1
+        if escalated:
+            self.escalations += 1
+        if self.requests == 1:
+            self.latency_avg = latency
+        else:
+            self.latency_avg += LATENCY_EWMA_ALPHA * (latency - self.latency_avg)
+
+
+def score_utterance(
+    text: str, entity_mentions: int, area_mentions: int, habitual: bool = False
+) -> tuple[int, dict[str, Any]]:
+    """Return the complexity score of an utterance and the signals behind it.
+
+    A habitual command (one the agent is given regularly) scores one lower.
+    """
+    words = len(text.split())
+    question = bool(_QUESTION_PATTERN.search(text.strip()))
+    multi_step = bool(_MULTI_STEP_PATTERN.search(text))
+    memory = bool(_MEMORY_REFERENCE_PATTERN.search(text))
+
+    score = 0
+    if words > 12:
+        score += 1
+    if words > 25:
+        score += 1
+    score += max(0, entity_mentions + area_mentions - 1)
+    if question:
+        score += 1
+    if multi_step:
+        score += 2
+    if memory:
+        score += 2
+    if habitual:
+        score = max(0, score - 1)
+
+    return score, {
+        "words": words,
+        "entities": entity_mentions,
+        "areas": area_mentions,
+        "question": question,
+        "multi_step": multi_step,
+        "memory": memory,
+        "habitual": habitual,
+    }
+
+
+def is_valid_response(
+    message: Message, tool_names: set[str], expects_tool: bool
+) -> bool:
+    """Return True if a model response can be used as is.
+
+    A response is unusable when it calls a tool that doesn't exist, passes
+    non-object tool input, is empty, or answers a device command with text
+    only although tools were available.
+    """
+    has_tool = False
+    has_text = False
+    for block in message.content:
+        if block.type == "tool_use":
+            if block.name not in tool_names or not isinstance(block.input, dict):
+                return False
+            has_tool = True
+        elif block.type == "text" and block.text.strip():
+            has_text = True
+
+    if expects_tool:
+        return has_tool
+    return has_tool or has_text
+
+
+class ModelRouter:
+    """Pick the fast or the large model for each utterance."""
+
+    def __init__(self) -> None:
+        """Initialize the router."""
+        self._stats: dict[str, _RouteStats] = {
+            ROUTE_FAST: _RouteStats(),
+            ROUTE_LARGE: _RouteStats(),
+        }
+
+    def route(
+        self,
+        text: str,
+        *,
+        fast_model: str,
+        large_model: str,
+        threshold: int,
+        entity_mentions: int = 0,
+        area_mentions: int = 0,
+        habitual: bool = False,
+    ) -> RouteDecision:
+        """Classify an utterance and choose its model.
+
+        Args:
+            text: The user's utterance.
+            fast_model: Model used for simple requests.
+            large_model: Model used for complex requests and escalation.
+            threshold: Highest complexity score still sent to the fast model.
+            entity_mentions: Distinct entities the utterance mentions.
+            area_mentions: Distinct areas the utterance mentions.
+            habitual: Whether the agent is given this command regularly.
+        """
+        score, signals = score_utterance(
+            text, entity_mentions, area_mentions, habitual
+        )
+        route = ROUTE_FAST if score <= threshold else ROUTE_LARGE
+        decision = RouteDecision(
+            route=route,
+            model=fast_model if route == ROUTE_FAST else large_model,
+            score=score,
+            is_command=not signals["question"],
+            signals=signals,
+        )
+        _LOGGER.debug("Routing to %s (score %d): %s", decision.model, score, signals)
+        return decision
+
+    def record(self, route: str, latency: float, escalated: bool = False) -> None:
+        """Record a model call for the route statistics."""
+        self._stats.setdefault(route, _RouteStats()).record(latency, escalated)
+
+    @property
+    def metrics(self) -> dict[str, Any]:
+        """Return per-route latency and accuracy statistics."""
+        return {
+            route: {
+                "requests": stats.requests,
+                "escalations": stats.escalations,
+                "accuracy": (
+                    round(1 - stats.escalations / stats.requests, 3)
+                    if stats.requests
+                    else None
+                ),
+                "latency_avg": round(stats.latency_avg, 3),
+            }
+            for route, stats in self._stats.items()
+        }
@@ -0,0 +1,461 @@
+"""Entity and area name resolution hints for z.ai Conversation.
+
+The model often passes HA's intent tools a name that is close to, but not
+exactly, the entity's name ("luce cucina" for "Luce della Cucina"), the
+intent fails and the model has to try again. The resolver keeps an index of
+friendly names, entity registry aliases and area names and aliases, folded
+(lowercase, no accents) and tokenised without articles, prepositions and
+command verbs of the supported languages. The words of an utterance are
+matched against it, exactly or fuzzily, and entities and areas whose names
+are covered are passed to the model as exact names next to the utterance.
+
+The index is rebuilt lazily after a registry update or a change of a
+friendly name. The hints of recent utterances are kept by their words until
+the next rebuild, so a command given again (or prefetched for a routine, see
+routines.py) is not matched again. The words of every name are kept in the
+disk cache, so the first build after a restart only tokenises names that are
+new.
+
+To show whether hints help, the resolver also counts model iterations and
+failed tool calls per turn, with and without hints.
+"""
+
+from __future__ import annotations
+
+from collections import OrderedDict, defaultdict
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass
+import difflib
+import math
+import re
+from typing import Any, Final
+
+from homeassistant.const import EVENT_STATE_CHANGED, EntityCategory
+from homeassistant.core import CALLBACK_TYPE, Event, HomeAssistant, callback
+from homeassistant.helpers import area_registry as ar
+from homeassistant.helpers import device_registry as dr
+from homeassistant.helpers import entity_registry as er
+
+from .device_manager import EXCLUDED_ENTITY_CATEGORIES, SKIP_DOMAINS
+from .disk_cache import SECTION_NAMES, DiskCache
+from .memory_intent import fold_text
+from .prompt_templates import NAME_HINTS_HEADER
+
+KIND_ENTITY: Final = "entity"
+KIND_AREA: Final = "area"
+
+# Most hints added to one utterance
+MAX_HINTS: Final = 5
+
+# Share of a name's (IDF weighted) words the utterance must contain
+MIN_COVERAGE: Final = 0.7
+
+# Words shorter than this are only matched exactly
+MIN_FUZZY_LENGTH: Final = 4
+FUZZY_CUTOFF: Final = 0.8
+
+# Disk cache entry with the words of every name
+NAMES_CACHE_KEY: Final = "words"
+
+# Lookups whose hints are kept until the index is rebuilt
+MAX_RESOLVED: Final = 128
+
+# Most names counted by count_mentions
+MAX_MENTIONS: Final = 20
+
+# Words that don't identify anything, per language (folded)
+STOPWORDS: Final[dict[str, frozenset[str]]] = {
+    "en": frozenset(
+        "the a an to of in on off at my and is are what whats how please turn "
+        "switch set all up down it s".split()
+    ),
+    "fr": frozenset(
+        "le la les l un une de du des d au aux dans et est quel quelle allume "
+        "eteins mets s il te plait moi".split()
+    ),
+    "it": frozenset(
+        "il lo la i gli le l un una di del dello della dei degli delle nel "
+        "nello nella nei negli nelle in a al allo alla ai agli alle e che "
+        "accendi spegni metti per favore quanto quanti".split()
+    ),
+    "de": frozenset(
+        "der die das den dem des ein eine einen im in am an auf aus zu und ist "
+        "wie schalte mach mache bitte".split()
+    ),
+    "es": frozenset(
+        "el la los las un una de del en al y es que enciende apaga pon por "
+        "favor".split()
+    ),
+}
+
+# Names and utterances are folded with the words of every language, so a
+# name matches whatever language it is asked for in
+_ALL_STOPWORDS: Final = frozenset().union(*STOPWORDS.values())
+
+_WORD: Final = re.compile(r"\w+")
+
+# Registry updates that can change a name in the index
+_REGISTRY_EVENTS = (
+    ar.EVENT_AREA_REGISTRY_UPDATED,
+    dr.EVENT_DEVICE_REGISTRY_UPDATED,
+    er.EVENT_ENTITY_REGISTRY_UPDATED,
+)
+
+
+def tokenize(text: str) -> list[str]:
+    """Return the folded words of text that can identify a name."""
+    return [
+        word for word in _WORD.findall(fold_text(text)) if word not in _ALL_STOPWORDS
+    ]
+
+
+@dataclass(frozen=True, slots=True)
+class NameEntry:
+    """One name (or alias) of an entity or area in the index."""
+
+    name: str
+    kind: str
+    target_id: str
+    area: str | None
+    area_id: str | None
+    words: tuple[str, ...]
+
+
+@dataclass(frozen=True, slots=True)
+class NameHint:
+    """An entity or area the utterance most likely refers to."""
+
+    entry: NameEntry
+    coverage: float
+
+
+def format_name_hints(hints: Iterable[NameHint]) -> str:
+    """Render hints as a note for the model."""
+    lines = [NAME_HINTS_HEADER]
+    for hint in hints:
+        entry = hint.entry
+        if entry.kind == KIND_AREA:
+            lines.append(f'- area: "{entry.name}"')
+        elif entry.area:
+            lines.append(f'- name: "{entry.name}" ({entry.target_id}, {entry.area})')
+        else:
+            lines.append(f'- name: "{entry.name}" ({entry.target_id})')
+    return "\n".join(lines)
+
+
+class NameResolver:
+    """Resolve the entity and area names mentioned in an utterance."""
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        excluded_categories: frozenset[EntityCategory] = EXCLUDED_ENTITY_CATEGORIES,
+        disk_cache: DiskCache | None = None,
+    ) -> None:
+        """Initialize the resolver.
+
+        Args:
+            hass: Home Assistant instance.
+            excluded_categories: Entity categories left out, as in the
+                device context.
+            disk_cache: Keeps the words of every name across restarts.
+        """
+        self.hass = hass
+        self._excluded_categories = excluded_categories
+        self._disk_cache = disk_cache
+        self._tracking = False
+        self._stale = True
+        self._entries: list[NameEntry] = []
+        # Word -> indexes of the entries that contain it
+        self._postings: dict[str, list[int]] = {}
+        # First two letters -> words, for fuzzy matching
+        self._by_prefix: dict[str, list[str]] = {}
+        self._weights: dict[str, float] = {}
+        self._entry_weights: list[float] = []
+        # Area ID -> words of the area's name
+        self._area_words: dict[str, tuple[str, ...]] = {}
+        self._builds = 0
+        # Hints by the words, area filter and limit they were looked up with
+        self._resolved: OrderedDict[
+            tuple[frozenset[str], tuple[str, ...], int], list[NameHint]
+        ] = OrderedDict()
+        self._resolved_hits = 0
+        # Turn outcomes, keyed by whether hints were given
+        self._turns: dict[bool, dict[str, int]] = {
+            hinted: dict.fromkeys(
+                ("turns", "iterations", "tool_calls", "failed_tool_calls"), 0
+            )
+            for hinted in (True, False)
+        }
+
+    @callback
+    def async_start(self) -> CALLBACK_TYPE:
+        """Start rebuilding the index when names change.
+
+        Returns a callback that stops it. Until started the index is rebuilt
+        for every utterance.
+        """
+        unsubs: list[Callable[[], None]] = [
+            self.hass.bus.async_listen(event_type, self._async_invalidate)
+            for event_type in _REGISTRY_EVENTS
+        ]
+        unsubs.append(
+            self.hass.bus.async_listen(EVENT_STATE_CHANGED, self._async_state_changed)
+        )
+        self._tracking = True
+
+        @callback
+        def _async_stop() -> None:
+            self._tracking = False
+            for unsub in unsubs:
+                unsub()
+
+        return _async_stop
+
+    @callback
+    def _async_invalidate(self, _event: Event) -> None:
+        """Rebuild the index before the next lookup."""
+        self._stale = True
+
+    @callback
+    def _async_state_changed(self, event: Event) -> None:
+        """Invalidate the index if an entity appeared, left or was renamed."""
+        old = event.data["old_state"]
+        new = event.data["new_state"]
+        if old is None or new is None or old.name != new.name:
+            self._stale = True
+
+    def _build(self) -> None:
+        """Index the names of all entities and areas."""
+        area_reg = ar.async_get(self.hass)
+        device_reg = dr.async_get(self.hass)
+        entity_reg = er.async_get(self.hass)
+
+        # Words of the names seen before, possibly in an earlier run
+        known: dict[str, list[str]] = {}
+        if self._disk_cache is not None:
+            known = self._disk_cache.get(SECTION_NAMES, NAMES_CACHE_KEY) or {}
+        words_by_name: dict[str, tuple[str, ...]] = {}
+
+        def _words(name: str) -> tuple[str, ...]:
+            if (words := words_by_name.get(name)) is None:
+                cached = known.get(name)
+                words = words_by_name[name] = (
+                    tuple(cached) if cached is not None else tuple(tokenize(name))
+                )
+            return words
+
+        entries: list[NameEntry] = []
+        area_names: dict[str, str] = {}
+        area_words: dict[str, tuple[str, ...]] = {}
+        for area in area_reg.async_list_areas():
+            area_names[area.id] = area.name
+            area_words[area.id] = _words(area.name)
+            for name in (area.name, *area.aliases):
+                if words := _words(name):
+                    entries.append(
+                        NameEntry(area.name, KIND_AREA, area.id, None, area.id, words)
+                    )
+
+        for state in self.hass.states.async_all():
+            if state.domain in SKIP_DOMAINS:
+                continue
+            names = [state.name]
+            area_id = None
+            if registry_entry := entity_reg.async_get(state.entity_id):
+                if registry_entry.entity_category in self._excluded_categories:
+                    continue
+                names.extend(registry_entry.aliases)
+                # Most entities are in the area of their device
+                area_id = registry_entry.area_id
+                if not area_id and registry_entry.device_id:
+                    device = device_reg.async_get(registry_entry.device_id)
+                    if device:
+                        area_id = device.area_id
+            for name in names:
+                if words := _words(name):
+                    entries.append(
+                        NameEntry(
+                            state.name,
+                            KIND_ENTITY,
+                            state.entity_id,
+                            area_names.get(area_id) if area_id else None,
+                            area_id,
+                            words,
+                        )
+                    )
+
+        postings: dict[str, list[int]] = defaultdict(list)
+        for index, entry in enumerate(entries):
+            for word in set(entry.words):
+                postings[word].append(index)
+
+        # Rare words say more about which name is meant
+        count = len(entries) or 1
+        weights = {
+            word: math.log(1 + count / len(indexes))
+            for word, indexes in postings.items()
+        }
+        by_prefix: dict[str, list[str]] = defaultdict(list)
+        for word in postings:
+            if len(word) >= MIN_FUZZY_LENGTH:
+                by_prefix[word[:2]].append(word)
+
+        self._entries = entries
+        self._postings = dict(postings)
+        self._weights = weights
+        self._by_prefix = dict(by_prefix)
+        self._area_words = area_words
+        self._entry_weights = [
+            sum(weights[word] for word in set(entry.words)) for entry in entries
+        ]
+        self._stale = not self._tracking
+        self._builds += 1
+        self._resolved.clear()
+
+        # Names that were added or removed since the cached words
+        if self._disk_cache is not None and words_by_name.keys() != known.keys():
+            self._disk_cache.put(
+                SECTION_NAMES,
+                NAMES_CACHE_KEY,
+                {name: list(words) for name, words in words_by_name.items()},
+            )
+
+    def _match_words(self, words: Iterable[str]) -> dict[str, float]:
+        """Return the indexed words among words, with their similarity."""
+        matched: dict[str, float] = {}
+        for word in words:
+            if word in self._postings:
+                matched[word] = 1.0
+                continue
+            if len(word) < MIN_FUZZY_LENGTH:
+                continue
+            for candidate in difflib.get_close_matches(
+                word, self._by_prefix.get(word[:2], ()), n=3, cutoff=FUZZY_CUTOFF
+            ):
+                ratio = difflib.SequenceMatcher(None, word, candidate).ratio()
+                matched[candidate] = max(matched.get(candidate, 0.0), ratio)
+        return matched
+
+    def _covered(self, matched: dict[str, float]) -> list[tuple[int, float]]:
+        """Return the entries whose names the matched words cover enough."""
+        scores: dict[int, float] = defaultdict(float)
+        for word, similarity in matched.items():
+            weight = self._weights[word] * similarity
+            for index in self._postings[word]:
+                scores[index] += weight
+        return [
+            (index, coverage)
+            for index, score in scores.items()
+            if (coverage := score / self._entry_weights[index]) >= MIN_COVERAGE
+        ]
+
+    def resolve(
+        self,
+        text: str,
+        area_filter: list[str] | None = None,
+        limit: int = MAX_HINTS,
+    ) -> list[NameHint]:
+        """Return the entities and areas text most likely refers to.
+
+        Args:
+            text: User utterance.
+            area_filter: Only hint entities in these areas (IDs). None = all.
+            limit: Most hints to return.
+        """
+        if self._stale:
+            self._build()
+
+        words = frozenset(tokenize(text))
+        key = (words, tuple(area_filter or ()), limit)
+        if (hints := self._resolved.get(key)) is not None:
+            self._resolved.move_to_end(key)
+            self._resolved_hits += 1
+            return list(hints)
+
+        hints = self._resolve(words, area_filter, limit)
+        # Only valid while the index is kept up to date
+        if self._tracking:
+            self._resolved[key] = hints
+            if len(self._resolved) > MAX_RESOLVED:
+                self._resolved.popitem(last=False)
+        return list(hints)
+
+    def count_mentions(self, text: str) -> tuple[int, int]:
+        """Return how many distinct entities and areas text mentions."""
+        hints = self.resolve(text, limit=MAX_MENTIONS)
+        areas = sum(1 for hint in hints if hint.entry.kind == KIND_AREA)
+        return len(hints) - areas, areas
+
+    def _resolve(
+        self, words: frozenset[str], area_filter: list[str] | None, limit: int
+    ) -> list[NameHint]:
+        """Match words against the index (see resolve)."""
+        matched = self._match_words(words)
+        covered = self._covered(matched)
+
+        # An area named by an alias ("salotto") also stands for the words of
+        # its name in entity names ("Lampada Soggiorno")
+        extra: dict[str, float] = {}
+        for index, coverage in covered:
+            entry = self._entries[index]
+            if entry.kind == KIND_AREA:
+                for word in self._area_words.get(entry.target_id, ()):
+                    if word not in matched and word in self._postings:
+                        extra[word] = max(extra.get(word, 0.0), coverage)
+        if extra:
+            covered = self._covered({**matched, **extra})
+
+        best: dict[tuple[str, str], NameHint] = {}
+        for index, coverage in covered:
+            entry = self._entries[index]
+            if (
+                area_filter
+                and entry.kind == KIND_ENTITY
+                and entry.area_id not in area_filter
+            ):
+                continue
+            key = (entry.kind, entry.target_id)
+            if key not in best or coverage > best[key].coverage:
+                best[key] = NameHint(entry, round(coverage, 3))
+
+        # Full matches first, then the more specific (longer) names
+        return sorted(
+            best.values(),
+            key=lambda hint: (-hint.coverage, -len(hint.entry.words), hint.entry.name),
+        )[:limit]
+
+    def record_turn(
+        self, hinted: bool, iterations: int, tool_calls: int, failed_tool_calls: int
+    ) -> None:
+        """Count the outcome of a turn, with or without hints."""
+        stats = self._turns[hinted]
+        stats["turns"] += 1
+        stats["iterations"] += iterations
+        stats["tool_calls"] += tool_calls
+        stats["failed_tool_calls"] += failed_tool_calls
+
+    @property
+    def metrics(self) -> dict[str, Any]:
+        """Return index size and turn outcomes with and without hints."""
+        outcomes: dict[str, Any] = {}
+        for hinted, stats in self._turns.items():
+            turns = stats["turns"]
+            outcomes["with_hints" if hinted else "without_hints"] = {
+                **stats,
+                "iterations_per_turn": (
+                    round(stats["iterations"] / turns, 3) if turns else None
+                ),
+                "failed_tool_call_rate": (
+                    round(stats["failed_tool_calls"] / stats["tool_calls"], 3)
+                    if stats["tool_calls"]
+                    else None
+                ),
+            }
+        return {
+            "names": len(self._entries),
+            "words": len(self._postings),
+            "builds": self._builds,
+            "resolved_hits": self._resolved_hits,
+            **outcomes,
+        }
@@ -44,7 +44,9 @@ IMPORTANTE: Quando l'utente chiede di controllare un dispositivo, DEVI usare i t
 ### Regole Fondamentali
 
 - Quando l'utente usa termini generici come "luci", "tutto", considera il contesto dell'area
+- Se al messaggio dell'utente segue l'elenco "Nomi esatti", usa quei nomi così come sono nei parametri `name` e `area`
 - Se non sei sicuro del nome esatto del dispositivo, usa il parametro `area` invece di `name`
+- Se per un'area il contesto riporta solo i nomi o il numero dei dispositivi, usa `GetLiveContext` quando ti serve il loro stato
 - Dopo aver eseguito un'azione, conferma brevemente cosa hai fatto
 - Se un dispositivo non è disponibile, informane l'utente
 - Puoi eseguire più azioni in sequenza se richiesto
@@ -65,6 +67,17 @@ Quando l'utente esprime una preferenza o chiede di ricordare qualcosa:
 Se l'utente chiede "cosa ricordi di me?" o "quali sono le mie preferenze?", elenca tutto ciò che trovi nella sezione Memoria e Preferenze.
 """
 
+# Heading of the name hints added after the user's message
+NAME_HINTS_HEADER: Final = (
+    "Nomi esatti dei dispositivi e delle aree citati nella richiesta "
+    "(usali così come sono nei parametri `name` e `area`):"
+)
+
+# Devices and memory, after the prefix of the prompt since they change often
+CONTEXT_TEMPLATE: Final = """## Dispositivi Disponibili
+{devices}
+{memory}"""
+
 # Personality-specific templates
 PERSONALITY_TEMPLATES: Final[dict[str, str]] = {
     PERSONALITY_FORMAL: """Sei un assistente domotico professionale e preciso per Home Assistant.
@@ -81,11 +94,6 @@ Utente: "Accendi le luci"
 Tu: "Ho acceso le luci della stanza. Posso fare altro per Lei?"
 
 {base_instructions}
-
-## Dispositivi Disponibili
-{devices}
-
-{memory}
 """,
     PERSONALITY_FRIENDLY: """Sei un assistente domotico amichevole e disponibile per Home Assistant! 🏠
 
@@ -101,11 +109,6 @@ Utente: "Accendi le luci"
 Tu: "Fatto! ✨ Ho acceso le luci per te. Serve altro?"
 
 {base_instructions}
-
-## Dispositivi Disponibili
-{devices}
-
-{memory}
 """,
     PERSONALITY_CONCISE: """Sei un assistente domotico efficiente per Home Assistant.
 
@@ -120,47 +123,30 @@ Utente: "Accendi le luci"
 Tu: "Luci accese."
 
 {base_instructions}
-
-## Dispositivi Disponibili
-{devices}
-
-{memory}
 """,
 }
 
 
-def build_system_prompt(
+def build_prompt_prefix(
     personality: str,
-    devices_context: str,
-    memory_context: str = "",
     extra_instructions: str = "",
     output_language: str = "en",
 ) -> str:
-    """Build the complete system prompt.
+    """Build the part of the system prompt that only depends on the options.
 
     Args:
         personality: One of 'formal', 'friendly', 'concise'.
-        devices_context: Device list from DeviceContextBuilder.
-        memory_context: Memory context from AssistantMemory.
         extra_instructions: Additional instructions to append.
         output_language: Language code for output (en, fr, it, de, es).
 
     Returns:
-        Complete system prompt string.
+        The language instruction, personality, base instructions and extra
+        instructions.
     """
     template = PERSONALITY_TEMPLATES.get(personality, PERSONALITY_TEMPLATES[PERSONALITY_FRIENDLY])
 
-    # Format memory section
-    memory_section = ""
-    if memory_context:
-        memory_section = f"\n## Memoria e Preferenze\n{memory_context}"
-
     # Build prompt
-    prompt = template.format(
-        base_instructions=BASE_INSTRUCTIONS,
-        devices=devices_context if devices_context else "(Nessun dispositivo esposto)",
-        memory=memory_section,
-    )
+    prompt = template.format(base_instructions=BASE_INSTRUCTIONS)
 
     # Add language instruction
     language_instructions = {
@@ -181,6 +167,47 @@ def build_system_prompt(
     return prompt
 
 
+def build_context_section(devices_context: str, memory_context: str = "") -> str:
+    """Build the devices and memory part of the system prompt.
+
+    Args:
+        devices_context: Device list from DeviceContextBuilder.
+        memory_context: Memory context from AssistantMemory.
+    """
+    # Format memory section
+    memory_section = ""
+    if memory_context:
+        memory_section = f"\n## Memoria e Preferenze\n{memory_context}"
+
+    return CONTEXT_TEMPLATE.format(
+        devices=devices_context if devices_context else "(Nessun dispositivo esposto)",
+        memory=memory_section,
+    )
+
+
+def build_system_prompt(
+    personality: str,
+    devices_context: str,
+    memory_context: str = "",
+    extra_instructions: str = "",
+    output_language: str = "en",
+) -> str:
+    """Build the complete system prompt.
+
+    Args:
+        personality: One of 'formal', 'friendly', 'concise'.
+        devices_context: Device list from DeviceContextBuilder.
+        memory_context: Memory context from AssistantMemory.
+        extra_instructions: Additional instructions to append.
+        output_language: Language code for output (en, fr, it, de, es).
+
+    Returns:
+        Complete system prompt string.
+    """
+    prefix = build_prompt_prefix(personality, extra_instructions, output_language)
+    return f"{prefix}\n\n{build_context_section(devices_context, memory_context)}"
+
+
 # Tool calling examples for reference (can be included in prompt if needed)
 TOOL_EXAMPLES: Final = """
 ## Esempi di Tool Calling
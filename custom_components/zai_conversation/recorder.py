@@ -0,0 +1,198 @@
+"""Request recording for z.ai Conversation.
+
+With a recording file configured, every messages.create request the client
+pool sends is written together with its response (the message, or every
+streamed event) and its timing, one JSON document per line in a
+gzip-compressed file in the config directory. API keys are redacted
+wherever they appear. Each record carries a hash of the request, so
+scripts/replay.py can serve the recorded responses from a local stand-in
+and the pipeline can be benchmarked and diffed offline against another
+version of the integration. The hash leaves out the current time and date
+Home Assistant puts in its prompt, so the same conversation hashes the same
+whenever it runs.
+
+Recording encodes every request once more on the event loop; leave it off
+outside of test runs.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Iterable, Mapping
+import gzip
+import hashlib
+import json
+import logging
+from pathlib import Path
+import re
+import time
+from typing import Any, Final
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.util import dt as dt_util
+
+from .const import DOMAIN
+
+_LOGGER = logging.getLogger(__name__)
+
+REDACTED: Final = "**REDACTED**"
+
+# Bumped when the record layout changes
+RECORD_VERSION: Final = 1
+
+# Records written together
+FLUSH_DELAY: Final = 1.0
+
+# Parts of Home Assistant's prompt that change with the clock, and what they
+# are replaced with before hashing
+_VOLATILE: Final = (
+    (re.compile(r"(Current time is )\d{1,2}:\d{2}(?::\d{2})?"), r"\1<time>"),
+    (re.compile(r"(Today's date is )\d{4}-\d{2}-\d{2}"), r"\1<date>"),
+)
+
+
+def encode_request(value: Any) -> str:
+    """Encode a request the same way for recording and replay."""
+    return json.dumps(
+        value, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str
+    )
+
+
+def request_key(request: Mapping[str, Any]) -> str:
+    """Return the hash a request is recorded and replayed under.
+
+    Whether the response was streamed is not part of the key, and neither are
+    the current time and date in the system prompt (see _VOLATILE).
+    """
+    payload = {key: value for key, value in request.items() if key != "stream"}
+    encoded = encode_request(payload)
+    for pattern, replacement in _VOLATILE:
+        encoded = pattern.sub(replacement, encoded)
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+def redact(value: Any, secrets: Iterable[str]) -> Any:
+    """Return value with every occurrence of a secret replaced."""
+    secrets = [secret for secret in secrets if secret]
+    if not secrets:
+        return value
+
+    def _redact(item: Any) -> Any:
+        if isinstance(item, str):
+            for secret in secrets:
+                item = item.replace(secret, REDACTED)
+            return item
+        if isinstance(item, Mapping):
+            return {key: _redact(child) for key, child in item.items()}
+        if isinstance(item, (list, tuple)):
+            return [_redact(child) for child in item]
+        return item
+
+    return _redact(value)
+
+
+class RequestRecorder:
+    """Append the requests of a client pool and their responses to a file."""
+
+    def __init__(self, hass: HomeAssistant, path: Path, secrets: Iterable[str]) -> None:
+        """Initialize the recorder.
+
+        Args:
+            hass: Home Assistant instance.
+            path: Recording file; records are appended to it.
+            secrets: API keys to redact.
+        """
+        self.hass = hass
+        self.path = path
+        self._secrets = list(secrets)
+        self._pending: list[str] = []
+        self._writer: asyncio.Task[None] | None = None
+        self._recorded = 0
+        self._failures = 0
+
+    def snapshot(self, model_args: Mapping[str, Any]) -> dict[str, Any]:
+        """Return a redacted copy of a request, taken before it is sent.
+
+        The caller keeps changing the messages of a turn, so the request is
+        copied when it is sent rather than when its response is recorded.
+        """
+        return redact(json.loads(encode_request(model_args)), self._secrets)
+
+    @callback
+    def record(
+        self,
+        request: dict[str, Any],
+        start: float,
+        *,
+        response: dict[str, Any] | None = None,
+        events: list[dict[str, Any]] | None = None,
+        first_event: float | None = None,
+        error: str | None = None,
+    ) -> None:
+        """Record a request and what came back.
+
+        Args:
+            request: Request from snapshot().
+            start: time.monotonic() when the request was sent.
+            response: The message of a whole response.
+            events: The events of a streamed response.
+            first_event: Seconds until the first streamed event.
+            error: Error the request failed with, if any.
+        """
+        record: dict[str, Any] = {
+            "version": RECORD_VERSION,
+            "key": request_key(request),
+            "time": dt_util.utcnow().isoformat(),
+            "elapsed": round(time.monotonic() - start, 4),
+            "stream": bool(request.get("stream")),
+            "request": request,
+        }
+        if response is not None:
+            record["response"] = redact(response, self._secrets)
+        if events is not None:
+            record["events"] = redact(events, self._secrets)
+            record["first_event"] = (
+                round(first_event, 4) if first_event is not None else None
+            )
+        if error is not None:
+            record["error"] = redact(error, self._secrets)
+        self._pending.append(encode_request(record))
+        if self._writer is None or self._writer.done():
+            self._writer = self.hass.async_create_background_task(
+                self._async_write_later(), f"{DOMAIN} request recorder"
+            )
+
+    async def _async_write_later(self) -> None:
+        """Write the records of the next FLUSH_DELAY seconds together."""
+        await asyncio.sleep(FLUSH_DELAY)
+        await self.async_flush()
+
+    async def async_flush(self) -> None:
+        """Write pending records now."""
+        lines, self._pending = self._pending, []
+        if not lines:
+            return
+        try:
+            await self.hass.async_add_executor_job(_append_lines, self.path, lines)
+        except OSError as err:
+            self._failures += len(lines)
+            _LOGGER.warning("Failed to write z.ai request recording: %s", err)
+            return
+        self._recorded += len(lines)
+
+    @property
+    def metrics(self) -> dict[str, Any]:
+        """Return recording statistics for diagnostics."""
+        return {
+            "file": self.path.name,
+            "recorded": self._recorded,
+            "pending": len(self._pending),
+            "failures": self._failures,
+        }
+
+
+def _append_lines(path: Path, lines: list[str]) -> None:
+    """Append lines to a gzip file as one more gzip member."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with gzip.open(path, "at", encoding="utf-8") as file:
+        file.write("\n".join(lines) + "\n")
@@ -0,0 +1,128 @@
+"""Routine learning for z.ai Conversation.
+
+Households give the same commands at the same times: the coffee machine at
+7, the blinds in the evening, the heating before bed. Every interaction is
+counted under the hour of day it happened in (local time) together with the
+area of the satellite it came from, in one decaying Space-Saving sketch per
+hour (see command_stats.py). A command counted at least ROUTINE_COUNT times
+in the same hour and area, with counts halving every two weeks, is a
+routine.
+
+At PREFETCH_MINUTE of every hour the conversation entity looks up the
+routines of the next hour and prefetches what their turns need: the device
+context of their areas, the name hints of their commands, the memory
+prompt, the tool list and a connection to the API.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Final
+
+from .command_stats import HeavyHitters, command_template
+
+# Counters per hour of the day
+ROUTINE_CAPACITY: Final = 16
+
+# Seconds after which a count is worth half
+ROUTINE_HALF_LIFE: Final = 14 * 86400.0
+
+# Count (at least) of a command in an hour and area to be a routine
+ROUTINE_COUNT: Final = 3.0
+
+# Routines predicted per hour
+MAX_PREDICTIONS: Final = 5
+
+# Minute of every hour the routines of the next hour are prefetched at
+PREFETCH_MINUTE: Final = 55
+
+# Between the area ID and the command template in a counter's key
+_SEPARATOR: Final = "\t"
+
+
+@dataclass(frozen=True, slots=True)
+class Routine:
+    """A command given regularly at one hour of the day."""
+
+    hour: int
+    area_id: str | None
+    command: str
+    count: float
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the routine as stored in the memory file."""
+        return {
+            "hour": self.hour,
+            "area_id": self.area_id,
+            "command": self.command,
+            "count": round(self.count, 2),
+        }
+
+
+class RoutineStats:
+    """Decaying counts of the commands given at each hour of the day."""
+
+    def __init__(self) -> None:
+        """Initialize empty counts."""
+        self.hours: dict[int, HeavyHitters] = {}
+
+    def add(self, command: str, area_id: str | None, hour: int, now: float) -> None:
+        """Count a command given at an hour of the day.
+
+        Args:
+            command: The user's utterance.
+            area_id: Area of the satellite it came from, if any.
+            hour: Local hour of the day it was given at.
+            now: Current time, as a timestamp.
+        """
+        template = command_template(command)
+        if not template:
+            return
+        sketch = self.hours.get(hour)
+        if sketch is None:
+            sketch = self.hours[hour] = HeavyHitters(
+                ROUTINE_HALF_LIFE, now, ROUTINE_CAPACITY
+            )
+        sketch.add(f"{area_id or ''}{_SEPARATOR}{template}", now)
+
+    def predict(
+        self, hour: int, now: float, limit: int = MAX_PREDICTIONS
+    ) -> list[Routine]:
+        """Return the routines of an hour of the day, most frequent first."""
+        sketch = self.hours.get(hour)
+        if sketch is None:
+            return []
+        routines: list[Routine] = []
+        for key, count in sketch.top(sketch.capacity, now):
+            if sketch.count(key, now)[1] < ROUTINE_COUNT:
+                continue
+            area_id, _, command = key.partition(_SEPARATOR)
+            routines.append(Routine(hour, area_id or None, command, count))
+            if len(routines) == limit:
+                break
+        return routines
+
+    def routines(self, now: float) -> list[Routine]:
+        """Return the routines of every hour of the day."""
+        return [
+            routine for hour in sorted(self.hours) for routine in self.predict(hour, now)
+        ]
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the counts as JSON-serialisable data."""
+        return {str(hour): sketch.as_dict() for hour, sketch in self.hours.items()}
+
+    @classmethod
+    def from_dict(cls, data: Any) -> RoutineStats:
+        """Restore counts saved with as_dict; unusable data is dropped."""
+        stats = cls()
+        if not isinstance(data, dict):
+            return stats
+        for hour, saved in data.items():
+            try:
+                stats.hours[int(hour) % 24] = HeavyHitters.from_dict(
+                    ROUTINE_HALF_LIFE, saved, ROUTINE_CAPACITY
+                )
+            except (KeyError, TypeError, ValueError, IndexError):
+                continue
+        return stats
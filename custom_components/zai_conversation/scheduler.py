@@ -0,0 +1,372 @@
+"""Shared request scheduler for z.ai Conversation.
+
+Every conversation agent that talks to the same API key and base URL goes
+through one ``RequestScheduler``. The scheduler bounds the number of requests
+in flight, paces requests and tokens per minute with token buckets (learned
+from the rate limit headers returned by the API) and serves waiting requests
+by priority lane, so interactive voice turns overtake background work. Until
+the API reports a limit, only the number of requests in flight is bounded.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from collections.abc import AsyncIterator, Mapping
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from datetime import datetime
+import hashlib
+import heapq
+import itertools
+import logging
+import time
+from typing import Any
+
+from homeassistant.core import HomeAssistant
+from homeassistant.util import dt as dt_util
+
+from .const import DEFAULT_MAX_IN_FLIGHT, DOMAIN, SCHEDULERS_KEY
+
+_LOGGER = logging.getLogger(__name__)
+
+# Priority lanes - lower value is served first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+
+PRIORITY_NAMES: dict[int, str] = {
+    PRIORITY_INTERACTIVE: "interactive",
+    PRIORITY_BACKGROUND: "background",
+}
+
+# Weight of the newest sample in the wait time moving average
+WAIT_EWMA_ALPHA = 0.2
+
+# Rate limit headers, Anthropic style first, OpenAI style as fallback
+_REQUEST_LIMIT_HEADERS = (
+    "anthropic-ratelimit-requests-limit",
+    "x-ratelimit-limit-requests",
+)
+_REQUEST_REMAINING_HEADERS = (
+    "anthropic-ratelimit-requests-remaining",
+    "x-ratelimit-remaining-requests",
+)
+_TOKEN_LIMIT_HEADERS = (
+    "anthropic-ratelimit-tokens-limit",
+    "x-ratelimit-limit-tokens",
+)
+_TOKEN_REMAINING_HEADERS = (
+    "anthropic-ratelimit-tokens-remaining",
+    "x-ratelimit-remaining-tokens",
+)
+
+
+def _header_number(headers: Mapping[str, str], names: tuple[str, ...]) -> float | None:
+    """Return the first numeric header found in names."""
+    for name in names:
+        value = headers.get(name)
+        if value is None:
+            continue
+        try:
+            return float(value)
+        except ValueError:
+            continue
+    return None
+
+
+def _retry_after_seconds(headers: Mapping[str, str]) -> float | None:
+    """Parse a Retry-After header (seconds or HTTP date)."""
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = datetime.strptime(value, "%a, %d %b %Y %H:%M:%S %Z").replace(
+            tzinfo=dt_util.UTC
+        )
+    except ValueError:
+        return None
+    return max(0.0, (retry_at - dt_util.utcnow()).total_seconds())
+
+
+def estimate_tokens(model_args: Mapping[str, Any]) -> int:
+    """Roughly estimate the tokens a request will consume.
+
+    Uses the common ~4 characters per token heuristic on the prompt plus the
+    requested max_tokens, which is what rate limiters charge up front.
+    """
+    chars = len(str(model_args.get("system", ""))) + len(
+        str(model_args.get("messages", ""))
+    )
+    return chars // 4 + int(model_args.get("max_tokens", 0))
+
+
+class TokenBucket:
+    """Token bucket refilled continuously over one minute.
+
+    A bucket without a capacity never delays anything; it gets one the first
+    time the API reports a limit.
+    """
+
+    def __init__(self, per_minute: float | None = None) -> None:
+        """Initialize a full bucket, unlimited if per_minute is None."""
+        self.capacity = per_minute
+        self._level = per_minute or 0.0
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        """Refill the bucket for the time elapsed since the last update."""
+        now = time.monotonic()
+        if self.capacity is None:
+            self._updated = now
+            return
+        self._level = min(
+            self.capacity, self._level + (now - self._updated) * self.capacity / 60
+        )
+        self._updated = now
+
+    def delay_for(self, amount: float) -> float:
+        """Return seconds until amount can be consumed (0 if available now)."""
+        if self.capacity is None:
+            return 0.0
+        self._refill()
+        # A single request larger than the bucket must still be allowed to run
+        amount = min(amount, self.capacity)
+        if self._level >= amount:
+            return 0.0
+        return (amount - self._level) * 60 / self.capacity
+
+    def consume(self, amount: float) -> None:
+        """Take amount from the bucket."""
+        if self.capacity is None:
+            return
+        self._refill()
+        self._level -= min(amount, self.capacity)
+
+    def learn(self, limit: float | None, remaining: float | None) -> None:
+        """Align the bucket with limits reported by the API."""
+        self._refill()
+        if limit and limit > 0:
+            self._level = limit if self.capacity is None else min(self._level, limit)
+            self.capacity = limit
+        if remaining is not None and self.capacity is not None:
+            self._level = min(self._level, remaining)
+
+    @property
+    def level(self) -> float | None:
+        """Return the current bucket level, None while unlimited."""
+        if self.capacity is None:
+            return None
+        self._refill()
+        return self._level
+
+
+@dataclass(order=True)
+class _Waiter:
+    """A request waiting for a slot."""
+
+    priority: int
+    seq: int
+    tokens: int = field(compare=False)
+    future: asyncio.Future[None] = field(compare=False)
+    enqueued: float = field(compare=False)
+
+
+@dataclass
+class _LaneStats:
+    """Wait time statistics for one priority lane."""
+
+    served: int = 0
+    wait_avg: float = 0.0
+    wait_max: float = 0.0
+
+    def record(self, wait: float) -> None:
+        """Record the wait of a request that just got its slot."""
+        self.served += 1
+        if self.served == 1:
+            self.wait_avg = wait
+        else:
+            self.wait_avg += WAIT_EWMA_ALPHA * (wait - self.wait_avg)
+        self.wait_max = max(self.wait_max, wait)
+
+
+class RequestScheduler:
+    """Fair, rate limited scheduler for one API key and base URL."""
+
+    def __init__(self, max_in_flight: int = DEFAULT_MAX_IN_FLIGHT) -> None:
+        """Initialize the scheduler."""
+        self.max_in_flight = max(1, max_in_flight)
+        self._in_flight = 0
+        self._queue: list[_Waiter] = []
+        self._seq = itertools.count()
+        self._requests = TokenBucket()
+        self._tokens = TokenBucket()
+        self._paused_until = 0.0
+        self._timer: asyncio.TimerHandle | None = None
+        self._lanes: dict[int, _LaneStats] = {
+            priority: _LaneStats() for priority in PRIORITY_NAMES
+        }
+        self._max_queue_depth = 0
+        self._throttled = 0
+        self._rate_limited = 0
+
+    @asynccontextmanager
+    async def async_slot(
+        self, priority: int = PRIORITY_INTERACTIVE, tokens: int = 0
+    ) -> AsyncIterator[None]:
+        """Wait for a slot and hold it for the duration of the block.
+
+        Args:
+            priority: Priority lane, PRIORITY_INTERACTIVE or PRIORITY_BACKGROUND.
+            tokens: Estimated tokens the request will consume.
+        """
+        await self._async_acquire(priority, tokens)
+        try:
+            yield
+        finally:
+            self._in_flight -= 1
+            self._dispatch()
+
+    async def _async_acquire(self, priority: int, tokens: int) -> None:
+        """Queue a request and wait until it is dispatched."""
+        waiter = _Waiter(
+            priority=priority,
+            seq=next(self._seq),
+            tokens=tokens,
+            future=asyncio.get_running_loop().create_future(),
+            enqueued=time.monotonic(),
+        )
+        heapq.heappush(self._queue, waiter)
+        self._max_queue_depth = max(self._max_queue_depth, len(self._queue))
+        self._dispatch()
+
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Slot was granted right before we were cancelled, give it back
+                self._in_flight -= 1
+                self._dispatch()
+            raise
+
+    def _dispatch(self) -> None:
+        """Hand out free slots to waiting requests in priority order."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        while self._queue and self._in_flight < self.max_in_flight:
+            waiter = self._queue[0]
+            if waiter.future.done():
+                # Cancelled while waiting
+                heapq.heappop(self._queue)
+                continue
+
+            delay = max(
+                self._paused_until - time.monotonic(),
+                self._requests.delay_for(1),
+                self._tokens.delay_for(waiter.tokens),
+            )
+            if delay > 0:
+                self._throttled += 1
+                self._timer = asyncio.get_running_loop().call_later(
+                    delay, self._dispatch
+                )
+                return
+
+            heapq.heappop(self._queue)
+            self._requests.consume(1)
+            self._tokens.consume(waiter.tokens)
+            self._in_flight += 1
+            self._lanes.setdefault(waiter.priority, _LaneStats()).record(
+                time.monotonic() - waiter.enqueued
+            )
+            waiter.future.set_result(None)
+
+    def set_max_in_flight(self, max_in_flight: int) -> None:
+        """Change the concurrency limit, releasing waiters if it grew."""
+        self.max_in_flight = max(1, max_in_flight)
+        self._dispatch()
+
+    def update_from_headers(self, headers: Mapping[str, str]) -> None:
+        """Learn request and token limits from API response headers."""
+        self._requests.learn(
+            _header_number(headers, _REQUEST_LIMIT_HEADERS),
+            _header_number(headers, _REQUEST_REMAINING_HEADERS),
+        )
+        self._tokens.learn(
+            _header_number(headers, _TOKEN_LIMIT_HEADERS),
+            _header_number(headers, _TOKEN_REMAINING_HEADERS),
+        )
+
+    def record_rate_limited(self, headers: Mapping[str, str]) -> float:
+        """Pause dispatching after a 429 and return the pause in seconds."""
+        self._rate_limited += 1
+        self.update_from_headers(headers)
+        pause = _retry_after_seconds(headers)
+        if pause is None:
+            pause = self._requests.delay_for(1) or 1.0
+        self._paused_until = max(self._paused_until, time.monotonic() + pause)
+        _LOGGER.warning("z.ai rate limit hit, pausing requests for %.1fs", pause)
+        return pause
+
+    @property
+    def metrics(self) -> dict[str, Any]:
+        """Return queue depth, wait time and rate limit metrics."""
+        depth: dict[str, int] = {name: 0 for name in PRIORITY_NAMES.values()}
+        for waiter in self._queue:
+            if not waiter.future.done():
+                name = PRIORITY_NAMES.get(waiter.priority, str(waiter.priority))
+                depth[name] = depth.get(name, 0) + 1
+
+        return {
+            "max_in_flight": self.max_in_flight,
+            "in_flight": self._in_flight,
+            "queue_depth": depth,
+            "max_queue_depth": self._max_queue_depth,
+            "wait_seconds": {
+                PRIORITY_NAMES.get(priority, str(priority)): {
+                    "served": lane.served,
+                    "average": round(lane.wait_avg, 3),
+                    "max": round(lane.wait_max, 3),
+                }
+                for priority, lane in self._lanes.items()
+            },
+            "requests_per_minute": self._requests.capacity,
+            "tokens_per_minute": self._tokens.capacity,
+            "tokens_available": (
+                round(level) if (level := self._tokens.level) is not None else None
+            ),
+            "throttled": self._throttled,
+            "rate_limited": self._rate_limited,
+        }
+
+
+def scheduler_key(api_key: str, base_url: str) -> str:
+    """Return the registry key for an API key and base URL.
+
+    The API key is hashed so it never appears in diagnostics or logs.
+    """
+    digest = hashlib.sha256(api_key.encode()).hexdigest()[:12]
+    return f"{base_url}#{digest}"
+
+
+def async_get_scheduler(
+    hass: HomeAssistant,
+    api_key: str,
+    base_url: str,
+    max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+) -> RequestScheduler:
+    """Return the shared scheduler for an API key and base URL."""
+    schedulers: dict[str, RequestScheduler] = hass.data.setdefault(
+        DOMAIN, {}
+    ).setdefault(SCHEDULERS_KEY, {})
+    key = scheduler_key(api_key, base_url)
+
+    if (scheduler := schedulers.get(key)) is None:
+        scheduler = schedulers[key] = RequestScheduler(max_in_flight)
+    else:
+        scheduler.set_max_in_flight(max_in_flight)
+    return scheduler
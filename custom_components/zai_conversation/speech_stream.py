@@ -0,0 +1,171 @@
+"""Sentence chunking of streamed responses for z.ai Conversation.
+
+The voice pipeline speaks best in whole sentences, so text deltas from the
+model are regrouped into complete sentences (or, for the very first chunk, a
+long enough clause) before they reach the chat log. Boundaries follow simple
+per-language punctuation rules: abbreviations, decimals and a following
+lowercase word don't end a sentence. For voice turns emoji and Markdown are
+held back, since the friendly personality uses them and TTS would read them
+out.
+"""
+
+from __future__ import annotations
+
+import re
+from typing import Final
+
+# First chunk may end at a clause mark once it is this long
+MIN_FIRST_CLAUSE_CHARS: Final = 24
+
+_SENTENCE_END: Final = frozenset(".!?…\n")
+_CLAUSE_END: Final = frozenset(",;:")
+_CLOSERS: Final = frozenset("\"')]}»”’")
+
+# Words ending in "." that don't end a sentence (lowercase, without the dot)
+ABBREVIATIONS: Final[dict[str, frozenset[str]]] = {
+    "en": frozenset(
+        {"mr", "mrs", "ms", "dr", "st", "vs", "etc", "e.g", "i.e", "approx", "no"}
+    ),
+    "fr": frozenset({"m", "mme", "mlle", "dr", "etc", "env", "p.ex", "av", "bd"}),
+    "it": frozenset(
+        {"sig", "sig.ra", "dott", "ecc", "es", "p.es", "ca", "n", "geom", "ing"}
+    ),
+    "de": frozenset(
+        {"hr", "fr", "dr", "z.b", "usw", "bzw", "ca", "nr", "str", "d.h", "u.a"}
+    ),
+    "es": frozenset({"sr", "sra", "srta", "dr", "etc", "p.ej", "aprox", "núm", "av"}),
+}
+
+_EMOJI: Final = re.compile(
+    "["
+    "\U0001f000-\U0001faff"  # pictographs, emoticons, transport, symbols
+    "\u2600-\u27bf"  # misc symbols and dingbats
+    "\u2b00-\u2bff"  # arrows and stars
+    "\ufe0f\u200d"  # variation selector, zero width joiner
+    "]+"
+)
+_MD_LINK: Final = re.compile(r"\[([^\]]*)\]\([^)]*\)")
+_MD_EMPHASIS: Final = re.compile(r"(\*\*|__|\*|`+|~~)")
+_MD_LINE_PREFIX: Final = re.compile(r"^\s*(?:#{1,6}\s+|>\s+|[-*+]\s+|\d+[.)]\s+)")
+_SPACES: Final = re.compile(r"[ \t]{2,}")
+
+
+def clean_for_speech(text: str) -> str:
+    """Remove emoji and Markdown markup from text meant to be spoken."""
+    text = _EMOJI.sub("", text)
+    text = _MD_LINK.sub(r"\1", text)
+    text = _MD_EMPHASIS.sub("", text)
+    text = "\n".join(_MD_LINE_PREFIX.sub("", line) for line in text.split("\n"))
+    return _SPACES.sub(" ", text)
+
+
+class SentenceChunker:
+    """Regroup streamed text into complete sentences."""
+
+    def __init__(self, language: str = "en", clean: bool = False) -> None:
+        """Initialize the chunker.
+
+        Args:
+            language: Output language, selects the abbreviation list.
+            clean: Strip emoji and Markdown from every chunk.
+        """
+        self._language = language
+        self._abbreviations = ABBREVIATIONS.get(language, ABBREVIATIONS["en"])
+        self._clean = clean
+        self._buffer = ""
+        self._scan = 0
+        self._emitted = False
+        self._ends_with_space = False
+
+    def feed(self, text: str) -> list[str]:
+        """Add streamed text and return the chunks that are now complete."""
+        self._buffer += text
+        chunks: list[str] = []
+        while (end := self._find_boundary()) is not None:
+            chunk = self._buffer[:end]
+            self._buffer = self._buffer[end:]
+            self._scan = 0
+            if chunk := self._finish(chunk):
+                chunks.append(chunk)
+        return chunks
+
+    def flush(self) -> str:
+        """Return whatever text is left at the end of the stream."""
+        chunk = self._finish(self._buffer)
+        self._buffer = ""
+        self._scan = 0
+        return chunk
+
+    def _finish(self, chunk: str) -> str:
+        """Clean up a chunk before it is emitted."""
+        if self._clean:
+            chunk = clean_for_speech(chunk)
+            if self._ends_with_space:
+                # Removed emoji can leave a double space between chunks
+                chunk = chunk.lstrip(" ")
+            if not chunk.strip():
+                return ""
+        self._emitted = True
+        self._ends_with_space = chunk[-1:].isspace()
+        return chunk
+
+    def _find_boundary(self) -> int | None:
+        """Return the end index of the first complete chunk, if any."""
+        buffer = self._buffer
+        length = len(buffer)
+        index = self._scan
+
+        while index < length:
+            char = buffer[index]
+            if char in _SENTENCE_END or (
+                not self._emitted
+                and char in _CLAUSE_END
+                and index >= MIN_FIRST_CLAUSE_CHARS
+            ):
+                end = index + 1
+                # Swallow repeated punctuation and closing quotes/brackets
+                while end < length and (
+                    buffer[end] in _SENTENCE_END or buffer[end] in _CLOSERS
+                ):
+                    end += 1
+                if char == "\n":
+                    return end
+
+                # Need to see what follows before deciding
+                nxt = end
+                while nxt < length and buffer[nxt] in " \t":
+                    nxt += 1
+                if nxt >= length:
+                    self._scan = index
+                    return None
+                if nxt > end and self._is_boundary(index, buffer[nxt]):
+                    return nxt
+                index = end
+                continue
+            index += 1
+
+        self._scan = index
+        return None
+
+    def _is_boundary(self, index: int, following: str) -> bool:
+        """Return True if the punctuation at index ends a chunk."""
+        char = self._buffer[index]
+        if char in _CLAUSE_END:
+            return True
+        # A sentence doesn't continue in lowercase ("ecc. e poi")
+        if following.islower():
+            return False
+        if char != ".":
+            return True
+
+        word_start = index
+        while word_start > 0 and not self._buffer[word_start - 1].isspace():
+            word_start -= 1
+        word = self._buffer[word_start:index].lower().lstrip("(\"'«")
+        if word in self._abbreviations:
+            return False
+        # German ordinals ("am 3. Mai")
+        if self._language == "de" and word.isdigit():
+            return False
+        # Initials ("J. Smith")
+        return not (len(word) == 1 and word.isalpha())
@@ -0,0 +1,201 @@
+"""Warm standby of an entry's caches across reloads for z.ai Conversation.
+
+Changing an option reloads the config entry. Without standby the reload
+throws away the loaded memory, the device context builder (renders,
+baselines, registry view, render cost), the name index, the client pool with
+its open connections, and the entity's formatted tool schemas and built
+system prompt prefixes, so the next utterance pays for all of them again.
+
+On unload these are parked in a domain-level registry, with the device and
+name listeners still running so they stay current. The setup that follows
+adopts them, dropping only what the changed options invalidate: the client
+pool when the endpoints or limits changed, the prompt cache when the
+personality, language or instructions changed, the tool schemas when the LLM
+API changed, and the rendered contexts when the area filter changed. Parked
+caches that aren't adopted within STANDBY_SECONDS are released.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Mapping
+from dataclasses import dataclass, field
+import logging
+from typing import TYPE_CHECKING, Any, Final
+
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+from homeassistant.helpers.event import async_call_later
+
+from .assistant_memory import AssistantMemory
+from .const import (
+    CONF_AREA_FILTER,
+    CONF_EXTRA_ENDPOINTS,
+    CONF_LLM_HASS_API,
+    CONF_LOAD_BALANCING,
+    CONF_MAX_IN_FLIGHT,
+    CONF_OUTPUT_LANGUAGE,
+    CONF_PERSONALITY,
+    CONF_PROMPT,
+    CONF_USE_CUSTOM_PROMPT,
+    DOMAIN,
+    STANDBY_KEY,
+)
+from .device_manager import DeviceContextBuilder
+from .disk_cache import DiskCache
+from .model_router import ModelRouter
+from .name_resolver import NameResolver
+
+if TYPE_CHECKING:
+    from .client_pool import ZaiClientPool
+
+_LOGGER = logging.getLogger(__name__)
+
+# How long parked caches wait for the entry to come back
+STANDBY_SECONDS: Final = 120
+
+# Options each cache depends on
+POOL_OPTIONS: Final = (CONF_EXTRA_ENDPOINTS, CONF_LOAD_BALANCING, CONF_MAX_IN_FLIGHT)
+PROMPT_OPTIONS: Final = (
+    CONF_PERSONALITY,
+    CONF_OUTPUT_LANGUAGE,
+    CONF_PROMPT,
+    CONF_USE_CUSTOM_PROMPT,
+)
+TOOL_OPTIONS: Final = (CONF_LLM_HASS_API,)
+DEVICE_CONTEXT_OPTIONS: Final = (CONF_AREA_FILTER,)
+
+
+@dataclass
+class EntryCaches:
+    """What an entry keeps across a reload."""
+
+    memory: AssistantMemory
+    device_builder: DeviceContextBuilder
+    resolver: NameResolver
+    router: ModelRouter
+    disk_cache: DiskCache
+    # Stops the device and name listeners
+    stop_tracking: list[CALLBACK_TYPE]
+    pool: ZaiClientPool | None = None
+    tool_cache: dict[Any, Any] = field(default_factory=dict)
+    prompt_cache: dict[Any, Any] = field(default_factory=dict)
+    # Entry data and options the caches were built with
+    data: Mapping[str, Any] = field(default_factory=dict)
+    options: Mapping[str, Any] = field(default_factory=dict)
+    # Releases the caches if the entry doesn't come back
+    expire: CALLBACK_TYPE | None = None
+    # What the last adoption dropped
+    invalidated: list[str] = field(default_factory=list)
+
+    @callback
+    def async_release(self) -> None:
+        """Stop the listeners and close the disk cache.
+
+        The other caches are dropped with this object.
+        """
+        if self.expire is not None:
+            self.expire()
+            self.expire = None
+        for stop in self.stop_tracking:
+            stop()
+        self.stop_tracking.clear()
+        self.disk_cache.async_shutdown()
+
+
+def _changed(
+    old: Mapping[str, Any], new: Mapping[str, Any], keys: tuple[str, ...]
+) -> bool:
+    """Return True if any of keys differs between two option sets."""
+    return any(old.get(key) != new.get(key) for key in keys)
+
+
+@callback
+def async_park(hass: HomeAssistant, entry_id: str, caches: EntryCaches) -> None:
+    """Keep an unloaded entry's caches for the setup that follows."""
+    standby: dict[str, EntryCaches] = hass.data.setdefault(DOMAIN, {}).setdefault(
+        STANDBY_KEY, {}
+    )
+    if (previous := standby.pop(entry_id, None)) is not None:
+        previous.async_release()
+
+    @callback
+    def _async_expire(_now: Any) -> None:
+        caches.expire = None
+        async_discard(hass, entry_id)
+        _LOGGER.debug("Released standby caches of entry %s", entry_id)
+
+    caches.expire = async_call_later(hass, STANDBY_SECONDS, _async_expire)
+    standby[entry_id] = caches
+
+
+@callback
+def async_take(hass: HomeAssistant, entry_id: str) -> EntryCaches | None:
+    """Remove an entry's parked caches from standby and return them."""
+    standby = hass.data.get(DOMAIN, {}).get(STANDBY_KEY, {})
+    caches: EntryCaches | None = standby.pop(entry_id, None)
+    if caches is not None and caches.expire is not None:
+        caches.expire()
+        caches.expire = None
+    return caches
+
+
+@callback
+def async_adopt(hass: HomeAssistant, entry: ConfigEntry) -> EntryCaches | None:
+    """Take an entry's parked caches, dropping what its options invalidate.
+
+    Returns None if nothing was parked for the entry.
+    """
+    if (caches := async_take(hass, entry.entry_id)) is None:
+        return None
+
+    invalidated: list[str] = []
+    old, new = caches.options, entry.options
+    if caches.pool is not None and (
+        caches.data != entry.data or _changed(old, new, POOL_OPTIONS)
+    ):
+        caches.pool = None
+        invalidated.append("client pool")
+    if _changed(old, new, PROMPT_OPTIONS):
+        caches.prompt_cache.clear()
+        invalidated.append("system prompts")
+    if _changed(old, new, TOOL_OPTIONS):
+        caches.tool_cache.clear()
+        invalidated.append("tool schemas")
+    if _changed(old, new, DEVICE_CONTEXT_OPTIONS):
+        caches.device_builder.async_clear_renders()
+        invalidated.append("device context renders")
+    caches.invalidated = invalidated
+
+    _LOGGER.debug(
+        "Adopted standby caches of entry %s (invalidated: %s)",
+        entry.entry_id,
+        ", ".join(invalidated) or "none",
+    )
+    return caches
+
+
+@callback
+def async_discard(hass: HomeAssistant, entry_id: str) -> None:
+    """Release an entry's parked caches, if any."""
+    if (caches := async_take(hass, entry_id)) is not None:
+        caches.async_release()
+    async_cleanup_domain_data(hass)
+
+
+@callback
+def async_cleanup_domain_data(hass: HomeAssistant) -> None:
+    """Drop the domain data (shared schedulers etc.) once nothing uses it.
+
+    That is when no entry is loaded and no caches are parked.
+    """
+    domain_data = hass.data.get(DOMAIN)
+    if domain_data is None:
+        return
+    if domain_data.get(STANDBY_KEY):
+        return
+    domain_data.pop(STANDBY_KEY, None)
+    if not any(
+        entry.entry_id in domain_data
+        for entry in hass.config_entries.async_entries(DOMAIN)
+    ):
+        hass.data.pop(DOMAIN)
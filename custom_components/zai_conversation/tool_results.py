@@ -0,0 +1,319 @@
+"""Compaction of tool results for z.ai Conversation.
+
+Tool results stay in the chat log and are sent back to the model on every
+later iteration and turn. Home Assistant's intent responses carry the full
+success/failed target lists (with IDs and types) and speech data, and
+GetLiveContext returns a YAML dump of every exposed entity, so most of those
+tokens are noise to the model.
+
+Results are reduced to what the model needs - outcome, names of the affected
+entities, error reason or answer - and serialised as compact JSON, once per
+tool call. How each tool's results are treated is configurable:
+
+- ``compact``: the reduction above (default)
+- ``outcome``: only the outcome and error reason
+- ``full``: the result as the tool returned it
+"""
+
+from __future__ import annotations
+
+from collections import OrderedDict
+from dataclasses import dataclass
+import json
+import logging
+from typing import Any, Final
+
+import yaml
+
+from homeassistant.components import conversation
+from homeassistant.config_entries import ConfigEntry
+
+from .const import CONF_TOOL_RESULT_COMPACTION, DEFAULT
+
+_LOGGER = logging.getLogger(__name__)
+
+MODE_COMPACT: Final = "compact"
+MODE_OUTCOME: Final = "outcome"
+MODE_FULL: Final = "full"
+
+TOOL_RESULT_MODES: Final = (MODE_COMPACT, MODE_OUTCOME, MODE_FULL)
+
+# Tool name matching every tool without a line of its own
+ANY_TOOL: Final = "*"
+
+# Compacted results kept, by tool call ID
+MAX_COMPACTED_RESULTS: Final = 512
+
+# Same heuristic as the scheduler's token estimate
+CHARS_PER_TOKEN: Final = 4
+
+# First line of GetLiveContext's result
+LIVE_CONTEXT_PREFIX: Final = "Live Context:"
+
+# libyaml's loader when available
+_YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+# Lists of at least this many dicts with the same keys are sent as a table
+MIN_TABLE_ROWS: Final = 2
+
+
+def parse_tool_modes(text: str | None) -> dict[str, str]:
+    """Return the compaction mode per tool name.
+
+    Args:
+        text: One "tool_name mode" per line; "*" sets the mode of every other
+            tool. Blank lines, lines starting with # and unknown modes are
+            ignored.
+    """
+    modes: dict[str, str] = {}
+    for line in (text or "").splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        parts = line.split()
+        if len(parts) != 2 or parts[1] not in TOOL_RESULT_MODES:
+            _LOGGER.warning("Ignoring invalid tool result compaction line: %s", line)
+            continue
+        modes[parts[0]] = parts[1]
+    return modes
+
+
+def estimate_tokens(text: str) -> int:
+    """Roughly estimate the tokens of a text."""
+    return len(text) // CHARS_PER_TOKEN
+
+
+def _dumps(value: Any) -> str:
+    """Serialise a value as compact JSON."""
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def _unique(values: list[str]) -> list[str]:
+    """Return values without duplicates, in order."""
+    return list(dict.fromkeys(values))
+
+
+def _target_names(targets: Any) -> list[str]:
+    """Return the names of an intent response's targets."""
+    if not isinstance(targets, list):
+        return []
+    return _unique(
+        [
+            str(target.get("name") or target.get("id"))
+            for target in targets
+            if isinstance(target, dict) and (target.get("name") or target.get("id"))
+        ]
+    )
+
+
+def _speech(result: dict[str, Any]) -> str | None:
+    """Return the plain speech of an intent response."""
+    speech = result.get("speech")
+    if not isinstance(speech, dict):
+        return None
+    for kind in ("plain", "ssml"):
+        if isinstance(speech.get(kind), dict) and speech[kind].get("speech"):
+            return str(speech[kind]["speech"])
+    return None
+
+
+def _compact_intent(result: dict[str, Any], mode: str) -> dict[str, Any]:
+    """Reduce an intent response to outcome, affected names and reason."""
+    outcome = str(result["response_type"])
+    data = result.get("data") if isinstance(result.get("data"), dict) else {}
+    compacted: dict[str, Any] = {"outcome": outcome}
+    speech = _speech(result)
+    if outcome == "error":
+        compacted["error"] = ": ".join(
+            str(part) for part in (data.get("code"), speech) if part
+        )
+        return compacted
+    if mode == MODE_OUTCOME:
+        return compacted
+    if success := _target_names(data.get("success")):
+        compacted["success"] = success
+    if failed := _target_names(data.get("failed")):
+        compacted["failed"] = failed
+    if outcome == "query_answer" and speech:
+        compacted["answer"] = speech
+    return compacted
+
+
+def _compact_live_context(text: str) -> str:
+    """Rewrite GetLiveContext's YAML as one line per entity."""
+    header, _, body = text.partition("\n")
+    try:
+        entities = yaml.load(body, Loader=_YAML_LOADER)
+    except yaml.YAMLError:
+        return text
+    if not isinstance(entities, list):
+        return text
+
+    lines = [header]
+    for entity in entities:
+        if not isinstance(entity, dict):
+            return text
+        where = ", ".join(
+            str(part) for part in (entity.get("domain"), entity.get("areas")) if part
+        )
+        line = f"- {entity.get('names', '?')}"
+        if where:
+            line += f" ({where})"
+        if "state" in entity:
+            line += f": {entity['state']}"
+        if isinstance(attributes := entity.get("attributes"), dict) and attributes:
+            line += "; " + ", ".join(
+                f"{key}={value}" for key, value in attributes.items()
+            )
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def _prune(value: Any) -> Any:
+    """Drop empty values and send lists of same-keyed dicts as tables."""
+    if isinstance(value, dict):
+        return {
+            key: pruned
+            for key, item in value.items()
+            if (pruned := _prune(item)) not in (None, "", [], {})
+        }
+    if isinstance(value, list):
+        items = [_prune(item) for item in value]
+        if (
+            len(items) >= MIN_TABLE_ROWS
+            and all(isinstance(item, dict) for item in items)
+            and len({tuple(item) for item in items}) == 1
+        ):
+            keys = list(items[0])
+            return {
+                "keys": keys,
+                "rows": [[item[key] for key in keys] for item in items],
+            }
+        return items
+    return value
+
+
+def compact_result(result: Any, mode: str) -> Any:
+    """Return the part of a tool result the model needs.
+
+    Args:
+        result: Result as returned by the tool.
+        mode: MODE_COMPACT or MODE_OUTCOME.
+    """
+    if not isinstance(result, dict):
+        return result
+    if "response_type" in result:
+        return _compact_intent(result, mode)
+    if "error" in result:
+        # A tool that raised (see ChatLog.async_add_delta_content_stream)
+        error = str(result["error"])
+        if result.get("error_text"):
+            error = f"{error}: {result['error_text']}"
+        return {"outcome": "error", "error": error}
+    if mode == MODE_OUTCOME:
+        return {"outcome": "success" if result.get("success", True) else "failed"}
+    if isinstance(text := result.get("result"), str) and text.startswith(
+        LIVE_CONTEXT_PREFIX
+    ):
+        return {**result, "result": _compact_live_context(text)}
+    return _prune(result)
+
+
+@dataclass(frozen=True, slots=True)
+class CompactedResult:
+    """A tool result as sent to the model."""
+
+    content: Any
+    mode: str
+    tokens: int
+    tokens_saved: int
+
+
+class ToolResultCompactor:
+    """Compact tool results with the modes configured for an entry."""
+
+    def __init__(self, entry: ConfigEntry) -> None:
+        """Initialize the compactor.
+
+        The modes are read from the entry's options on every result, so
+        changing them takes effect right away (for new results).
+        """
+        self.entry = entry
+        # Parsed modes and the option text they were parsed from
+        self._modes: tuple[str | None, dict[str, str]] = (None, {})
+        self._cache: OrderedDict[tuple[str, str], CompactedResult] = OrderedDict()
+        self._results = 0
+        self._tokens_before = 0
+        self._tokens_after = 0
+        self._saved_by_tool: dict[str, int] = {}
+
+    def _mode(self, tool_name: str) -> str:
+        """Return the compaction mode of a tool."""
+        text = self.entry.options.get(
+            CONF_TOOL_RESULT_COMPACTION, DEFAULT[CONF_TOOL_RESULT_COMPACTION]
+        )
+        if self._modes[0] != text:
+            self._modes = (text, parse_tool_modes(text))
+        modes = self._modes[1]
+        return modes.get(tool_name, modes.get(ANY_TOOL, MODE_COMPACT))
+
+    def compact(self, content: conversation.ToolResultContent) -> CompactedResult:
+        """Return a tool result as it is sent to the model.
+
+        Each result is compacted once; the chat log sends it again on every
+        later iteration and turn.
+        """
+        mode = self._mode(content.tool_name)
+        key = (content.tool_call_id, mode)
+        if (cached := self._cache.get(key)) is not None:
+            self._cache.move_to_end(key)
+            return cached
+
+        result = content.tool_result if content.tool_result else ""
+        original = result if isinstance(result, str) else _dumps(result)
+        if mode == MODE_FULL:
+            tokens = estimate_tokens(original)
+            compacted = CompactedResult(result, mode, tokens, 0)
+        else:
+            try:
+                reduced = compact_result(result, mode)
+            except Exception:
+                _LOGGER.debug(
+                    "Failed to compact %s result", content.tool_name, exc_info=True
+                )
+                reduced = result
+            text = reduced if isinstance(reduced, str) else _dumps(reduced)
+            tokens = estimate_tokens(text)
+            compacted = CompactedResult(
+                text, mode, tokens, max(0, estimate_tokens(original) - tokens)
+            )
+
+        self._results += 1
+        self._tokens_before += compacted.tokens + compacted.tokens_saved
+        self._tokens_after += compacted.tokens
+        self._saved_by_tool[content.tool_name] = (
+            self._saved_by_tool.get(content.tool_name, 0) + compacted.tokens_saved
+        )
+        _LOGGER.debug(
+            "Compacted %s result (%s): %d tokens, %d saved",
+            content.tool_name,
+            mode,
+            compacted.tokens,
+            compacted.tokens_saved,
+        )
+
+        self._cache[key] = compacted
+        if len(self._cache) > MAX_COMPACTED_RESULTS:
+            self._cache.popitem(last=False)
+        return compacted
+
+    @property
+    def metrics(self) -> dict[str, Any]:
+        """Return compaction statistics for diagnostics."""
+        return {
+            "results": self._results,
+            "tokens_before": self._tokens_before,
+            "tokens_after": self._tokens_after,
+            "tokens_saved": self._tokens_before - self._tokens_after,
+            "tokens_saved_by_tool": dict(self._saved_by_tool),
+        }
@@ -0,0 +1,292 @@
+"""Per-utterance tracing for z.ai Conversation.
+
+Every handled message is recorded as a trace: a root span for the turn and
+child spans for memory, device context, system prompt, each model call and
+each tool call. A summary of the spans (offsets and durations) is added to
+the conversation trace shown in Assist's debug view.
+
+A configurable fraction of the turns is also exported in the OTLP/JSON
+encoding of the OpenTelemetry protocol, either appended to a file (one
+ExportTraceServiceRequest per line, readable by the OpenTelemetry
+Collector's file receiver) or POSTed to a collector's OTLP/HTTP endpoint.
+Attribute names follow the OpenTelemetry GenAI semantic conventions.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+import json
+import logging
+from pathlib import Path
+import random
+import secrets
+import time
+from typing import Any
+
+import aiohttp
+
+from homeassistant.components.conversation import trace
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+
+from .const import CONF_TRACE_EXPORT, CONF_TRACE_SAMPLE_RATE, DEFAULT, DOMAIN
+
+_LOGGER = logging.getLogger(__name__)
+
+# OTLP span kinds and status codes
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_CLIENT = 3
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+EXPORT_TIMEOUT = 10.0
+
+
+@dataclass(slots=True)
+class Span:
+    """A timed operation within a turn."""
+
+    name: str
+    span_id: str
+    parent_id: str | None
+    kind: int = SPAN_KIND_INTERNAL
+    start_ns: int = field(default_factory=time.time_ns)
+    end_ns: int | None = None
+    attributes: dict[str, Any] = field(default_factory=dict)
+    error: str | None = None
+
+    def set(self, **attributes: Any) -> None:
+        """Add attributes; None values are left out."""
+        self.attributes.update(
+            (key, value) for key, value in attributes.items() if value is not None
+        )
+
+    def record_error(self, err: BaseException) -> None:
+        """Mark the span as failed."""
+        self.error = f"{type(err).__name__}: {err}"
+
+    def end(self) -> None:
+        """End the span (the first call wins)."""
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+
+    @property
+    def duration_ms(self) -> float:
+        """Return the duration in milliseconds (so far, if not ended)."""
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+    def to_otlp(self, trace_id: str) -> dict[str, Any]:
+        """Return the span in OTLP/JSON form."""
+        span: dict[str, Any] = {
+            "traceId": trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or self.start_ns),
+            "attributes": _otlp_attributes(self.attributes),
+            "status": (
+                {"code": STATUS_ERROR, "message": self.error}
+                if self.error
+                else {"code": STATUS_OK}
+            ),
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+def _otlp_value(value: Any) -> dict[str, Any]:
+    """Return an attribute value in OTLP/JSON form."""
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        # 64 bit integers are strings in OTLP/JSON
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    if isinstance(value, (list, tuple)):
+        return {"arrayValue": {"values": [_otlp_value(item) for item in value]}}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes: dict[str, Any]) -> list[dict[str, Any]]:
+    """Return attributes in OTLP/JSON form."""
+    return [
+        {"key": key, "value": _otlp_value(value)} for key, value in attributes.items()
+    ]
+
+
+class TurnTrace:
+    """The spans of one handled message."""
+
+    def __init__(self, sampled: bool, **attributes: Any) -> None:
+        """Start the trace and its root span.
+
+        Args:
+            sampled: Export the trace when it finishes.
+            **attributes: Attributes of the root span.
+        """
+        self.sampled = sampled
+        self.trace_id = secrets.token_hex(16)
+        self.root = Span("conversation turn", secrets.token_hex(8), None)
+        self.root.set(**attributes)
+        self.spans: list[Span] = [self.root]
+        # Spans opened with span(), innermost last
+        self._open: list[Span] = []
+
+    def start_span(
+        self,
+        name: str,
+        kind: int = SPAN_KIND_INTERNAL,
+        parent: Span | None = None,
+        **attributes: Any,
+    ) -> Span:
+        """Start a span and return it; end it yourself.
+
+        The parent defaults to the innermost span opened with span(), or the
+        root span.
+        """
+        if parent is None:
+            parent = self._open[-1] if self._open else self.root
+        span = Span(name, secrets.token_hex(8), parent.span_id, kind)
+        span.set(**attributes)
+        self.spans.append(span)
+        return span
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[Span]:
+        """Time the enclosed block; spans started inside it are its children."""
+        span = self.start_span(name, **attributes)
+        self._open.append(span)
+        try:
+            yield span
+        except Exception as err:
+            span.record_error(err)
+            raise
+        finally:
+            self._open.remove(span)
+            span.end()
+
+    def summary(self) -> dict[str, Any]:
+        """Return the spans as offsets from the start of the turn, in ms."""
+        start = self.root.start_ns
+        return {
+            "trace_id": self.trace_id,
+            "sampled": self.sampled,
+            "spans": [
+                {
+                    "name": span.name,
+                    "start_ms": round((span.start_ns - start) / 1e6, 1),
+                    "duration_ms": round(span.duration_ms, 1),
+                    **({"error": span.error} if span.error else {}),
+                    **span.attributes,
+                }
+                for span in self.spans
+            ],
+        }
+
+    def to_otlp(self, resource: dict[str, Any]) -> dict[str, Any]:
+        """Return the trace as an OTLP/JSON ExportTraceServiceRequest."""
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {"attributes": _otlp_attributes(resource)},
+                    "scopeSpans": [
+                        {
+                            "scope": {"name": f"custom_components.{DOMAIN}"},
+                            "spans": [
+                                span.to_otlp(self.trace_id) for span in self.spans
+                            ],
+                        }
+                    ],
+                }
+            ]
+        }
+
+
+class Tracer:
+    """Start turn traces for an entry and export the sampled ones."""
+
+    def __init__(self, hass: HomeAssistant, entry: ConfigEntry) -> None:
+        """Initialize the tracer.
+
+        Sample rate and export target are read from the entry's options on
+        every turn, so changing them takes effect right away.
+        """
+        self.hass = hass
+        self.entry = entry
+        self._resource = {
+            "service.name": DOMAIN,
+            "service.instance.id": entry.entry_id,
+        }
+        self._traces = 0
+        self._exported = 0
+        self._export_failures = 0
+
+    def start_turn(self, **attributes: Any) -> TurnTrace:
+        """Start the trace of a turn, deciding now whether it is exported."""
+        rate = float(
+            self.entry.options.get(
+                CONF_TRACE_SAMPLE_RATE, DEFAULT[CONF_TRACE_SAMPLE_RATE]
+            )
+        )
+        self._traces += 1
+        return TurnTrace(rate > 0 and random.random() < rate, **attributes)
+
+    @callback
+    def async_finish(self, turn: TurnTrace) -> None:
+        """End a turn, add it to the debug view and export it if sampled."""
+        turn.root.end()
+        trace.async_conversation_trace_append(
+            trace.ConversationTraceEventType.AGENT_DETAIL,
+            {"timing": turn.summary()},
+        )
+        if not turn.sampled:
+            return
+        target = self.entry.options.get(CONF_TRACE_EXPORT, DEFAULT[CONF_TRACE_EXPORT])
+        if not target:
+            return
+        self.hass.async_create_background_task(
+            self._async_export(target, turn.to_otlp(self._resource)),
+            f"{DOMAIN} trace export",
+        )
+
+    async def _async_export(self, target: str, payload: dict[str, Any]) -> None:
+        """Send a trace to a collector URL or append it to a file."""
+        try:
+            if target.startswith(("http://", "https://")):
+                session = async_get_clientsession(self.hass)
+                async with session.post(
+                    target,
+                    json=payload,
+                    timeout=aiohttp.ClientTimeout(total=EXPORT_TIMEOUT),
+                ) as response:
+                    response.raise_for_status()
+            else:
+                await self.hass.async_add_executor_job(
+                    _append_line, Path(self.hass.config.path(target)), payload
+                )
+        except (aiohttp.ClientError, TimeoutError, OSError) as err:
+            self._export_failures += 1
+            _LOGGER.debug("Failed to export trace to %s: %s", target, err)
+            return
+        self._exported += 1
+
+    @property
+    def metrics(self) -> dict[str, Any]:
+        """Return tracing statistics for diagnostics."""
+        return {
+            "traces": self._traces,
+            "exported": self._exported,
+            "export_failures": self._export_failures,
+        }
+
+
+def _append_line(path: Path, payload: dict[str, Any]) -> None:
+    """Append a JSON document as one line to a file."""
+    with path.open("a", encoding="utf-8") as file:
+        file.write(json.dumps(payload, separators=(",", ":")) + "\n")
@@ -0,0 +1,230 @@
+"""Fake z.ai messages endpoint for load tests.
+
+Speaks enough of the Anthropic-compatible /v1/messages API for the
+integration's client pool: streamed (SSE) and whole responses, usage and
+rate-limit headers. Latency is simulated with a time to first token and a
+delay per streamed word, so the integration's own overhead can be measured
+without touching the real API.
+
+Run standalone:
+
+    python scripts/fake_messages_server.py --port 8765
+
+or start it from another script with FakeMessagesServer.start_in_thread().
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import itertools
+import json
+import threading
+from typing import Any
+
+from aiohttp import web
+
+DEFAULT_REPLY = "Done, I turned on the kitchen lights and set them to 60 percent."
+
+# Generous limits so the integration's scheduler never throttles
+RATE_LIMIT_HEADERS = {
+    "anthropic-ratelimit-requests-limit": "1000000",
+    "anthropic-ratelimit-requests-remaining": "999999",
+    "anthropic-ratelimit-tokens-limit": "100000000",
+    "anthropic-ratelimit-tokens-remaining": "99999999",
+}
+
+
+def _sse(event: str, data: dict[str, Any]) -> bytes:
+    """Encode one server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n".encode()
+
+
+class FakeMessagesServer:
+    """Fake /v1/messages endpoint."""
+
+    def __init__(
+        self,
+        first_token_delay: float = 0.3,
+        word_delay: float = 0.01,
+        reply: str = DEFAULT_REPLY,
+    ) -> None:
+        """Initialize the server.
+
+        Args:
+            first_token_delay: Seconds before the first event (or response).
+            word_delay: Seconds between streamed words.
+            reply: Text every response answers with.
+        """
+        self.first_token_delay = first_token_delay
+        self.word_delay = word_delay
+        self.reply = reply
+        self.requests = 0
+        self._ids = itertools.count(1)
+        self._runner: web.AppRunner | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread: threading.Thread | None = None
+
+    def make_app(self) -> web.Application:
+        """Return the aiohttp application."""
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_post("/v1/messages", self._handle_messages)
+        app.router.add_get("/v1/models", self._handle_models)
+        return app
+
+    async def _handle_models(self, request: web.Request) -> web.Response:
+        """Answer the client pool's connection warm-up."""
+        return web.json_response({"data": [], "has_more": False})
+
+    async def _handle_messages(self, request: web.Request) -> web.StreamResponse:
+        """Answer a messages.create request."""
+        raw = await request.read()
+        body = json.loads(raw)
+        self.requests += 1
+        message_id = f"msg_fake_{next(self._ids)}"
+        # Rough token count without tokenizing
+        input_tokens = len(raw) // 4
+        words = self.reply.split(" ")
+        usage = {"input_tokens": input_tokens, "output_tokens": len(words)}
+        headers = {**RATE_LIMIT_HEADERS, "request-id": message_id}
+
+        await asyncio.sleep(self.first_token_delay)
+
+        if not body.get("stream"):
+            return web.json_response(
+                {
+                    "id": message_id,
+                    "type": "message",
+                    "role": "assistant",
+                    "model": body.get("model", "fake"),
+                    "content": [{"type": "text", "text": self.reply}],
+                    "stop_reason": "end_turn",
+                    "stop_sequence": None,
+                    "usage": usage,
+                },
+                headers=headers,
+            )
+
+        response = web.StreamResponse(
+            headers={**headers, "Content-Type": "text/event-stream"}
+        )
+        await response.prepare(request)
+        await response.write(
+            _sse(
+                "message_start",
+                {
+                    "type": "message_start",
+                    "message": {
+                        "id": message_id,
+                        "type": "message",
+                        "role": "assistant",
+                        "model": body.get("model", "fake"),
+                        "content": [],
+                        "stop_reason": None,
+                        "stop_sequence": None,
+                        "usage": {"input_tokens": input_tokens, "output_tokens": 1},
+                    },
+                },
+            )
+        )
+        await response.write(
+            _sse(
+                "content_block_start",
+                {
+                    "type": "content_block_start",
+                    "index": 0,
+                    "content_block": {"type": "text", "text": ""},
+                },
+            )
+        )
+        for index, word in enumerate(words):
+            if self.word_delay:
+                await asyncio.sleep(self.word_delay)
+            await response.write(
+                _sse(
+                    "content_block_delta",
+                    {
+                        "type": "content_block_delta",
+                        "index": 0,
+                        "delta": {
+                            "type": "text_delta",
+                            "text": word if index == 0 else f" {word}",
+                        },
+                    },
+                )
+            )
+        await response.write(
+            _sse("content_block_stop", {"type": "content_block_stop", "index": 0})
+        )
+        await response.write(
+            _sse(
+                "message_delta",
+                {
+                    "type": "message_delta",
+                    "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                    "usage": {"output_tokens": len(words)},
+                },
+            )
+        )
+        await response.write(_sse("message_stop", {"type": "message_stop"}))
+        await response.write_eof()
+        return response
+
+    async def async_start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Start serving on the running loop and return the base URL."""
+        self._runner = web.AppRunner(self.make_app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        sockets = site._server.sockets  # type: ignore[union-attr]
+        return f"http://{host}:{sockets[0].getsockname()[1]}"
+
+    async def async_stop(self) -> None:
+        """Stop serving."""
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def start_in_thread(self) -> str:
+        """Serve from a thread with its own event loop; return the base URL.
+
+        Keeps the fake server's work off the event loop being measured.
+        """
+        started = threading.Event()
+        result: dict[str, str] = {}
+
+        def _run() -> None:
+            self._loop = asyncio.new_event_loop()
+            result["url"] = self._loop.run_until_complete(self.async_start())
+            started.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=_run, name="fake-zai", daemon=True)
+        self._thread.start()
+        started.wait()
+        return result["url"]
+
+    def stop_thread(self) -> None:
+        """Stop a server started with start_in_thread()."""
+        if self._loop is None or self._thread is None:
+            return
+        asyncio.run_coroutine_threadsafe(self.async_stop(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+
+def main() -> None:
+    """Run the fake endpoint until interrupted."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--first-token-delay", type=float, default=0.3)
+    parser.add_argument("--word-delay", type=float, default=0.01)
+    args = parser.parse_args()
+
+    server = FakeMessagesServer(args.first_token_delay, args.word_delay)
+    web.run_app(server.make_app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
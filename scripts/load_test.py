@@ -0,0 +1,584 @@
+"""Load test for the z.ai conversation agent.
+
+Drives ZaiConversationEntity._async_handle_message at a Poisson arrival rate
+against the fake messages endpoint (fake_messages_server.py) and a synthetic
+entity population, and sweeps entity counts and concurrency. For every run
+it measures:
+
+- event-loop lag, both overall (a ticker that measures how late it wakes
+  up) and per stage: the device context snapshot and render,
+  _convert_content and the JSON encoding of the request body (large
+  contexts render in the executor, so that stage is off the loop there);
+- throughput, in completed turns per second;
+- tail latency of a turn, from arrival (queueing included) to the result.
+
+The result is a capacity report: one row per run, plus the largest
+concurrency per entity count that kept the loop lag within budget, and the
+failed turns by exception type with the first traceback.
+
+Needs a Home Assistant development environment (homeassistant, anthropic
+and aiohttp installed). Run from the repository root:
+
+    python scripts/load_test.py --entities 200 1000 5000 --concurrency 1 4 16 \
+        --rate 10 --duration 30 --json capacity.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+from collections import defaultdict
+from collections.abc import Callable
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+import functools
+import json
+from pathlib import Path
+import random
+import sys
+import tempfile
+import time
+import traceback
+from typing import Any
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from fake_messages_server import FakeMessagesServer  # noqa: E402
+import httpx  # noqa: E402
+
+from custom_components.zai_conversation import (  # noqa: E402
+    client_pool,
+    conversation as zai_conversation,
+    device_manager,
+)
+from custom_components.zai_conversation.const import (  # noqa: E402
+    CONF_LLM_HASS_API,
+    CONF_MAX_IN_FLIGHT,
+    CONF_MEMORY_ENABLED,
+    CONF_USE_CUSTOM_PROMPT,
+    DEFAULT_MAX_IN_FLIGHT,
+    LOAD_BALANCING_LEAST_OUTSTANDING,
+)
+from custom_components.zai_conversation.device_manager import (  # noqa: E402
+    DeviceContextBuilder,
+)
+from homeassistant.components import conversation  # noqa: E402
+from homeassistant.core import Context, HomeAssistant  # noqa: E402
+from homeassistant.helpers import (  # noqa: E402
+    area_registry as ar,
+    chat_session,
+    device_registry as dr,
+    entity_registry as er,
+)
+from homeassistant.setup import async_setup_component  # noqa: E402
+
+# How often the lag ticker wakes up
+LAG_INTERVAL = 0.02
+
+UTTERANCES = (
+    "Turn on the kitchen lights",
+    "What's the temperature in the living room?",
+    "Close all the covers upstairs",
+    "Is the front door open?",
+    "Set the bedroom thermostat to 21 degrees",
+    "How much power is the house using right now?",
+    "Turn off everything in the office",
+    "Dim the lounge lights to 30 percent",
+)
+
+# (domain, device_class, unit) of the synthetic population, cycled through
+POPULATION = (
+    ("light", None, None),
+    ("switch", None, None),
+    ("sensor", "temperature", "°C"),
+    ("sensor", "power", "W"),
+    ("binary_sensor", "door", None),
+    ("climate", None, None),
+    ("cover", None, None),
+    ("media_player", None, None),
+)
+
+ENTITIES_PER_AREA = 12
+
+
+@dataclass
+class LoadTestEntry:
+    """The parts of a config entry the conversation entity uses."""
+
+    entry_id: str
+    options: dict[str, Any]
+    title: str = "z.ai load test"
+    runtime_data: Any = None
+
+
+@dataclass
+class RunResult:
+    """Measurements of one (entities, concurrency) run."""
+
+    entities: int
+    concurrency: int
+    rate: float
+    turns: int = 0
+    errors: int = 0
+    # Failed turns by exception type, and the traceback of the first one
+    error_types: dict[str, int] = field(default_factory=dict)
+    first_error: str | None = None
+    throughput: float = 0.0
+    latency_p50: float = 0.0
+    latency_p95: float = 0.0
+    latency_p99: float = 0.0
+    loop_lag_p99: float = 0.0
+    loop_lag_max: float = 0.0
+    # Milliseconds of event-loop time per turn, by stage
+    stage_ms_per_turn: dict[str, float] = field(default_factory=dict)
+    context_chars: int = 0
+    within_budget: bool = False
+
+
+class StageTimer:
+    """Accumulate the time spent in instrumented functions."""
+
+    def __init__(self) -> None:
+        """Initialize the timer."""
+        self.totals: dict[str, float] = defaultdict(float)
+        self.calls: dict[str, int] = defaultdict(int)
+        self.context_chars = 0
+
+    def wrap(self, stage: str, func: Callable[..., Any]) -> Callable[..., Any]:
+        """Return func, timed under stage."""
+
+        @functools.wraps(func)
+        def _timed(*args: Any, **kwargs: Any) -> Any:
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.totals[stage] += time.perf_counter() - start
+                self.calls[stage] += 1
+
+        return _timed
+
+    def reset(self) -> None:
+        """Forget everything measured so far."""
+        self.totals.clear()
+        self.calls.clear()
+        self.context_chars = 0
+
+
+@contextmanager
+def instrument(timer: StageTimer):
+    """Time the stages that run on the event loop during a turn."""
+    patches: list[tuple[Any, str, Any]] = []
+
+    def _patch(target: Any, name: str, replacement: Any) -> None:
+        patches.append((target, name, getattr(target, name)))
+        setattr(target, name, replacement)
+
+    render = device_manager.render_context
+
+    def _render(*args: Any, **kwargs: Any) -> str:
+        text = render(*args, **kwargs)
+        timer.context_chars = len(text)
+        return text
+
+    _patch(
+        DeviceContextBuilder,
+        "_async_snapshot",
+        timer.wrap("context_snapshot", DeviceContextBuilder._async_snapshot),
+    )
+    # Runs in the executor once the builder decides the context is large
+    _patch(device_manager, "render_context", timer.wrap("context_render", _render))
+    _patch(
+        zai_conversation,
+        "_convert_content",
+        timer.wrap("convert_content", zai_conversation._convert_content),
+    )
+    # httpx encodes the request body with the json module on the event loop
+    content = getattr(httpx, "_content", None)
+    if content is not None and hasattr(content, "json_dumps"):
+        _patch(content, "json_dumps", timer.wrap("json", content.json_dumps))
+    try:
+        yield
+    finally:
+        for target, name, original in reversed(patches):
+            setattr(target, name, original)
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    """Return the nearest-rank percentile of values."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+async def _monitor_lag(samples: list[float], stop: asyncio.Event) -> None:
+    """Record how late a ticker wakes up; that is time the loop was busy."""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        start = loop.time()
+        await asyncio.sleep(LAG_INTERVAL)
+        samples.append(max(0.0, loop.time() - start - LAG_INTERVAL))
+
+
+async def async_populate(hass: HomeAssistant, count: int, rng: random.Random) -> None:
+    """Create count synthetic entities spread over areas."""
+    area_reg = ar.async_get(hass)
+    entity_reg = er.async_get(hass)
+    areas = [
+        area_reg.async_create(f"Load test area {index}")
+        for index in range(max(1, count // ENTITIES_PER_AREA))
+    ]
+
+    for index in range(count):
+        domain, device_class, unit = POPULATION[index % len(POPULATION)]
+        entry = entity_reg.async_get_or_create(
+            domain,
+            "zai_load_test",
+            str(index),
+            suggested_object_id=f"load_test_{index}",
+            original_device_class=device_class,
+            unit_of_measurement=unit,
+        )
+        entity_reg.async_update_entity(
+            entry.entity_id, area_id=areas[index % len(areas)].id
+        )
+        state, attributes = _synthetic_state(domain, device_class, unit, rng)
+        attributes["friendly_name"] = f"Load test {domain} {index}"
+        hass.states.async_set(entry.entity_id, state, attributes)
+
+
+def _synthetic_state(
+    domain: str, device_class: str | None, unit: str | None, rng: random.Random
+) -> tuple[str, dict[str, Any]]:
+    """Return a plausible (state, attributes) for a synthetic entity."""
+    attributes: dict[str, Any] = {}
+    if device_class:
+        attributes["device_class"] = device_class
+    if unit:
+        attributes["unit_of_measurement"] = unit
+    if domain == "light":
+        attributes["brightness"] = rng.randrange(1, 256)
+        return rng.choice(("on", "off")), attributes
+    if domain == "sensor" and device_class == "temperature":
+        return f"{rng.uniform(17, 25):.2f}", attributes
+    if domain == "sensor":
+        return f"{rng.uniform(0, 3000):.1f}", attributes
+    if domain == "binary_sensor":
+        return rng.choice(("on", "off")), attributes
+    if domain == "climate":
+        attributes["current_temperature"] = round(rng.uniform(17, 25), 1)
+        attributes["temperature"] = 21
+        return "heat", attributes
+    if domain == "cover":
+        attributes["current_position"] = rng.randrange(0, 101)
+        return "open", attributes
+    if domain == "media_player":
+        return rng.choice(("playing", "paused", "idle")), attributes
+    return rng.choice(("on", "off")), attributes
+
+
+async def _churn(
+    hass: HomeAssistant, rate: float, stop: asyncio.Event, rng: random.Random
+) -> None:
+    """Update power sensors at rate updates per second, like a busy house."""
+    sensors = [
+        state.entity_id
+        for state in hass.states.async_all("sensor")
+        if state.attributes.get("device_class") == "power"
+    ]
+    if not sensors or rate <= 0:
+        return
+    while not stop.is_set():
+        await asyncio.sleep(rng.expovariate(rate))
+        entity_id = rng.choice(sensors)
+        state = hass.states.get(entity_id)
+        value = max(0.0, float(state.state) + rng.gauss(0, 15))
+        hass.states.async_set(entity_id, f"{value:.1f}", state.attributes)
+
+
+async def async_run(
+    hass: HomeAssistant,
+    base_url: str,
+    args: argparse.Namespace,
+    entities: int,
+    concurrency: int,
+    timer: StageTimer,
+) -> RunResult:
+    """Run one load test against an already populated hass."""
+    rng = random.Random(args.seed)
+    options = {
+        CONF_USE_CUSTOM_PROMPT: True,
+        CONF_MEMORY_ENABLED: False,
+        CONF_LLM_HASS_API: args.llm_api,
+        CONF_MAX_IN_FLIGHT: args.max_in_flight,
+    }
+    entry = LoadTestEntry(f"load_test_{entities}_{concurrency}", options)
+    entry.runtime_data = await client_pool.async_create_pool(
+        hass,
+        [("load-test-key", base_url)],
+        LOAD_BALANCING_LEAST_OUTSTANDING,
+        args.max_in_flight,
+    )
+    builder = DeviceContextBuilder(hass)
+    stop_builder = builder.async_start()
+    entity = zai_conversation.ZaiConversationEntity(
+        entry, hass, device_builder=builder  # type: ignore[arg-type]
+    )
+    entity.hass = hass
+    entity.entity_id = "conversation.zai_load_test"
+
+    semaphore = asyncio.Semaphore(concurrency)
+    # Conversations continue for a few turns so history grows
+    open_conversations: list[tuple[str | None, int]] = []
+    latencies: list[float] = []
+    error_types: dict[str, int] = defaultdict(int)
+    first_error: str | None = None
+
+    async def _turn() -> None:
+        nonlocal first_error
+        arrival = time.perf_counter()
+        conversation_id: str | None = None
+        turn = 0
+        if open_conversations and rng.random() < 0.5:
+            conversation_id, turn = open_conversations.pop(
+                rng.randrange(len(open_conversations))
+            )
+        async with semaphore:
+            user_input = zai_conversation.build_conversation_input(
+                text=rng.choice(UTTERANCES),
+                context=Context(),
+                conversation_id=conversation_id,
+                device_id=None,
+                language="en",
+                agent_id=entity.entity_id,
+            )
+            try:
+                with (
+                    chat_session.async_get_chat_session(
+                        hass, conversation_id
+                    ) as session,
+                    conversation.async_get_chat_log(
+                        hass, session, user_input
+                    ) as chat_log,
+                ):
+                    await entity._async_handle_message(user_input, chat_log)
+                    conversation_id = session.conversation_id
+            except Exception as err:  # noqa: BLE001
+                error_types[type(err).__name__] += 1
+                if first_error is None:
+                    first_error = traceback.format_exc()
+                    print(first_error, file=sys.stderr)
+                return
+        latencies.append(time.perf_counter() - arrival)
+        if turn + 1 < args.turns_per_conversation:
+            open_conversations.append((conversation_id, turn + 1))
+
+    lag: list[float] = []
+    stop = asyncio.Event()
+    monitors = [
+        asyncio.create_task(_monitor_lag(lag, stop)),
+        asyncio.create_task(_churn(hass, args.churn, stop, rng)),
+    ]
+    timer.reset()
+    tasks: list[asyncio.Task[None]] = []
+    start = time.perf_counter()
+    with instrument(timer):
+        while time.perf_counter() - start < args.duration:
+            await asyncio.sleep(rng.expovariate(args.rate))
+            tasks.append(asyncio.create_task(_turn()))
+        await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await asyncio.gather(*monitors)
+    stop_builder()
+
+    result = RunResult(entities, concurrency, args.rate)
+    result.turns = len(latencies)
+    result.errors = sum(error_types.values())
+    result.error_types = dict(error_types)
+    result.first_error = first_error
+    result.throughput = round(len(latencies) / elapsed, 2)
+    result.latency_p50 = round(percentile(latencies, 0.50), 3)
+    result.latency_p95 = round(percentile(latencies, 0.95), 3)
+    result.latency_p99 = round(percentile(latencies, 0.99), 3)
+    result.loop_lag_p99 = round(percentile(lag, 0.99) * 1000, 1)
+    result.loop_lag_max = round(max(lag, default=0.0) * 1000, 1)
+    result.stage_ms_per_turn = {
+        stage: round(total * 1000 / max(1, len(tasks)), 3)
+        for stage, total in sorted(timer.totals.items())
+    }
+    result.context_chars = timer.context_chars
+    result.within_budget = (
+        not result.errors
+        and result.loop_lag_p99 <= args.lag_budget
+        and result.throughput >= args.rate * 0.9
+    )
+    return result
+
+
+async def async_setup_hass(config_dir: str, llm_api: str | None) -> HomeAssistant:
+    """Start a bare Home Assistant with the registries loaded."""
+    hass = HomeAssistant(config_dir)
+    await ar.async_load(hass)
+    await dr.async_load(hass)
+    await er.async_load(hass)
+    if llm_api:
+        # The Assist API needs intents and exposed entities
+        assert await async_setup_component(hass, "homeassistant", {})
+        assert await async_setup_component(hass, "intent", {})
+    return hass
+
+
+async def async_main(args: argparse.Namespace) -> list[RunResult]:
+    """Run the sweep and return every run's measurements."""
+    server = FakeMessagesServer(args.first_token_delay, args.word_delay)
+    base_url = server.start_in_thread()
+    timer = StageTimer()
+    results: list[RunResult] = []
+    try:
+        for entities in args.entities:
+            with tempfile.TemporaryDirectory() as config_dir:
+                hass = await async_setup_hass(config_dir, args.llm_api)
+                await async_populate(hass, entities, random.Random(args.seed))
+                for concurrency in args.concurrency:
+                    result = await async_run(
+                        hass, base_url, args, entities, concurrency, timer
+                    )
+                    results.append(result)
+                    print(
+                        f"entities={entities} concurrency={concurrency}: "
+                        f"{result.throughput} turns/s, "
+                        f"p99 {result.latency_p99}s, "
+                        f"loop lag p99 {result.loop_lag_p99}ms",
+                        file=sys.stderr,
+                    )
+                await hass.async_stop(force=True)
+    finally:
+        server.stop_thread()
+    return results
+
+
+def format_report(results: list[RunResult], args: argparse.Namespace) -> str:
+    """Return the capacity report as Markdown."""
+    stages = sorted({stage for r in results for stage in r.stage_ms_per_turn})
+    header = [
+        "entities",
+        "concurrency",
+        "turns/s",
+        "p50 s",
+        "p95 s",
+        "p99 s",
+        "lag p99 ms",
+        "lag max ms",
+        *(f"{stage} ms/turn" for stage in stages),
+        "context chars",
+        "errors",
+        "ok",
+    ]
+    lines = [
+        f"# Capacity report ({args.rate} turns/s offered, "
+        f"{args.duration}s per run, lag budget {args.lag_budget}ms)",
+        "",
+        "| " + " | ".join(header) + " |",
+        "|" + "---|" * len(header),
+    ]
+    for r in results:
+        row = [
+            r.entities,
+            r.concurrency,
+            r.throughput,
+            r.latency_p50,
+            r.latency_p95,
+            r.latency_p99,
+            r.loop_lag_p99,
+            r.loop_lag_max,
+            *(r.stage_ms_per_turn.get(stage, 0.0) for stage in stages),
+            r.context_chars,
+            r.errors,
+            "yes" if r.within_budget else "no",
+        ]
+        lines.append("| " + " | ".join(str(value) for value in row) + " |")
+
+    lines += ["", "## Capacity", ""]
+    for entities in args.entities:
+        passing = [r for r in results if r.entities == entities and r.within_budget]
+        if passing:
+            best = max(passing, key=lambda r: (r.concurrency, r.throughput))
+            lines.append(
+                f"- {entities} entities: up to {best.concurrency} concurrent "
+                f"conversations, {best.throughput} turns/s, p99 {best.latency_p99}s"
+            )
+        else:
+            lines.append(f"- {entities} entities: no run stayed within budget")
+
+    failed = [r for r in results if r.errors]
+    if failed:
+        lines += ["", "## Errors", ""]
+        for r in failed:
+            types = ", ".join(
+                f"{name} x{count}" for name, count in sorted(r.error_types.items())
+            )
+            lines.append(
+                f"- {r.entities} entities, concurrency {r.concurrency}: {types}"
+            )
+        # Runs usually fail for the same reason; show the first traceback
+        lines += ["", "```", (failed[0].first_error or "").rstrip(), "```"]
+    return "\n".join(lines)
+
+
+def main() -> None:
+    """Parse arguments, run the sweep and print the report."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--entities", type=int, nargs="+", default=[100, 1000, 5000],
+        help="Entity counts to sweep",
+    )
+    parser.add_argument(
+        "--concurrency", type=int, nargs="+", default=[1, 4, 16, 64],
+        help="Concurrent conversations to sweep",
+    )
+    parser.add_argument(
+        "--rate", type=float, default=10.0, help="Offered turns per second"
+    )
+    parser.add_argument(
+        "--duration", type=float, default=20.0, help="Seconds of arrivals per run"
+    )
+    parser.add_argument(
+        "--turns-per-conversation", type=int, default=3,
+        help="Turns before a conversation is dropped",
+    )
+    parser.add_argument(
+        "--churn", type=float, default=20.0,
+        help="Sensor state updates per second during a run",
+    )
+    parser.add_argument(
+        "--max-in-flight", type=int, default=DEFAULT_MAX_IN_FLIGHT,
+        help="Max concurrent requests option of the integration",
+    )
+    parser.add_argument(
+        "--llm-api", default=None,
+        help="LLM API to give the agent (e.g. assist); none by default",
+    )
+    parser.add_argument(
+        "--lag-budget", type=float, default=50.0,
+        help="p99 event-loop lag (ms) a run may reach and still pass",
+    )
+    parser.add_argument("--first-token-delay", type=float, default=0.3)
+    parser.add_argument("--word-delay", type=float, default=0.01)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", type=Path, help="Also write raw results here")
+    args = parser.parse_args()
+
+    results = asyncio.run(async_main(args))
+    print(format_report(results, args))
+    if args.json:
+        args.json.write_text(
+            json.dumps([asdict(result) for result in results], indent=2)
+        )
+
+
+if __name__ == "__main__":
+    main()
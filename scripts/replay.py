@@ -0,0 +1,609 @@
+"""Deterministic request replay for the z.ai conversation agent.
+
+Performance regression tests without the real API. The integration records
+every request it sends, with the response and its timing, when the
+"Request Recording" option names a file (see recorder.py). This script:
+
+- ``record``: drives scripted conversations through
+  ZaiConversationEntity._async_handle_message against the fake messages
+  endpoint (fake_messages_server.py) and a seeded synthetic home (as in
+  load_test.py), and records them like the option does;
+- ``replay``: takes the user turns of a recording, from this script or from
+  a real installation, and sends them through _async_handle_message again,
+  in order and in the same conversations, against a local stand-in that
+  answers every request with its recorded response. The response is looked
+  up by the hash of the request; a request the current version builds
+  differently gets the next response in recorded order instead.
+
+The replay report compares the requests of both versions (hash hits, bytes
+of system prompt, tools and messages, the requests that changed most) and
+gives the latency of each turn, so a change in prompt size or pipeline
+overhead shows up offline. Record with one version, check out the other and
+replay with the same --entities and --seed.
+
+Needs a Home Assistant development environment (homeassistant, anthropic
+and aiohttp installed). Run from the repository root:
+
+    python scripts/replay.py record requests.jsonl.gz --conversations 20
+    python scripts/replay.py replay requests.jsonl.gz --json replay.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+from collections import defaultdict, deque
+from dataclasses import asdict, dataclass, field
+import gzip
+import json
+from pathlib import Path
+import random
+import sys
+import tempfile
+import time
+from typing import Any
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from aiohttp import web  # noqa: E402
+from fake_messages_server import (  # noqa: E402
+    RATE_LIMIT_HEADERS,
+    FakeMessagesServer,
+    _sse,
+)
+from load_test import (  # noqa: E402
+    UTTERANCES,
+    LoadTestEntry,
+    async_populate,
+    async_setup_hass,
+    percentile,
+)
+
+from custom_components.zai_conversation import (  # noqa: E402
+    client_pool,
+    conversation as zai_conversation,
+)
+from custom_components.zai_conversation.const import (  # noqa: E402
+    CONF_LLM_HASS_API,
+    CONF_MAX_IN_FLIGHT,
+    CONF_MEMORY_ENABLED,
+    CONF_USE_CUSTOM_PROMPT,
+    DEFAULT_MAX_IN_FLIGHT,
+    LOAD_BALANCING_LEAST_OUTSTANDING,
+)
+from custom_components.zai_conversation.device_manager import (  # noqa: E402
+    DeviceContextBuilder,
+)
+from custom_components.zai_conversation.recorder import (  # noqa: E402
+    RequestRecorder,
+    encode_request,
+    request_key,
+)
+from homeassistant.components import conversation  # noqa: E402
+from homeassistant.core import Context, HomeAssistant  # noqa: E402
+from homeassistant.helpers import chat_session  # noqa: E402
+
+# Parts of a request whose size is compared
+PARTS = ("system", "tools", "messages")
+
+# Requests listed under the largest changes
+MAX_CHANGES = 10
+
+MATCH_HASH = "hash"
+MATCH_ORDER = "order"
+MATCH_NONE = "unmatched"
+
+
+@dataclass
+class Turn:
+    """A user utterance of a recording and the conversation it belongs to."""
+
+    text: str
+    # Earlier utterances of its conversation
+    history: tuple[str, ...]
+
+
+@dataclass
+class Served:
+    """A request the replayed version sent and how it was answered."""
+
+    turn: int
+    match: str
+    replayed: dict[str, int]
+    recorded: dict[str, int] | None = None
+
+
+@dataclass
+class ReplayResult:
+    """Measurements of a replay."""
+
+    turns: int = 0
+    errors: int = 0
+    requests: int = 0
+    matches: dict[str, int] = field(default_factory=dict)
+    latency_p50: float = 0.0
+    latency_p95: float = 0.0
+    recorded_model_p50: float = 0.0
+    recorded_model_p95: float = 0.0
+    bytes_recorded: dict[str, int] = field(default_factory=dict)
+    bytes_replayed: dict[str, int] = field(default_factory=dict)
+    changes: list[dict[str, Any]] = field(default_factory=list)
+
+
+def load_recording(path: Path) -> list[dict[str, Any]]:
+    """Return the records of a recording file, in recorded order."""
+    with gzip.open(path, "rt", encoding="utf-8") as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+def part_sizes(request: dict[str, Any]) -> dict[str, int]:
+    """Return the encoded size of each part of a request, in bytes."""
+    sizes = {
+        part: len(encode_request(request[part]).encode()) if part in request else 0
+        for part in PARTS
+    }
+    payload = {key: value for key, value in request.items() if key != "stream"}
+    sizes["total"] = len(encode_request(payload).encode())
+    return sizes
+
+
+def _user_text(message: dict[str, Any]) -> str | None:
+    """Return the utterance of a user message, None for tool results.
+
+    Name hints follow the utterance as a second text block.
+    """
+    if message.get("role") != "user":
+        return None
+    content = message.get("content")
+    if isinstance(content, str):
+        return content
+    if not isinstance(content, list) or any(
+        block.get("type") == "tool_result" for block in content
+    ):
+        return None
+    return next(
+        (block["text"] for block in content if block.get("type") == "text"), None
+    )
+
+
+def extract_turns(records: list[dict[str, Any]]) -> list[Turn]:
+    """Return the user turns of a recording.
+
+    A request that ends with an utterance starts a turn; the requests that
+    follow it with tool results belong to the same turn.
+    """
+    turns: list[Turn] = []
+    for record in records:
+        messages = record.get("request", {}).get("messages") or []
+        if not messages or (text := _user_text(messages[-1])) is None:
+            continue
+        history = tuple(
+            utterance
+            for message in messages[:-1]
+            if (utterance := _user_text(message)) is not None
+        )
+        turns.append(Turn(text, history))
+    return turns
+
+
+def message_to_events(message: dict[str, Any]) -> list[dict[str, Any]]:
+    """Return the stream events of a whole recorded message."""
+    events: list[dict[str, Any]] = [
+        {"type": "message_start", "message": {**message, "content": []}}
+    ]
+    for index, block in enumerate(message.get("content", [])):
+        if block.get("type") == "tool_use":
+            start = {**block, "input": {}}
+            delta = {
+                "type": "input_json_delta",
+                "partial_json": json.dumps(block.get("input", {})),
+            }
+        else:
+            start = {**block, "text": ""}
+            delta = {"type": "text_delta", "text": block.get("text", "")}
+        events += [
+            {"type": "content_block_start", "index": index, "content_block": start},
+            {"type": "content_block_delta", "index": index, "delta": delta},
+            {"type": "content_block_stop", "index": index},
+        ]
+    events += [
+        {
+            "type": "message_delta",
+            "delta": {
+                "stop_reason": message.get("stop_reason"),
+                "stop_sequence": message.get("stop_sequence"),
+            },
+            "usage": {
+                "output_tokens": message.get("usage", {}).get("output_tokens", 0)
+            },
+        },
+        {"type": "message_stop"},
+    ]
+    return events
+
+
+def events_to_message(events: list[dict[str, Any]]) -> dict[str, Any]:
+    """Return the whole message of recorded stream events."""
+    message: dict[str, Any] = {}
+    blocks: dict[int, dict[str, Any]] = {}
+    partial_json: dict[int, str] = defaultdict(str)
+    for event in events:
+        kind = event.get("type")
+        if kind == "message_start":
+            message = dict(event["message"])
+        elif kind == "content_block_start":
+            blocks[event["index"]] = dict(event["content_block"])
+        elif kind == "content_block_delta":
+            delta = event["delta"]
+            if delta.get("type") == "text_delta":
+                block = blocks[event["index"]]
+                block["text"] = block.get("text", "") + delta["text"]
+            elif delta.get("type") == "input_json_delta":
+                partial_json[event["index"]] += delta["partial_json"]
+        elif kind == "message_delta":
+            message.update(event.get("delta", {}))
+            message.setdefault("usage", {}).update(event.get("usage", {}))
+    for index, text in partial_json.items():
+        blocks[index]["input"] = json.loads(text) if text else {}
+    message["content"] = [blocks[index] for index in sorted(blocks)]
+    return message
+
+
+class ReplayServer(FakeMessagesServer):
+    """Messages endpoint that answers with the responses of a recording."""
+
+    def __init__(self, records: list[dict[str, Any]], realtime: bool = False) -> None:
+        """Initialize the server.
+
+        Args:
+            records: Records of the recording, in recorded order.
+            realtime: Wait as long as the recorded response took.
+        """
+        super().__init__(first_token_delay=0, word_delay=0)
+        self.records = records
+        self.realtime = realtime
+        self.turn = 0
+        self.served: list[Served] = []
+        self._by_key: dict[str, deque[int]] = defaultdict(deque)
+        # Hashed again, so recordings made before a change to request_key
+        # still match
+        for index, record in enumerate(records):
+            self._by_key[request_key(record["request"])].append(index)
+        self._unused = dict.fromkeys(range(len(records)))
+
+    def _take(self, body: dict[str, Any]) -> tuple[str, dict[str, Any] | None]:
+        """Return how a request is matched and the record answering it."""
+        candidates = self._by_key.get(request_key(body))
+        while candidates:
+            index = candidates.popleft()
+            if index in self._unused:
+                del self._unused[index]
+                return MATCH_HASH, self.records[index]
+        if self._unused:
+            index = next(iter(self._unused))
+            del self._unused[index]
+            return MATCH_ORDER, self.records[index]
+        return MATCH_NONE, None
+
+    async def _handle_messages(self, request: web.Request) -> web.StreamResponse:
+        """Answer a messages.create request with a recorded response."""
+        body = json.loads(await request.read())
+        self.requests += 1
+        match, record = self._take(body)
+        self.served.append(
+            Served(
+                self.turn,
+                match,
+                part_sizes(body),
+                part_sizes(record["request"]) if record is not None else None,
+            )
+        )
+        if record is None or record.get("error"):
+            return web.json_response(
+                {
+                    "type": "error",
+                    "error": {
+                        "type": "invalid_request_error",
+                        "message": (
+                            record["error"] if record else "No recorded response left"
+                        ),
+                    },
+                },
+                status=400,
+                headers=RATE_LIMIT_HEADERS,
+            )
+
+        elapsed = record.get("elapsed", 0.0) if self.realtime else 0.0
+        if not body.get("stream"):
+            message = record.get("response") or events_to_message(record["events"])
+            await asyncio.sleep(elapsed)
+            return web.json_response(message, headers=RATE_LIMIT_HEADERS)
+
+        events = record.get("events") or message_to_events(record["response"])
+        first = min(elapsed, record.get("first_event") or 0.0)
+        gap = (elapsed - first) / max(1, len(events) - 1)
+        response = web.StreamResponse(
+            headers={**RATE_LIMIT_HEADERS, "Content-Type": "text/event-stream"}
+        )
+        await response.prepare(request)
+        await asyncio.sleep(first)
+        for index, event in enumerate(events):
+            if index and gap:
+                await asyncio.sleep(gap)
+            await response.write(_sse(event["type"], event))
+        await response.write_eof()
+        return response
+
+
+async def async_create_entity(
+    hass: HomeAssistant, base_url: str, options: dict[str, Any]
+) -> tuple[zai_conversation.ZaiConversationEntity, Any]:
+    """Return a conversation entity using base_url and a builder stopper."""
+    entry = LoadTestEntry("replay", options, title="z.ai replay")
+    entry.runtime_data = await client_pool.async_create_pool(
+        hass,
+        [("replay-key", base_url)],
+        LOAD_BALANCING_LEAST_OUTSTANDING,
+        int(options.get(CONF_MAX_IN_FLIGHT, DEFAULT_MAX_IN_FLIGHT)),
+    )
+    builder = DeviceContextBuilder(hass)
+    stop_builder = builder.async_start()
+    entity = zai_conversation.ZaiConversationEntity(
+        entry, hass, device_builder=builder  # type: ignore[arg-type]
+    )
+    entity.hass = hass
+    entity.entity_id = "conversation.zai_replay"
+    return entity, stop_builder
+
+
+async def async_turn(
+    hass: HomeAssistant,
+    entity: zai_conversation.ZaiConversationEntity,
+    text: str,
+    conversation_id: str | None,
+) -> tuple[str | None, float, bool]:
+    """Run one turn; return its conversation ID, duration and success."""
+    user_input = zai_conversation.build_conversation_input(
+        text=text,
+        context=Context(),
+        conversation_id=conversation_id,
+        device_id=None,
+        language="en",
+        agent_id=entity.entity_id,
+    )
+    start = time.perf_counter()
+    try:
+        with (
+            chat_session.async_get_chat_session(hass, conversation_id) as session,
+            conversation.async_get_chat_log(hass, session, user_input) as chat_log,
+        ):
+            await entity._async_handle_message(user_input, chat_log)
+            conversation_id = session.conversation_id
+    except Exception:  # noqa: BLE001
+        return conversation_id, time.perf_counter() - start, False
+    return conversation_id, time.perf_counter() - start, True
+
+
+def _options(args: argparse.Namespace) -> dict[str, Any]:
+    """Return the agent options of a run."""
+    options = {
+        CONF_USE_CUSTOM_PROMPT: True,
+        CONF_MEMORY_ENABLED: False,
+        CONF_LLM_HASS_API: args.llm_api,
+    }
+    if args.options:
+        options.update(json.loads(args.options.read_text()))
+    return options
+
+
+async def async_record(args: argparse.Namespace) -> None:
+    """Record scripted conversations against the fake endpoint."""
+    rng = random.Random(args.seed)
+    server = FakeMessagesServer(args.first_token_delay, args.word_delay)
+    base_url = server.start_in_thread()
+    args.recording.unlink(missing_ok=True)
+    try:
+        with tempfile.TemporaryDirectory() as config_dir:
+            hass = await async_setup_hass(config_dir, args.llm_api)
+            await async_populate(hass, args.entities, random.Random(args.seed))
+            entity, stop_builder = await async_create_entity(
+                hass, base_url, _options(args)
+            )
+            pool = entity.entry.runtime_data
+            pool.recorder = RequestRecorder(
+                hass, args.recording.resolve(), pool.api_keys
+            )
+            errors = 0
+            for _ in range(args.conversations):
+                conversation_id = None
+                for _ in range(args.turns):
+                    conversation_id, _, ok = await async_turn(
+                        hass, entity, rng.choice(UTTERANCES), conversation_id
+                    )
+                    errors += not ok
+            await pool.recorder.async_flush()
+            stop_builder()
+            await hass.async_stop(force=True)
+    finally:
+        server.stop_thread()
+    print(
+        f"Recorded {pool.recorder.metrics['recorded']} requests of "
+        f"{args.conversations * args.turns} turns ({errors} failed) "
+        f"to {args.recording}",
+        file=sys.stderr,
+    )
+
+
+async def async_replay(args: argparse.Namespace) -> ReplayResult:
+    """Replay the turns of a recording and compare the requests."""
+    records = load_recording(args.recording)
+    turns = extract_turns(records)
+    server = ReplayServer(records, args.realtime)
+    base_url = server.start_in_thread()
+    latencies: list[float] = []
+    errors = 0
+    try:
+        with tempfile.TemporaryDirectory() as config_dir:
+            hass = await async_setup_hass(config_dir, args.llm_api)
+            await async_populate(hass, args.entities, random.Random(args.seed))
+            entity, stop_builder = await async_create_entity(
+                hass, base_url, _options(args)
+            )
+            # Utterances so far -> conversation ID they were replayed in
+            conversations: dict[tuple[str, ...], str | None] = {}
+            for index, turn in enumerate(turns):
+                server.turn = index
+                conversation_id, seconds, ok = await async_turn(
+                    hass, entity, turn.text, conversations.get(turn.history)
+                )
+                conversations[(*turn.history, turn.text)] = conversation_id
+                latencies.append(seconds)
+                errors += not ok
+            stop_builder()
+            await hass.async_stop(force=True)
+    finally:
+        server.stop_thread()
+    return summarize(records, turns, server.served, latencies, errors)
+
+
+def summarize(
+    records: list[dict[str, Any]],
+    turns: list[Turn],
+    served: list[Served],
+    latencies: list[float],
+    errors: int,
+) -> ReplayResult:
+    """Return the measurements of a replay."""
+    result = ReplayResult(turns=len(turns), errors=errors, requests=len(served))
+    result.matches = {
+        match: sum(request.match == match for request in served)
+        for match in (MATCH_HASH, MATCH_ORDER, MATCH_NONE)
+    }
+    result.latency_p50 = round(percentile(latencies, 0.50), 4)
+    result.latency_p95 = round(percentile(latencies, 0.95), 4)
+    recorded = [record.get("elapsed", 0.0) for record in records]
+    result.recorded_model_p50 = round(percentile(recorded, 0.50), 4)
+    result.recorded_model_p95 = round(percentile(recorded, 0.95), 4)
+
+    # Sizes of every recorded request, against every request sent now
+    for part in (*PARTS, "total"):
+        result.bytes_recorded[part] = sum(
+            part_sizes(record["request"])[part] for record in records
+        )
+        result.bytes_replayed[part] = sum(
+            request.replayed[part] for request in served
+        )
+
+    changed = [
+        {
+            "turn": request.turn,
+            "utterance": turns[request.turn].text if request.turn < len(turns) else "",
+            "match": request.match,
+            "recorded": request.recorded["total"],
+            "replayed": request.replayed["total"],
+            "change": request.replayed["total"] - request.recorded["total"],
+        }
+        for request in served
+        if request.recorded is not None
+        and request.replayed["total"] != request.recorded["total"]
+    ]
+    changed.sort(key=lambda change: abs(change["change"]), reverse=True)
+    result.changes = changed[:MAX_CHANGES]
+    return result
+
+
+def _change(old: int, new: int) -> str:
+    """Return a size change as text."""
+    if not old:
+        return f"{new - old:+d}"
+    return f"{new - old:+d} ({(new - old) / old:+.1%})"
+
+
+def format_report(result: ReplayResult, args: argparse.Namespace) -> str:
+    """Return the replay report as Markdown."""
+    lines = [
+        f"# Replay report ({args.recording.name})",
+        "",
+        f"- Turns: {result.turns} ({result.errors} failed)",
+        f"- Requests: {result.requests}; identical to the recording: "
+        f"{result.matches.get(MATCH_HASH, 0)}, answered in recorded order: "
+        f"{result.matches.get(MATCH_ORDER, 0)}, unanswered: "
+        f"{result.matches.get(MATCH_NONE, 0)}",
+        f"- Turn latency: p50 {result.latency_p50}s, p95 {result.latency_p95}s"
+        + (" (recorded model time)" if args.realtime else " (no model time)"),
+        f"- Recorded model time per request: p50 {result.recorded_model_p50}s, "
+        f"p95 {result.recorded_model_p95}s",
+        "",
+        "## Request bytes",
+        "",
+        "| part | recorded | replayed | change |",
+        "|---|---|---|---|",
+    ]
+    for part in (*PARTS, "total"):
+        old, new = result.bytes_recorded[part], result.bytes_replayed[part]
+        lines.append(f"| {part} | {old} | {new} | {_change(old, new)} |")
+
+    lines += ["", "## Largest changes", ""]
+    if not result.changes:
+        lines.append("No request changed size.")
+        return "\n".join(lines)
+    lines += [
+        "| turn | utterance | match | recorded | replayed | change |",
+        "|---|---|---|---|---|---|",
+    ]
+    for change in result.changes:
+        lines.append(
+            f"| {change['turn']} | {change['utterance']} | {change['match']} | "
+            f"{change['recorded']} | {change['replayed']} | "
+            f"{_change(change['recorded'], change['replayed'])} |"
+        )
+    return "\n".join(lines)
+
+
+def main() -> None:
+    """Parse arguments and record or replay."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    record = commands.add_parser("record", help="Record scripted conversations")
+    replay = commands.add_parser("replay", help="Replay a recording")
+    for command in (record, replay):
+        command.add_argument("recording", type=Path, help="Recording file")
+        command.add_argument(
+            "--entities", type=int, default=200,
+            help="Entities of the synthetic home",
+        )
+        command.add_argument(
+            "--llm-api", default=None,
+            help="LLM API to give the agent (e.g. assist); none by default",
+        )
+        command.add_argument(
+            "--options", type=Path,
+            help="JSON file of agent options to use on top of the defaults",
+        )
+        command.add_argument("--seed", type=int, default=1)
+    record.add_argument("--conversations", type=int, default=10)
+    record.add_argument(
+        "--turns", type=int, default=3, help="Turns per conversation"
+    )
+    record.add_argument("--first-token-delay", type=float, default=0.3)
+    record.add_argument("--word-delay", type=float, default=0.01)
+    replay.add_argument(
+        "--realtime", action="store_true",
+        help="Answer as slowly as the recorded responses came",
+    )
+    replay.add_argument("--json", type=Path, help="Also write raw results here")
+    args = parser.parse_args()
+
+    if args.command == "record":
+        asyncio.run(async_record(args))
+        return
+
+    result = asyncio.run(async_replay(args))
+    print(format_report(result, args))
+    if args.json:
+        args.json.write_text(json.dumps(asdict(result), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""Tests for the memory intent classifier."""
+
+from __future__ import annotations
+
+import pytest
+
+from custom_components.zai_conversation.memory_intent import (
+    MemoryIntentClassifier,
+    base_language,
+)
+
+
+@pytest.mark.parametrize(
+    ("language", "utterance", "fact"),
+    [
+        # Fillers only match whole words, not the start of the fact
+        ("en", "Remind me tomorrow to call the plumber", "Tomorrow to call the plumber"),
+        ("en", "Note that offices close at 6", "Offices close at 6"),
+        ("en", "Remember Anna is allergic to cats", "Anna is allergic to cats"),
+        ("en", "Remember: decaf coffee after 6pm", "Decaf coffee after 6pm"),
+        (
+            "en",
+            "Remember that I prefer warm lights in the evening, please.",
+            "I prefer warm lights in the evening",
+        ),
+        ("it", "Ricordati di comprare il latte", "Comprare il latte"),
+        ("es", "Guarda que prefiero la luz cálida", "Prefiero la luz cálida"),
+    ],
+)
+def test_fact_keeps_leading_words(language: str, utterance: str, fact: str) -> None:
+    """Test fillers are stripped without cutting into the fact."""
+    intent = MemoryIntentClassifier([language]).classify(utterance)
+    assert intent is not None
+    assert intent.fact == fact
+
+
+@pytest.mark.parametrize(
+    ("language", "utterance"),
+    [
+        # "guarda" is a Spanish trigger but an everyday Italian verb
+        ("it", "Guarda la tv"),
+        ("it", "Spegni tutto e guarda il meteo"),
+        ("en", "Turn on the kitchen lights"),
+    ],
+)
+def test_other_language_triggers_do_not_match(language: str, utterance: str) -> None:
+    """Test only the triggers of the utterance's language are matched."""
+    assert MemoryIntentClassifier([language]).classify(utterance) is None
+
+
+def test_base_language() -> None:
+    """Test language tags are reduced to their language."""
+    assert base_language("it-IT") == "it"
+    assert base_language("en_GB") == "en"
+    assert base_language("de") == "de"